@@ -0,0 +1,195 @@
+"""
+asyncio versions of the structure file operations for tools which must stay responsive, eg. a Qt library browser
+running on an asyncio loop (qasync).
+
+The work runs on a bounded thread pool. Each storage root (drive, UNC share or mount point) additionally has its
+own concurrency limit, so one slow network share cannot take all the workers. Cancelling the awaiting task
+drops the queued work. A running copytree stops after the file being copied.
+
+Example:
+metadata = await asyncstructure.aloadJsons(glob.glob("/mnt/library/*/metadata.json"))
+summary = await asyncstructure.acopytree(source, destination, workers=4, incremental=True)
+
+Requires python 3.5 or later. structure itself stays importable by python 2.
+"""
+
+import os
+import asyncio
+import functools
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
+import structure
+
+__author__ = "Arda Kutlu"
+__copyright__ = "Copyright 2019, Library Async Structure Functions"
+__credits__ = []
+__license__ = "GPL"
+__maintainer__ = "Arda Kutlu"
+__email__ = "ardakutlu@gmail.com"
+__status__ = "Development"
+
+_roots = {}
+_rootsLock = threading.Lock()
+
+
+def storageRoot(path):
+    """
+    Gets the storage root the path lives on. Drive or UNC share on Windows, mount point elsewhere
+    :param path: (String) file or folder path. Does not need to exist
+    :return: (String) root path
+    """
+    path = os.path.abspath(path)
+    drive, _ = os.path.splitdrive(path)
+    if drive:
+        return drive.lower()
+    folder = os.path.dirname(path)
+    with _rootsLock:
+        root = _roots.get(folder)
+    if root is None:
+        root = folder
+        while not os.path.ismount(root) and os.path.dirname(root) != root:
+            root = os.path.dirname(root)
+        with _rootsLock:
+            _roots[folder] = root
+    return root
+
+
+class IOExecutor(object):
+    """
+    Bounded thread pool with per storage root concurrency limits. Can be shared by several event loops
+    """
+    def __init__(self, maxWorkers=8, perRoot=4):
+        """
+        :param maxWorkers: (Int) total number of worker threads
+        :param perRoot: (Int) maximum number of concurrent operations on one storage root
+        """
+        self.maxWorkers = maxWorkers
+        self.perRoot = perRoot
+        self._pool = ThreadPoolExecutor(max_workers=maxWorkers)
+        # loop -> {root: semaphore}. asyncio primitives belong to one loop
+        self._limits = weakref.WeakKeyDictionary()
+
+    def _limit(self, path):
+        limits = self._limits.setdefault(asyncio.get_event_loop(), {})
+        root = storageRoot(path)
+        semaphore = limits.get(root)
+        if semaphore is None:
+            semaphore = limits[root] = asyncio.Semaphore(self.perRoot)
+        return semaphore
+
+    async def run(self, path, function, *args, **kwargs):
+        """
+        Runs the function on a worker thread once the storage root of the path has a free slot
+        :param path: (String) path the function works on. Used for the per root limit
+        :param function: (Function) blocking function
+        :return: return value of the function
+        """
+        async with self._limit(path):
+            return await asyncio.get_event_loop().run_in_executor(self._pool,
+                                                                  functools.partial(function, *args, **kwargs))
+
+    def shutdown(self, wait=True):
+        self._pool.shutdown(wait=wait)
+
+
+_default = {"executor": None}
+
+
+def defaultExecutor():
+    """Returns the shared IOExecutor used when no executor is given"""
+    if _default["executor"] is None:
+        _default["executor"] = IOExecutor()
+    return _default["executor"]
+
+def configure(maxWorkers=8, perRoot=4):
+    """
+    Replaces the shared executor. Running operations finish on the old one
+    :param maxWorkers: (Int) total number of worker threads
+    :param perRoot: (Int) maximum number of concurrent operations on one storage root
+    :return: IOExecutor
+    """
+    previous, _default["executor"] = _default["executor"], IOExecutor(maxWorkers, perRoot)
+    if previous is not None:
+        previous.shutdown(wait=False)
+    return _default["executor"]
+
+
+async def aloadJson(file, cache=False, readOnly=False, executor=None):
+    """async structure.loadJson"""
+    return await (executor or defaultExecutor()).run(file, structure.loadJson, file, cache=cache,
+                                                     readOnly=readOnly)
+
+def _loadBatch(files, cache, readOnly):
+    return [structure.loadJson(file, cache=cache, readOnly=readOnly) for file in files]
+
+async def aloadJsons(files, cache=False, readOnly=False, batchSize=16, executor=None):
+    """
+    Loads many json files concurrently. Files are grouped per storage root into batches of batchSize which are
+    loaded by one worker each, so hundreds of small files do not cost one thread hand off each
+    :param files: (List) json file paths
+    :param cache: (Boolean) see structure.loadJson
+    :param readOnly: (Boolean) see structure.loadJson
+    :param batchSize: (Int) number of files loaded by one worker call
+    :param executor: (IOExecutor) Optional. Default is the shared executor
+    :return: (List) parsed data in the order of the files. None for the files which cannot be loaded
+    """
+    executor = executor or defaultExecutor()
+    files = list(files)
+    byRoot = {}
+    for i, file in enumerate(files):
+        byRoot.setdefault(storageRoot(file), []).append(i)
+    batches = [ids[start:start + batchSize] for ids in byRoot.values() for start in range(0, len(ids), batchSize)]
+    results = await asyncio.gather(*[executor.run(files[ids[0]], _loadBatch, [files[i] for i in ids], cache,
+                                                  readOnly) for ids in batches])
+    loaded = [None] * len(files)
+    for ids, batch in zip(batches, results):
+        for i, data in zip(ids, batch):
+            loaded[i] = data
+    return loaded
+
+async def adumpJson(data, file, compact=False, stream=False, durability="none", executor=None):
+    """async structure.dumpJson. The data must not be modified until the returned coroutine is done"""
+    return await (executor or defaultExecutor()).run(file, structure.dumpJson, data, file, compact=compact,
+                                                     stream=stream, durability=durability)
+
+async def afolderCheck(folderPath, executor=None):
+    """async structure.folderCheck"""
+    return await (executor or defaultExecutor()).run(folderPath, structure.folderCheck, folderPath)
+
+async def afileHash(filePath, algorithm="sha1", executor=None):
+    """async structure.fileHash"""
+    return await (executor or defaultExecutor()).run(filePath, structure.fileHash, filePath, algorithm=algorithm)
+
+async def adumpArrays(arrays, file, metadata=None, durability="none", executor=None):
+    """async structure.dumpArrays"""
+    return await (executor or defaultExecutor()).run(file, structure.dumpArrays, arrays, file, metadata=metadata,
+                                                     durability=durability)
+
+async def aloadArrays(file, names=None, mmap=True, executor=None):
+    """async structure.loadArrays"""
+    return await (executor or defaultExecutor()).run(file, structure.loadArrays, file, names=names, mmap=mmap)
+
+async def acopytree(src, dst, progress=None, executor=None, **kwargs):
+    """
+    async structure.copytree. Takes one slot of the destination root, the copy itself can use more threads with
+    the workers argument. Cancelling stops the copy after the files being copied and raises CancelledError
+    :param src: (String) source directory path
+    :param dst: (String) destination directory path
+    :param progress: (Function) called on the event loop thread as progress(done, total, srcname)
+    :param executor: (IOExecutor) Optional. Default is the shared executor
+    :param kwargs: other structure.copytree arguments
+    :return: (Dictionary) copytree summary
+    """
+    loop = asyncio.get_event_loop()
+    cancel = threading.Event()
+    if progress is not None:
+        callback = progress
+        progress = lambda *args: loop.call_soon_threadsafe(callback, *args)
+    try:
+        return await (executor or defaultExecutor()).run(dst, structure.copytree, src, dst, progress=progress,
+                                                         cancel=cancel, **kwargs)
+    except asyncio.CancelledError:
+        cancel.set()
+        raise
@@ -0,0 +1,235 @@
+"""Attribute schema snapshots and batched attribute replication"""
+
+import json
+from collections import OrderedDict
+
+import backend
+
+__author__ = "Arda Kutlu"
+__copyright__ = "Copyright 2019, Library Attribute Functions"
+__credits__ = []
+__license__ = "GPL"
+__maintainer__ = "Arda Kutlu"
+__email__ = "ardakutlu@gmail.com"
+__status__ = "Development"
+
+cmds = backend.cmds
+
+# attributeQuery flag pairs for the optional limits. (existence flag, value flag, addAttr flag)
+_LIMITS = (
+    ("minExists", "minimum", "min"),
+    ("maxExists", "maximum", "max"),
+    ("softMinExists", "softMin", "smn"),
+    ("softMaxExists", "softMax", "smx"),
+)
+
+# attribute types which are not created with the addAttr attributeType flag
+_NO_VALUE_TYPES = ("message", "compound", "double2", "double3", "float2", "float3", "long2", "long3",
+                   "short2", "short3")
+
+
+class AttributeSchema(object):
+    """
+    Snapshot of attribute definitions captured once from a source node. Can be saved as JSON and applied to any
+    number of targets without querying the source again.
+
+    Example:
+    schema = AttributeSchema.capture("L_hand_ctrl")
+    schema.apply(["L_finger%s_ctrl" % i for i in range(5)], values=True)
+    """
+    def __init__(self, attributes=None):
+        """
+        :param attributes: (List) attribute definition dictionaries. See capture for the keys
+        """
+        self.attributes = list(attributes or [])
+
+    def __len__(self):
+        return len(self.attributes)
+
+    def __iter__(self):
+        return iter(self.attributes)
+
+    def names(self):
+        return [definition["longName"] for definition in self.attributes]
+
+    @classmethod
+    def capture(cls, node, attributes=None, values=True):
+        """
+        Queries the attribute definitions from the node
+        :param node: (String) source node
+        :param attributes: (List) attribute names. If None, all user defined attributes are captured
+        :param values: (Boolean) If True, current values are captured too
+        :return: AttributeSchema
+        """
+        if attributes is None:
+            attributes = cmds.listAttr(node, ud=True) or []
+        definitions = []
+        for attr in attributes:
+            plug = "%s.%s" % (node, attr)
+            attrType = cmds.attributeQuery(attr, node=node, attributeType=True)
+            definition = {
+                "longName": cmds.attributeQuery(attr, node=node, longName=True),
+                "shortName": cmds.attributeQuery(attr, node=node, shortName=True),
+                "attributeType": attrType,
+                "hidden": cmds.attributeQuery(attr, node=node, hidden=True),
+                "keyable": cmds.attributeQuery(attr, node=node, keyable=True),
+                "readable": cmds.attributeQuery(attr, node=node, readable=True),
+                "writable": cmds.attributeQuery(attr, node=node, writable=True),
+            }
+            if attrType == "typed":
+                definition["dataType"] = cmds.getAttr(plug, type=True)
+            if attrType == "enum":
+                definition["enum"] = cmds.attributeQuery(attr, node=node, listEnum=True)[0]
+            if attrType not in _NO_VALUE_TYPES and attrType != "typed":
+                definition["defaultValue"] = cmds.attributeQuery(attr, node=node, listDefault=True)[0]
+                for existsFlag, valueFlag, addFlag in _LIMITS:
+                    if cmds.attributeQuery(attr, node=node, **{existsFlag: True}):
+                        definition[addFlag] = cmds.attributeQuery(attr, node=node, **{valueFlag: True})[0]
+            if attrType not in _NO_VALUE_TYPES:
+                definition["channelBox"] = cmds.getAttr(plug, channelBox=True)
+                if values:
+                    definition["value"] = cmds.getAttr(plug)
+            definitions.append(definition)
+        return cls(definitions)
+
+    def toDict(self):
+        return {"attributes": self.attributes}
+
+    @classmethod
+    def fromDict(cls, data):
+        return cls(data["attributes"])
+
+    def toJson(self, indent=4):
+        return json.dumps(self.toDict(), indent=indent)
+
+    @classmethod
+    def fromJson(cls, text):
+        return cls.fromDict(json.loads(text))
+
+    @staticmethod
+    def addAttrFlags(definition):
+        """
+        Converts the attribute definition to addAttr keyword arguments
+        :param definition: (Dictionary) attribute definition
+        :return: (Dictionary) addAttr flags
+        """
+        flags = {
+            "ln": definition["longName"],
+            "sn": definition["shortName"],
+            "h": definition["hidden"],
+            "k": definition["keyable"],
+            "r": definition["readable"],
+            "w": definition["writable"],
+        }
+        if definition["attributeType"] == "typed":
+            flags["dt"] = definition["dataType"]
+        else:
+            flags["at"] = definition["attributeType"]
+        if "enum" in definition:
+            flags["en"] = definition["enum"]
+        if "defaultValue" in definition:
+            flags["dv"] = definition["defaultValue"]
+        for _, _, addFlag in _LIMITS:
+            if addFlag in definition:
+                flags[addFlag] = definition[addFlag]
+        return flags
+
+    def apply(self, targets, values=True, overrideEx=False):
+        """
+        Creates the attributes on all targets in a single undo chunk
+        :param targets: (List) target nodes
+        :param values: (Boolean) If True, captured values are set after creation
+        :param overrideEx: (Boolean) If True, existing attributes with the same name are deleted and re-created.
+                        Otherwise they are skipped
+        :return: (Dictionary) target -> list of created attribute names
+        """
+        created = {}
+        flagsList = [(definition, self.addAttrFlags(definition)) for definition in self.attributes]
+        edits = backend.edits()
+        edits.sync(targets, attributesOnly=True)
+        with edits.chunk():
+            for target in targets:
+                existing = set(cmds.listAttr(target) or [])
+                created[target] = []
+                for definition, flags in flagsList:
+                    longName = definition["longName"]
+                    if longName in existing:
+                        if not overrideEx:
+                            continue
+                        edits.call(target, "deleteAttr", "%s.%s" % (target, longName))
+                    edits.call(target, "addAttr", target, **flags)
+                    plug = "%s.%s" % (target, longName)
+                    if definition.get("channelBox") and not definition["keyable"]:
+                        edits.setAttr(plug, channelBox=True)
+                    if values and "value" in definition:
+                        _setValue(edits, plug, definition)
+                    created[target].append(longName)
+        return created
+
+
+def _setValue(edits, plug, definition):
+    value = definition["value"]
+    if definition["attributeType"] == "typed":
+        if value is not None:
+            edits.setAttr(plug, value, type=definition["dataType"])
+    else:
+        edits.setAttr(plug, value)
+
+
+# ___________Channel states ___________
+
+CHANNEL_FLAGS = ("lock", "keyable", "channelBox")
+
+
+def diffChannelStates(current, wanted):
+    """
+    Compares the current channel states with the wanted ones
+    :param current: (Dictionary) plug -> {"lock": bool, "keyable": bool, "channelBox": bool}
+    :param wanted: (Dictionary) plug -> dictionary of the flags to set. Missing flags are left as they are
+    :return: (Dictionary) plug -> dictionary of the flags which actually change
+    """
+    changes = {}
+    for plug, states in wanted.items():
+        state = current.get(plug, {})
+        changed = dict((flag, value) for flag, value in states.items() if state.get(flag) != value)
+        if changed:
+            changes[plug] = changed
+    return changes
+
+def readChannelStates(plugs):
+    """
+    Reads lock, keyable and channelBox states of the plugs in bulk through the active backend
+    :param plugs: (List) plug names. eg: ["ctrl.tx", "ctrl.rotateY"]
+    :return: (Dictionary) plug -> {"lock": bool, "keyable": bool, "channelBox": bool}
+    """
+    return backend.current().channelStates(plugs)
+
+def applyChannelStates(specs):
+    """
+    Sets lock / keyable / channelBox states of many channels at once. Current states are read in bulk first
+    and only the flags which change are written, all in one undo chunk.
+
+    Example:
+    applyChannelStates([
+        (controls, ["sx", "sy", "sz", "v"], {"lock": True, "keyable": False, "channelBox": False}),
+        (controls, ["tx", "ty", "tz"], {"lock": False, "keyable": True}),
+    ])
+    :param specs: (List) (nodes, channels, states) tuples. states dictionary can have any of the CHANNEL_FLAGS
+    :return: (Dictionary) {"written": number of setAttr calls, "skipped": number of channels already in state}
+    """
+    wanted = OrderedDict()
+    for nodes, channels, states in specs:
+        if not isinstance(nodes, (list, tuple, set)):
+            nodes = [nodes]
+        for node in nodes:
+            for channel in channels:
+                # "tx" and "translateX" are the same plug. Later specs win as if they were applied in order
+                wanted.setdefault(backend.longPlugName("%s.%s" % (node, channel)), {}).update(states)
+    edits = backend.edits()
+    edits.sync(list(wanted), attributesOnly=True)
+    changes = diffChannelStates(readChannelStates(list(wanted)), wanted)
+    if changes:
+        with edits.chunk():
+            for plug, flags in changes.items():
+                edits.setAttr(plug, **flags)
+    return {"written": len(changes), "skipped": len(wanted) - len(changes)}
@@ -0,0 +1,1474 @@
+"""
+Scene backends. utils, weights and attributes talk to the scene through the active backend, so they can be
+imported without Maya. Maya modules are loaded on first use. FakeBackend is an in-memory scene for running the
+library headless.
+
+Example:
+with backend.use(backend.FakeBackend()) as scene:
+    scene.addMesh("pCube1", points)
+    utils.getAllVerts("pCube1", output="numpy")
+"""
+
+import ctypes
+import logging
+import fnmatch
+import importlib
+from collections import OrderedDict
+from contextlib import contextmanager
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+import vectors
+
+__author__ = "Arda Kutlu"
+__copyright__ = "Copyright 2019, Library Scene Backends"
+__credits__ = []
+__license__ = "GPL"
+__maintainer__ = "Arda Kutlu"
+__email__ = "ardakutlu@gmail.com"
+__status__ = "Development"
+
+logger = logging.getLogger('backend')
+
+_active = {"backend": None, "edits": None, "names": None}
+
+
+def current():
+    """Returns the active backend. Creates the Maya backend on first call if none is set"""
+    if _active["backend"] is None:
+        _active["backend"] = MayaBackend()
+    return _active["backend"]
+
+def activate(sceneBackend):
+    """Sets the active backend. None resets to the Maya backend"""
+    _active["backend"] = sceneBackend
+
+@contextmanager
+def use(sceneBackend):
+    """Activates the backend within the scope"""
+    previous = _active["backend"]
+    _active["backend"] = sceneBackend
+    try:
+        yield sceneBackend
+    finally:
+        _active["backend"] = previous
+
+
+class _Proxy(object):
+    """
+    Forwards attribute access to a module of the active backend, or to the backend itself if attr is None.
+    eg: utils uses backend.cmds as cmds
+    """
+    def __init__(self, attr):
+        self._attr = attr
+
+    def __getattr__(self, name):
+        if self._attr is None:
+            return getattr(current(), name)
+        return getattr(getattr(current(), self._attr), name)
+
+
+cmds = _Proxy("cmds")
+om = _Proxy("om")
+oma = _Proxy("oma")
+# the active backend. Scene editors go through the proxies, so profiling can count the edits they apply
+scene = _Proxy(None)
+
+
+# ___________Batched edits ___________
+
+# channels whose values change the world transform of the node
+_TRANSFORM_CHANNELS = frozenset(("translate", "rotate", "scale", "jointOrient", "rotateAxis", "t", "r", "s", "jo",
+                                 "ra", "tx", "ty", "tz", "rx", "ry", "rz", "sx", "sy", "sz", "translateX",
+                                 "translateY", "translateZ", "rotateX", "rotateY", "rotateZ", "scaleX", "scaleY",
+                                 "scaleZ", "jointOrientX", "jointOrientY", "jointOrientZ"))
+
+# commands which only change the attribute definitions of the node
+_ATTRIBUTE_COMMANDS = frozenset(("addAttr", "deleteAttr", "copyAttr", "renameAttr", "aliasAttr"))
+
+
+def _shortName(name):
+    """Node short name of a node, dag path or plug"""
+    return name.split(".")[0].split("|")[-1]
+
+
+def edits():
+    """Returns the EditQueue of the running batch, or the ImmediateEdits editor outside of a batch"""
+    queue = _active["edits"]
+    return _IMMEDIATE if queue is None else queue
+
+@contextmanager
+def batch():
+    """
+    Queues the scene edits made through edits() within the scope and applies them when the scope exits. The
+    whole scope is one undo chunk, including the edits applied early because a node with pending edits was read.
+    Nested batches join the outermost one. If the scope raises, the queued edits are discarded.
+    """
+    if _active["edits"] is not None:
+        yield _active["edits"]
+        return
+    queue = _active["edits"] = EditQueue()
+    cmds.undoInfo(openChunk=True)
+    try:
+        try:
+            yield queue
+        finally:
+            _active["edits"] = None
+        queue.flush()
+    finally:
+        cmds.undoInfo(closeChunk=True)
+
+def names():
+    """Returns the NameRegistry of the running nameRegistry scope, or a new one for a single allocation"""
+    registry = _active["names"]
+    return NameRegistry() if registry is None else registry
+
+@contextmanager
+def nameRegistry():
+    """
+    Keeps one NameRegistry within the scope. Existing names are listed once per base name and the registry is
+    kept in sync with the scene through the backend watch callbacks. Nested scopes join the outermost one.
+    """
+    if _active["names"] is not None:
+        yield _active["names"]
+        return
+    registry = _active["names"] = NameRegistry()
+    sceneBackend = current()
+    callbackId = sceneBackend.watch(registry.nodeEvent)
+    try:
+        yield registry
+    finally:
+        sceneBackend.unwatch(callbackId)
+        _active["names"] = None
+
+
+class ImmediateEdits(object):
+    """Scene editor applying every edit right away. Same interface as EditQueue"""
+
+    def reserve(self, name):
+        """Returns the name for a node to be created. Maya renames clashing nodes itself"""
+        return name
+
+    def createNode(self, nodeType, name, parent=None):
+        flags = {"name": self.reserve(name), "skipSelect": True}
+        if parent:
+            flags["parent"] = parent
+        return cmds.createNode(nodeType, **flags)
+
+    def parent(self, node, newParent=None):
+        """Parents the node keeping its world transform. None parents to the world"""
+        if newParent:
+            cmds.parent(node, newParent)
+        else:
+            cmds.parent(node, world=True)
+
+    def parentOf(self, node):
+        """Returns the long name of the parent, so it stays unique in scenes with repeated short names"""
+        return (cmds.listRelatives(node, parent=True, fullPath=True) or [None])[0]
+
+    def setAttr(self, plug, *values, **flags):
+        cmds.setAttr(plug, *values, **flags)
+
+    def setWorldTransform(self, node, matrix, translation=True, rotation=True):
+        scene.setWorldTransform(node, matrix, translation=translation, rotation=rotation)
+
+    def makeIdentity(self, nodes, **flags):
+        """Freezes the transformations of the node or list of nodes"""
+        cmds.makeIdentity(nodes, apply=True, **flags)
+
+    def call(self, node, command, *args, **kwargs):
+        """
+        Runs any other cmds command
+        :param node: (String) node edited by the command
+        :param command: (String) cmds command name
+        """
+        return getattr(cmds, command)(*args, **kwargs)
+
+    def sync(self, nodes, attributesOnly=False):
+        """
+        Makes sure the scene is up to date before the nodes are read
+        :param nodes: (List) nodes or plugs to be read
+        :param attributesOnly: (Boolean) If True, only attribute definitions and channel states are going to be read
+        """
+        pass
+
+    def flush(self):
+        pass
+
+    def apply(self, operations):
+        """Applies the (command, args, kwargs) operations recorded by an EditQueue"""
+        for command, args, kwargs in operations:
+            if command == "setWorldTransform":
+                self.setWorldTransform(*args, **kwargs)
+            else:
+                getattr(cmds, command)(*args, **kwargs)
+
+    @contextmanager
+    def chunk(self):
+        """Groups the edits of the scope into one undo entry"""
+        cmds.undoInfo(openChunk=True)
+        try:
+            yield
+        finally:
+            cmds.undoInfo(closeChunk=True)
+
+
+class EditQueue(ImmediateEdits):
+    """
+    Records the scene edits instead of applying them. Hierarchy changes and node creations are tracked, so
+    parentOf and reserve answer as if the edits were applied. Reading a node with pending edits through sync
+    flushes the queue first.
+    """
+    def __init__(self):
+        # (command, args, kwargs, node, key). key marks edits which overwrite each other completely
+        self.operations = []
+        self.created = set()
+        self.parents = {}
+        self.touched = set()
+        # nodes with pending attribute definition or channel state edits
+        self.attributeNodes = set()
+        self.movedExisting = set()
+        # pending creations stay reserved in the registry until the queue is applied
+        self.names = names()
+
+    def __len__(self):
+        return len(self.operations)
+
+    def _queue(self, command, args, kwargs, node, key=None):
+        node = _shortName(node) if node else None
+        self.operations.append((command, args, kwargs, node, key))
+        if node:
+            self.touched.add(node)
+        return node
+
+    def _moved(self, node):
+        if node not in self.created:
+            # scene descendants of the node move too. See sync
+            self.movedExisting.add(node)
+
+    def reserve(self, name):
+        """Returns a name used neither in the scene nor by the pending creations"""
+        return self.names.allocate([name])[0]
+
+    def createNode(self, nodeType, name, parent=None):
+        name = self.reserve(name)
+        flags = {"name": name, "skipSelect": True}
+        if parent:
+            flags["parent"] = parent
+        self._queue("createNode", (nodeType,), flags, name)
+        self.created.add(name)
+        self.attributeNodes.add(name)
+        self.parents[name] = _shortName(parent) if parent else None
+        return name
+
+    def parent(self, node, newParent=None):
+        if newParent:
+            node = self._queue("parent", (node, newParent), {}, node)
+        else:
+            node = self._queue("parent", (node,), {"world": True}, node)
+        self.parents[node] = _shortName(newParent) if newParent else None
+
+    def parentOf(self, node):
+        node = _shortName(node)
+        if node in self.parents:
+            return self.parents[node]
+        return ImmediateEdits.parentOf(self, node)
+
+    def setAttr(self, plug, *values, **flags):
+        key = ("setAttr", plug) if values and not flags else None
+        node = self._queue("setAttr", (plug,) + values, flags, plug, key)
+        if flags:
+            self.attributeNodes.add(node)
+        if values and plug.split(".", 1)[-1] in _TRANSFORM_CHANNELS:
+            self._moved(node)
+
+    def setWorldTransform(self, node, matrix, translation=True, rotation=True):
+        node = self._queue("setWorldTransform", (node, matrix),
+                           {"translation": translation, "rotation": rotation}, node,
+                           ("setWorldTransform", node, translation, rotation))
+        self._moved(node)
+
+    def makeIdentity(self, nodes, **flags):
+        flags["apply"] = True
+        nodes = nodes if isinstance(nodes, (list, tuple)) else [nodes]
+        # one operation per node, so coalesced keeps the edits queued before the freeze
+        for node in nodes:
+            self._queue("makeIdentity", (node,), dict(flags), node)
+
+    def call(self, node, command, *args, **kwargs):
+        """Queues any other cmds command. Returns None"""
+        node = self._queue(command, args, kwargs, node)
+        self.attributeNodes.add(node)
+        if command not in _ATTRIBUTE_COMMANDS:
+            # unknown edits may move the node
+            self._moved(node)
+
+    def sync(self, nodes, attributesOnly=False):
+        nodes = [_shortName(node) for node in nodes]
+        pending = self.attributeNodes if attributesOnly else self.touched
+        if any(node in pending for node in nodes):
+            self.flush()
+        elif self.movedExisting and not attributesOnly:
+            paths = cmds.ls(nodes, long=True) or []
+            if any(part in self.movedExisting for path in paths for part in path.split("|")):
+                self.flush()
+
+    def discard(self):
+        self.operations = []
+        self.created = set()
+        self.parents = {}
+        self.touched = set()
+        self.attributeNodes = set()
+        self.movedExisting = set()
+
+    def coalesced(self):
+        """Returns the operations without the edits overwritten later by the same edit on the same target"""
+        kept = []
+        seen = set()
+        for operation in reversed(self.operations):
+            command, args, kwargs, node, key = operation
+            if key is not None:
+                if key in seen:
+                    continue
+                seen.add(key)
+            elif node is not None:
+                # any other edit on the node keeps the earlier edits as they are
+                seen = set(k for k in seen if _shortName(k[1]) != node)
+            else:
+                # edits of unknown targets keep everything before them
+                seen = set()
+            kept.append((command, args, kwargs))
+        kept.reverse()
+        return kept
+
+    def flush(self):
+        """Applies the queued edits to the active backend"""
+        if not self.operations:
+            return
+        operations = self.coalesced()
+        self.discard()
+        _IMMEDIATE.apply(operations)
+
+    @contextmanager
+    def chunk(self):
+        # the batch is one chunk already
+        yield
+
+
+_IMMEDIATE = ImmediateEdits()
+
+
+# ___________Names ___________
+
+def _nameIndex(base, name):
+    """Returns the uniqueName index of the name for the base. 0 for the base itself, None if it is not a candidate"""
+    if not name.startswith(base):
+        return None
+    suffix = name[len(base):]
+    if not suffix:
+        return 0
+    if suffix.isdigit() and suffix[0] != "0":
+        return int(suffix)
+    return None
+
+
+class NameRegistry(object):
+    """
+    Allocates unique node names with the uniqueName rule (name, name1, name2, ...) without checking every
+    candidate in the scene. The requested names are checked with a single ls call, and the taken names of a
+    base name are listed once with a wildcard. Allocated names stay reserved until invalidate is called.
+    """
+    def __init__(self):
+        # base name -> set of taken indices. 0 is the base name itself
+        self._taken = {}
+        # base name -> lowest index which may be free
+        self._next = {}
+        # allocated or created names which are not in a snapshot
+        self._reserved = set()
+
+    def invalidate(self):
+        """Forgets the snapshots and reservations"""
+        self._taken = {}
+        self._next = {}
+        self._reserved = set()
+
+    def nodeEvent(self, event, name):
+        """Scene watch callback. Keeps the snapshots in sync with created, removed and renamed nodes"""
+        name = _shortName(name)
+        if event == "added":
+            self._register(name)
+        elif event in ("removed", "renamed"):
+            self._reserved.discard(name)
+            for base, taken in self._taken.items():
+                index = _nameIndex(base, name)
+                if index is not None:
+                    taken.discard(index)
+                    if index:
+                        self._next[base] = min(self._next[base], index)
+
+    def _register(self, name):
+        self._reserved.add(name)
+        for base, taken in self._taken.items():
+            index = _nameIndex(base, name)
+            if index is not None:
+                taken.add(index)
+
+    def _snapshot(self, base):
+        taken = self._taken.get(base)
+        if taken is None:
+            existing = [_shortName(n) for n in (cmds.ls("%s*" % base) or [])]
+            taken = self._taken[base] = set()
+            for name in existing + list(self._reserved):
+                index = _nameIndex(base, name)
+                if index is not None:
+                    taken.add(index)
+            self._next[base] = 1
+        return taken
+
+    def allocate(self, names):
+        """
+        Returns a unique name for each requested name. Repeated names get different results
+        :param names: (List) requested names
+        :return: (List) unique names in the same order
+        """
+        names = list(names)
+        unknown = set(n for n in names if n not in self._taken and n not in self._reserved)
+        existing = set(_shortName(n) for n in (cmds.ls(list(unknown)) or [])) if unknown else set()
+        result = []
+        for name in names:
+            if name in unknown and name not in existing:
+                # free in the scene. Snapshot is not needed until it is requested again
+                unknown.discard(name)
+                self._register(name)
+                result.append(name)
+                continue
+            taken = self._snapshot(name)
+            if 0 not in taken:
+                index = 0
+            else:
+                index = self._next[name]
+                while index in taken:
+                    index += 1
+                self._next[name] = index + 1
+            unique = "%s%i" % (name, index) if index else name
+            self._register(unique)
+            result.append(unique)
+        return result
+
+
+# ___________Mesh points ___________
+
+class MeshCache(object):
+    """
+    LRU cache of mesh vertex positions keyed by backend, node identity and space. An entry is dropped as soon as
+    the backend reports the mesh dirty (geometry, transform or parent change, deletion, time change), so repeated
+    reads of static meshes are not fetched again. With fingerprint, hits are also checked with the backend
+    geometry fingerprint, which catches changes sent without dirty notifications. Memory usage is measured with
+    the cached array sizes.
+
+    Example:
+    points = utils.getAllVerts("body", output="numpy", cache=True, readOnly=True)
+    backend.meshCache.stats()
+    """
+    def __init__(self, maxBytes=512 * 1024 * 1024, maxEntries=256, fingerprint=False):
+        """
+        :param maxBytes: (Int) total size of the cached positions before the least recently used ones are evicted
+        :param maxEntries: (Int) maximum number of cached meshes
+        :param fingerprint: (Boolean) If True, every hit is validated with the backend meshFingerprint
+        """
+        self.maxBytes = maxBytes
+        self.maxEntries = maxEntries
+        self.fingerprint = fingerprint
+        # key -> [backend, points, bytes, watch id, fingerprint]
+        self._entries = OrderedDict()
+        self._bytes = 0
+        # (backend, watch id) of dropped entries. Removed outside of the backend callbacks
+        self._stale = []
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        """Returns the cache statistics as a dictionary"""
+        return {"hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "entries": len(self._entries),
+                "bytes": self._bytes}
+
+    def clear(self):
+        for key in list(self._entries):
+            self._drop(key)
+        self._releaseStale()
+
+    def invalidate(self, node=None):
+        """
+        Drops the cached positions of the node in all spaces
+        :param node: (String) Optional. If None, the whole cache is cleared
+        """
+        if node is None:
+            self.clear()
+            return
+        sceneBackend = current()
+        nodeId = sceneBackend.nodeId(node)
+        for key in [k for k in self._entries if k[0] == id(sceneBackend) and k[1] == nodeId]:
+            self._drop(key)
+            self.invalidations += 1
+        self._releaseStale()
+
+    def get(self, node, space, fetch):
+        """
+        Gets the positions of the mesh, fetching them only if they are not cached or the mesh changed
+        :param node: (String) mesh node
+        :param space: (String or om.MSpace) space of the positions
+        :param fetch: (Function) returns the flat [x, y, z, ...] positions. eg: backend meshPoints
+        :return: read-only (N, 3) float64 numpy array. Flat list without numpy
+        """
+        self._releaseStale()
+        sceneBackend = current()
+        key = (id(sceneBackend), sceneBackend.nodeId(node), space)
+        entry = self._entries.get(key)
+        if entry is not None and self.fingerprint and entry[4] != sceneBackend.meshFingerprint(node, space):
+            self._drop(key)
+            self.invalidations += 1
+            entry = None
+        if entry is not None:
+            self.hits += 1
+            self._entries.pop(key)
+            self._entries[key] = entry
+            return entry[1]
+
+        self.misses += 1
+        fingerprint = sceneBackend.meshFingerprint(node, space) if self.fingerprint else None
+        points = fetch()
+        if np is not None:
+            points = np.array(points, dtype=np.float64).reshape(-1, 3)
+            points.setflags(write=False)
+            size = points.nbytes
+        else:
+            # python floats in a list
+            size = len(points) * 32
+        if size > self.maxBytes:
+            return points
+        try:
+            watchId = sceneBackend.watchDirty(node, lambda name, key=key: self._dirty(key))
+        except NotImplementedError:
+            watchId = None
+            if not self.fingerprint:
+                return points
+        self._entries[key] = [sceneBackend, points, size, watchId, fingerprint]
+        self._bytes += size
+        self._evict()
+        return points
+
+    def _dirty(self, key):
+        if key in self._entries:
+            self._drop(key)
+            self.invalidations += 1
+
+    def _drop(self, key):
+        sceneBackend, _, size, watchId, _ = self._entries.pop(key)
+        self._bytes -= size
+        if watchId is not None:
+            self._stale.append((sceneBackend, watchId))
+
+    def _releaseStale(self):
+        stale, self._stale = self._stale, []
+        for sceneBackend, watchId in stale:
+            sceneBackend.unwatchDirty(watchId)
+
+    def _evict(self):
+        while self._entries and (self._bytes > self.maxBytes or len(self._entries) > self.maxEntries):
+            self._drop(next(iter(self._entries)))
+            self.evictions += 1
+        self._releaseStale()
+
+
+meshCache = MeshCache()
+
+
+class Backend(object):
+    """Interface of the scene backends"""
+    name = None
+
+    def lookupCache(self):
+        """Context manager caching node lookups within the scope"""
+        raise NotImplementedError
+
+    def clearLookupCache(self, *args):
+        raise NotImplementedError
+
+    def worldTranslations(self, nodes):
+        """Returns world rotate pivot positions as a list of (x, y, z) tuples"""
+        raise NotImplementedError
+
+    def worldMatrices(self, nodes):
+        """Returns world matrices as lists of 16 floats, row major"""
+        raise NotImplementedError
+
+    def setWorldTransform(self, node, matrix, translation=True, rotation=True):
+        """Sets the world translation and / or rotation from a (4, 4) row major matrix. Scale is kept"""
+        raise NotImplementedError
+
+    def meshPoints(self, node, space="world", start=None, end=None):
+        """
+        Returns the vertex positions between start and end (inclusive) as a flat [x, y, z, ...] float64 numpy
+        array, or a list without numpy
+        """
+        raise NotImplementedError
+
+    def channelStates(self, plugs):
+        """Returns plug -> {"lock": bool, "keyable": bool, "channelBox": bool}"""
+        raise NotImplementedError
+
+    def watch(self, callback):
+        """
+        Registers a callback called as callback(event, nodeName). Events are "added", "removed" and "renamed".
+        A renamed node is reported as "renamed" with the old name and "added" with the new name
+        :return: id for unwatch
+        """
+        raise NotImplementedError
+
+    def unwatch(self, callbackId):
+        raise NotImplementedError
+
+    def nodeId(self, node):
+        """Returns a hashable identity of the node which does not change when the node is renamed"""
+        raise NotImplementedError
+
+    def watchDirty(self, node, callback):
+        """
+        Registers a callback called as callback(node) when the geometry or the world transform of the node may
+        have changed, the node is deleted or the current time changes. The callback can be called many times
+        :return: id for unwatchDirty
+        """
+        raise NotImplementedError
+
+    def unwatchDirty(self, callbackId):
+        raise NotImplementedError
+
+    def meshFingerprint(self, node, space="world", samples=16):
+        """Returns a hashable summary of the mesh positions. Vertex count and a sample of evenly spaced points"""
+        raise NotImplementedError
+
+
+class MayaBackend(Backend):
+    """Backend running on the Maya session. Maya modules are imported on first use"""
+    name = "maya"
+
+    def __init__(self):
+        self._modules = {}
+        # name -> MDagPath / MObject lookups. Only filled inside a lookupCache scope
+        self._lookupCache = {}
+        self._lookupDepth = 0
+        self._callbacks = []
+
+    def _module(self, name):
+        if name not in self._modules:
+            self._modules[name] = importlib.import_module(name)
+        return self._modules[name]
+
+    @property
+    def cmds(self):
+        return self._module("maya.cmds")
+
+    @property
+    def om(self):
+        return self._module("maya.OpenMaya")
+
+    @property
+    def oma(self):
+        return self._module("maya.OpenMayaAnim")
+
+    # ___________Lookups ___________
+
+    def clearLookupCache(self, *args):
+        """Clears the cached node lookups. Accepts any arguments so it can be used as a Maya callback"""
+        self._lookupCache.clear()
+
+    @contextmanager
+    def lookupCache(self):
+        om = self.om
+        self._lookupDepth += 1
+        if self._lookupDepth == 1:
+            self._callbacks = [
+                om.MNodeMessage.addNameChangedCallback(om.MObject(), self.clearLookupCache),
+                om.MDGMessage.addNodeRemovedCallback(self.clearLookupCache, "dependNode"),
+                # reparenting changes the dag paths of the node and its descendants
+                om.MDagMessage.addParentAddedCallback(self.clearLookupCache),
+                om.MDagMessage.addParentRemovedCallback(self.clearLookupCache),
+            ]
+        try:
+            yield
+        finally:
+            self._lookupDepth -= 1
+            if self._lookupDepth == 0:
+                for callbackId in self._callbacks:
+                    om.MMessage.removeCallback(callbackId)
+                self._callbacks = []
+                self.clearLookupCache()
+
+    def watch(self, callback):
+        om = self.om
+
+        def nodeName(mObject):
+            return om.MFnDependencyNode(mObject).name()
+
+        return [
+            om.MDGMessage.addNodeAddedCallback(lambda mObject, *args: callback("added", nodeName(mObject)),
+                                               "dependNode"),
+            om.MDGMessage.addNodeRemovedCallback(lambda mObject, *args: callback("removed", nodeName(mObject)),
+                                                 "dependNode"),
+            om.MNodeMessage.addNameChangedCallback(om.MObject(), lambda mObject, previous, *args: (
+                callback("renamed", previous), callback("added", nodeName(mObject)))),
+        ]
+
+    def unwatch(self, callbackId):
+        for mayaCallbackId in callbackId:
+            self.om.MMessage.removeCallback(mayaCallbackId)
+
+    def nodeId(self, node):
+        return self.om.MObjectHandle(self.mObject(node)).hashCode()
+
+    def _shapePath(self, node):
+        dagPath = self.dagPaths([node])[0]
+        try:
+            dagPath.extendToShape()
+        except RuntimeError:
+            # already a shape
+            pass
+        return dagPath
+
+    def watchDirty(self, node, callback):
+        om = self.om
+        # the shape is dirtied by its own changes and by the world matrix changes of its parents
+        shape = self._shapePath(node).node()
+        return [
+            om.MNodeMessage.addNodeDirtyPlugCallback(shape, lambda *args: callback(node)),
+            om.MNodeMessage.addNodePreRemovalCallback(shape, lambda *args: callback(node)),
+            # Evaluation Manager re-evaluates animated and deformed meshes on frame changes without dirty messages
+            om.MDGMessage.addTimeChangeCallback(lambda *args: callback(node)),
+        ]
+
+    def unwatchDirty(self, callbackId):
+        self.unwatch(callbackId)
+
+    def meshFingerprint(self, node, space="world", samples=16):
+        om = self.om
+        space = {"world": om.MSpace.kWorld, "object": om.MSpace.kObject}.get(space, space)
+        fnMesh = om.MFnMesh(self._shapePath(node))
+        count = fnMesh.numVertices()
+        point = om.MPoint()
+        values = [count]
+        for i in range(0, count, max(1, count // samples)):
+            fnMesh.getPoint(i, point, space)
+            values.extend((point.x, point.y, point.z))
+        return tuple(values)
+
+    def _selection(self, names):
+        """
+        Adds the names to a selection list
+        :return: (OrderedDict) name -> (MSelectionList, index). MSelectionList merges repeated items and other
+                    spellings of the same item (eg. "ctrl" and "|ctrl", "ctrl.tx" and "ctrl.translateX"),
+                    so each name is added once and merged spellings get a list of their own
+        """
+        om = self.om
+        selList = om.MSelectionList()
+        items = OrderedDict()
+        for name in names:
+            if name in items:
+                continue
+            length = selList.length()
+            selList.add(name)
+            if selList.length() > length:
+                items[name] = (selList, length)
+            else:
+                aliasList = om.MSelectionList()
+                aliasList.add(name)
+                items[name] = (aliasList, 0)
+        return items
+
+    def dagPaths(self, nodes):
+        """Returns MDagPath objects of the given nodes resolved with a single selection list"""
+        om = self.om
+        dagPaths = [None] * len(nodes)
+        missing = []
+        for i, node in enumerate(nodes):
+            key = ("MDagPath", node)
+            if key in self._lookupCache:
+                dagPaths[i] = om.MDagPath(self._lookupCache[key])
+            else:
+                missing.append(i)
+        resolved = {}
+        for node, (selList, listIndex) in self._selection([nodes[i] for i in missing]).items():
+            dagPath = resolved[node] = om.MDagPath()
+            selList.getDagPath(listIndex, dagPath)
+            if self._lookupDepth:
+                self._lookupCache[("MDagPath", node)] = om.MDagPath(dagPath)
+        for i in missing:
+            dagPaths[i] = om.MDagPath(resolved[nodes[i]])
+        return dagPaths
+
+    def mObject(self, node):
+        om = self.om
+        key = ("MObject", node)
+        if key in self._lookupCache:
+            return om.MObject(self._lookupCache[key])
+        selList = om.MSelectionList()
+        selList.add(node)
+        mObject = om.MObject()
+        selList.getDependNode(0, mObject)
+        if self._lookupDepth:
+            self._lookupCache[key] = om.MObject(mObject)
+        return mObject
+
+    # ___________Transforms ___________
+
+    def worldTranslations(self, nodes):
+        om = self.om
+        fnTransform = om.MFnTransform()
+        positions = []
+        for dagPath in self.dagPaths(nodes):
+            fnTransform.setObject(dagPath)
+            pivot = fnTransform.rotatePivot(om.MSpace.kWorld)
+            positions.append((pivot.x, pivot.y, pivot.z))
+        return positions
+
+    def worldMatrices(self, nodes):
+        matrices = []
+        for dagPath in self.dagPaths(nodes):
+            mMatrix = dagPath.inclusiveMatrix()
+            matrices.append([mMatrix(row, column) for row in range(4) for column in range(4)])
+        return matrices
+
+    def setWorldTransform(self, node, matrix, translation=True, rotation=True):
+        om = self.om
+        nodeMTransform = om.MFnTransform(self.dagPaths([node])[0])
+        if rotation:
+            mMatrix = om.MMatrix()
+            om.MScriptUtil.createMatrixFromList([float(v) for row in matrix for v in row], mMatrix)
+            nodeMTransform.setRotation(om.MTransformationMatrix(mMatrix).rotation(), om.MSpace.kWorld)
+        if translation:
+            nodeMTransform.setTranslation(om.MVector(*[float(v) for v in matrix[3][:3]]), om.MSpace.kWorld)
+
+    # ___________Meshes ___________
+
+    def meshPoints(self, node, space="world", start=None, end=None):
+        om = self.om
+        space = {"world": om.MSpace.kWorld, "object": om.MSpace.kObject}.get(space, space)
+        dagPath = self._shapePath(node)
+        fnMesh = om.MFnMesh(dagPath)
+        start = start or 0
+        end = fnMesh.numVertices() - 1 if end is None else end
+        if np is None or space not in (om.MSpace.kWorld, om.MSpace.kObject):
+            # other spaces are only available through MPointArray
+            vertPoints = om.MPointArray()
+            fnMesh.getPoints(vertPoints, space)
+            flat = []
+            for i in range(start, end + 1):
+                point = vertPoints[i]
+                flat.extend((point.x, point.y, point.z))
+            return np.array(flat, dtype=np.float64) if np is not None else flat
+        # object space float32 positions of the mesh. Only the requested rows are copied out of the Maya buffer
+        rawPoints = (ctypes.c_float * ((end + 1) * 3)).from_address(int(fnMesh.getRawPoints()))
+        points = np.frombuffer(rawPoints, dtype=np.float32, offset=start * 12).reshape(-1, 3).astype(np.float64)
+        if space == om.MSpace.kWorld:
+            mMatrix = dagPath.inclusiveMatrix()
+            matrix = np.array([[mMatrix(row, column) for column in range(4)] for row in range(4)])
+            points = points.dot(matrix[:3, :3]) + matrix[3, :3]
+        return points.ravel()
+
+    # ___________Attributes ___________
+
+    def channelStates(self, plugs):
+        om = self.om
+        states = {}
+        mPlug = om.MPlug()
+        for plug, (selList, listIndex) in self._selection(plugs).items():
+            selList.getPlug(listIndex, mPlug)
+            states[plug] = {
+                "lock": mPlug.isLocked(),
+                "keyable": mPlug.isKeyable(),
+                "channelBox": mPlug.isChannelBoxFlagSet(),
+            }
+        return states
+
+
+# ___________Fake scene ___________
+
+# short name -> long name of the built-in transform channels
+_CHANNEL_ALIASES = {"t": "translate", "r": "rotate", "s": "scale", "v": "visibility",
+                    "jo": "jointOrient", "ra": "rotateAxis"}
+_VECTOR_CHANNELS = ("translate", "rotate", "scale", "jointOrient", "rotateAxis")
+_AXES = ("X", "Y", "Z")
+for _long in _VECTOR_CHANNELS:
+    _short = [s for s, l in _CHANNEL_ALIASES.items() if l == _long][0]
+    for _axis in _AXES:
+        _CHANNEL_ALIASES["%s%s" % (_short, _axis.lower())] = "%s%s" % (_long, _axis)
+
+
+def longPlugName(plug):
+    """Spells the built-in transform channel of the plug with its long name. eg: ctrl.tx -> ctrl.translateX"""
+    node, _, attr = plug.rpartition(".")
+    return "%s.%s" % (node, _CHANNEL_ALIASES.get(attr, attr)) if node else plug
+
+
+class FakeNode(object):
+    """Node of the fake scene"""
+    def __init__(self, name, nodeType="transform", parent=None):
+        self.name = name
+        self.type = nodeType
+        self.parent = parent
+        self.values = {"translate": [0.0, 0.0, 0.0], "rotate": [0.0, 0.0, 0.0], "scale": [1.0, 1.0, 1.0],
+                       "jointOrient": [0.0, 0.0, 0.0], "rotateAxis": [0.0, 0.0, 0.0], "visibility": True}
+        self.states = {}
+        self.userAttrs = OrderedDict()  # long name -> addAttr flags
+        # frozen transformations. local matrix = channel matrix * offset
+        self.offset = np.eye(4)
+        self.points = None
+
+    def state(self, attr):
+        default = {"lock": False, "keyable": attr not in ("jointOrient", "rotateAxis"), "channelBox": False}
+        if attr in self.userAttrs:
+            default["keyable"] = bool(self.userAttrs[attr].get("k", False))
+        return self.states.setdefault(attr, default)
+
+    def channelMatrix(self):
+        """Local matrix of the channels in Maya order: scale * rotateAxis * rotate * jointOrient, then translate"""
+        matrix = np.eye(4)
+        rotations = vectors.eulerMatrices([self.values["rotateAxis"], self.values["rotate"],
+                                           self.values["jointOrient"]])
+        matrix[:3, :3] = np.diag(self.values["scale"]).dot(rotations[0]).dot(rotations[1]).dot(rotations[2])
+        matrix[3, :3] = self.values["translate"]
+        return matrix
+
+    def setChannelMatrix(self, matrix):
+        """Decomposes the local channel matrix back into translate, rotate and scale. rotateAxis and jointOrient
+        are kept"""
+        upper = np.asarray(matrix)[:3, :3]
+        scale = np.sqrt((upper * upper).sum(axis=1))
+        rotations = vectors.eulerMatrices([self.values["rotateAxis"], self.values["jointOrient"]])
+        rotation = rotations[0].T.dot(upper / scale[:, None]).dot(rotations[1].T)
+        self.values["rotate"] = vectors.matrixToEuler([rotation])[0].tolist()
+        self.values["scale"] = scale.tolist()
+        self.values["translate"] = np.asarray(matrix)[3, :3].tolist()
+
+
+class FakeCmds(object):
+    """
+    Subset of maya.cmds working on a FakeBackend scene. Other commands raise AttributeError.
+    Supported commands:
+        nodes      : objExists, ls, nodeType, createNode, group, spaceLocator, joint, delete, rename, parent,
+                     listRelatives
+        transforms : makeIdentity, xform (query only)
+        meshes     : polyEvaluate (vertex count)
+        time       : currentTime
+        attributes : getAttr, setAttr, addAttr, deleteAttr, listAttr, attributeQuery, copyAttr, connectAttr
+        other      : undoInfo, warning, error
+    """
+    def __init__(self, scene):
+        self._scene = scene
+
+    def __getattr__(self, name):
+        raise AttributeError("fake backend does not implement cmds.%s" % name)
+
+    # ___________Nodes ___________
+
+    def objExists(self, name):
+        return self._scene.resolve(name) in self._scene.nodes or self._isPlug(name)
+
+    def _isPlug(self, name):
+        if "." not in name:
+            return False
+        node, attr = name.split(".", 1)
+        node = self._scene.nodes.get(self._scene.resolve(node))
+        return node is not None and self._scene.longAttr(node, attr) is not None
+
+    def ls(self, *names, **kwargs):
+        if not names:
+            nodes = list(self._scene.nodes)
+        else:
+            nodes = []
+            for name in names:
+                for n in (name if isinstance(name, (list, tuple)) else [name]):
+                    if "*" in n:
+                        pattern = self._scene.resolve(n)
+                        nodes.extend(k for k in self._scene.nodes if fnmatch.fnmatchcase(k, pattern))
+                    elif self._scene.resolve(n) in self._scene.nodes:
+                        nodes.append(self._scene.resolve(n))
+        if kwargs.get("long") or kwargs.get("l"):
+            nodes = [self._scene.fullPath(n) for n in nodes]
+        return nodes
+
+    def nodeType(self, name):
+        return self._scene.node(name).type
+
+    def createNode(self, nodeType, name=None, parent=None, **kwargs):
+        return self._scene.addNode(name or "%s1" % nodeType, nodeType, parent=parent)
+
+    def group(self, *nodes, **kwargs):
+        name = kwargs.get("name", kwargs.get("n", "group1"))
+        grp = self._scene.addNode(name, "transform", parent=kwargs.get("parent", kwargs.get("p")))
+        for node in nodes:
+            self.parent(node, grp)
+        return grp
+
+    def spaceLocator(self, name="locator1", **kwargs):
+        return [self._scene.addNode(name, "locator")]
+
+    def joint(self, name="joint1", position=(0.0, 0.0, 0.0), **kwargs):
+        joint = self._scene.addNode(name, "joint", parent=kwargs.get("parent", kwargs.get("p")))
+        self._scene.setWorldTransform(joint, np.vstack((np.eye(4)[:3], list(position) + [1.0])), rotation=False)
+        return joint
+
+    def delete(self, *nodes):
+        for node in nodes:
+            for n in (node if isinstance(node, (list, tuple)) else [node]):
+                self._scene.deleteNode(n)
+
+    def rename(self, node, newName):
+        return self._scene.renameNode(node, newName)
+
+    def parent(self, *args, **kwargs):
+        if kwargs.get("w") or kwargs.get("world"):
+            nodes, newParent = args, None
+        else:
+            nodes, newParent = args[:-1], self._scene.resolve(args[-1])
+        result = []
+        for node in nodes:
+            for n in (node if isinstance(node, (list, tuple)) else [node]):
+                node = self._scene.node(n)
+                world = self._scene.worldMatrix(node.name)
+                node.parent = newParent
+                self._scene.setLocalMatrix(node.name, world.dot(np.linalg.inv(self._scene.parentMatrix(node.name))))
+                result.append(node.name)
+        return result
+
+    def listRelatives(self, node, parent=False, p=False, children=False, c=False, allDescendents=False,
+                      ad=False, fullPath=False, f=False, **kwargs):
+        node = self._scene.node(node).name
+        if parent or p:
+            result = [self._scene.nodes[node].parent] if self._scene.nodes[node].parent else []
+        elif allDescendents or ad:
+            result = self._scene.descendants(node)
+        else:
+            result = [n.name for n in self._scene.nodes.values() if n.parent == node]
+        if fullPath or f:
+            result = [self._scene.fullPath(n) for n in result]
+        return result or None
+
+    def makeIdentity(self, *nodes, **kwargs):
+        apply = dict((channel, kwargs.get(channel, kwargs.get(flag, False)))
+                     for channel, flag in (("translate", "t"), ("rotate", "r"), ("scale", "s")))
+        if not any(apply.values()):
+            apply = dict.fromkeys(apply, True)
+        for node in nodes:
+            for n in (node if isinstance(node, (list, tuple)) else [node]):
+                self._scene.freeze(n, **apply)
+
+    def xform(self, item, q=False, query=False, t=False, translation=False, ws=False, worldSpace=False,
+              m=False, matrix=False, rp=False, rotatePivot=False, **kwargs):
+        if not (q or query):
+            raise NotImplementedError("xform edit mode is not supported by the fake backend")
+        space = "world" if (ws or worldSpace) else "object"
+        if ".vtx[" in item:
+            node, component = item.split(".vtx[")
+            component = component.rstrip("]")
+            if component == "*":
+                return self._scene.meshPoints(node, space).tolist()
+            start, end = (component.split(":") + [component])[:2]
+            return self._scene.meshPoints(node, space, int(start), int(end)).tolist()
+        if m or matrix:
+            if space == "world":
+                return self._scene.worldMatrix(item).ravel().tolist()
+            return self._scene.localMatrix(item).ravel().tolist()
+        if t or translation or rp or rotatePivot:
+            if space == "world":
+                return self._scene.worldMatrix(item)[3, :3].tolist()
+            return self._scene.localMatrix(item)[3, :3].tolist()
+        raise NotImplementedError("xform query flags are not supported by the fake backend")
+
+    def polyEvaluate(self, node, vertex=False, v=False, **kwargs):
+        return len(self._scene.node(node).points)
+
+    def currentTime(self, time=None, q=False, query=False, e=False, edit=False, **kwargs):
+        if q or query:
+            return self._scene.time
+        self._scene.time = float(time)
+        self._scene.timeChanged()
+        return self._scene.time
+
+    # ___________Attributes ___________
+
+    def getAttr(self, plug, lock=False, l=False, keyable=False, k=False, channelBox=False, cb=False,
+                type=False, **kwargs):
+        node, attr = self._scene.plug(plug)
+        if lock or l:
+            return node.state(attr)["lock"]
+        if keyable or k:
+            return node.state(attr)["keyable"]
+        if channelBox or cb:
+            return node.state(attr)["channelBox"]
+        if type:
+            if attr in node.userAttrs:
+                return node.userAttrs[attr].get("dt") or node.userAttrs[attr].get("at")
+            return "double3" if attr in _VECTOR_CHANNELS else "doubleLinear"
+        if attr in _VECTOR_CHANNELS:
+            return [tuple(node.values[attr])]
+        if attr[:-1] in _VECTOR_CHANNELS:
+            return node.values[attr[:-1]][_AXES.index(attr[-1])]
+        return node.values[attr]
+
+    def setAttr(self, plug, *values, **kwargs):
+        node, attr = self._scene.plug(plug)
+        for flag, short in (("lock", "l"), ("keyable", "k"), ("channelBox", "cb")):
+            if flag in kwargs or short in kwargs:
+                node.state(attr)[flag] = bool(kwargs.get(flag, kwargs.get(short)))
+        if not values:
+            return
+        if node.state(attr)["lock"]:
+            raise RuntimeError("The attribute '%s' is locked or connected and cannot be modified." % plug)
+        if attr in _VECTOR_CHANNELS:
+            node.values[attr] = [float(v) for v in values]
+        elif attr[:-1] in _VECTOR_CHANNELS:
+            node.values[attr[:-1]][_AXES.index(attr[-1])] = float(values[0])
+        else:
+            node.values[attr] = values[0]
+        self._scene.changed(node.name)
+
+    def addAttr(self, node, **flags):
+        node = self._scene.node(node)
+        longName = flags.get("ln", flags.get("longName"))
+        if longName in node.userAttrs or longName in node.values:
+            raise RuntimeError("Found an attribute with the same name: %s" % longName)
+        node.userAttrs[longName] = dict(flags)
+        node.values[longName] = flags.get("dv", None if flags.get("dt") else 0)
+
+    def deleteAttr(self, plug):
+        node, attr = self._scene.plug(plug)
+        node.userAttrs.pop(attr)
+        node.values.pop(attr, None)
+        node.states.pop(attr, None)
+
+    def listAttr(self, node, ud=False, userDefined=False, **kwargs):
+        node = self._scene.node(node)
+        if ud or userDefined:
+            return list(node.userAttrs) or None
+        return list(node.values)
+
+    def attributeQuery(self, attr, node=None, **kwargs):
+        node = self._scene.node(node)
+        longName = self._scene.longAttr(node, attr)
+        if kwargs.get("exists") or kwargs.get("ex"):
+            return longName is not None
+        flags = node.userAttrs.get(longName, {})
+        queries = {
+            "longName": longName,
+            "shortName": flags.get("sn", longName),
+            "attributeType": "typed" if flags.get("dt") else flags.get("at", "double"),
+            "hidden": bool(flags.get("h", False)),
+            "keyable": node.state(longName)["keyable"],
+            "readable": bool(flags.get("r", True)),
+            "writable": bool(flags.get("w", True)),
+            "enum": flags.get("at") == "enum",
+            "listEnum": [flags.get("en", "")],
+            "listDefault": [flags.get("dv", 0.0)],
+        }
+        for exists, value, flag in (("minExists", "minimum", "min"), ("maxExists", "maximum", "max"),
+                                    ("softMinExists", "softMin", "smn"), ("softMaxExists", "softMax", "smx")):
+            queries[exists] = flag in flags
+            queries[value] = [flags.get(flag)]
+        for query in kwargs:
+            if query in queries:
+                return queries[query]
+        raise NotImplementedError("attributeQuery flags %s are not supported by the fake backend" % kwargs)
+
+    def copyAttr(self, source, target, attribute=(), values=True, **kwargs):
+        source, target = self._scene.node(source), self._scene.node(target)
+        if values:
+            for attr in attribute:
+                target.values[attr] = source.values[attr]
+
+    def connectAttr(self, source, destination, **kwargs):
+        sourceNode, sourceAttr = self._scene.plug(source)
+        self.setAttr(destination, sourceNode.values[sourceAttr])
+
+    # ___________Session ___________
+
+    def undoInfo(self, openChunk=False, closeChunk=False, **kwargs):
+        if openChunk:
+            self._scene.undoChunks += 1
+            self._scene.openUndoChunks += 1
+        if closeChunk:
+            self._scene.openUndoChunks -= 1
+
+    def warning(self, message):
+        logger.warning(message)
+
+    def error(self, message):
+        raise RuntimeError(message)
+
+
+class FakeBackend(Backend):
+    """
+    In-memory scene backend. Supports transforms, joints, locators and point only meshes with the subset of
+    maya.cmds implemented in FakeCmds. Node names must be unique. OpenMaya is not available.
+    """
+    name = "fake"
+
+    def __init__(self):
+        if np is None:
+            raise ImportError("numpy is required for the fake backend")
+        self.nodes = OrderedDict()
+        self.cmds = FakeCmds(self)
+        # number of opened undo chunks and the ones not closed yet
+        self.undoChunks = 0
+        self.openUndoChunks = 0
+        self.time = 0.0
+        self._watchers = []
+        # id -> (node, callback)
+        self._dirtyWatchers = {}
+        self._nextDirtyWatcher = 0
+
+    @property
+    def om(self):
+        raise AttributeError("fake backend does not implement OpenMaya")
+
+    oma = om
+
+    # ___________Scene ___________
+
+    def resolve(self, name):
+        """Converts dag paths to the short node name"""
+        return name.split("|")[-1]
+
+    def node(self, name):
+        try:
+            return self.nodes[self.resolve(name)]
+        except KeyError:
+            raise ValueError("No object matches name: %s" % name)
+
+    def plug(self, plug):
+        name, attr = plug.split(".", 1)
+        node = self.node(name)
+        longName = self.longAttr(node, attr)
+        if longName is None:
+            raise ValueError("No object matches name: %s" % plug)
+        return node, longName
+
+    def longAttr(self, node, attr):
+        attr = _CHANNEL_ALIASES.get(attr, attr)
+        if attr in node.values or attr[:-1] in _VECTOR_CHANNELS:
+            return attr
+        for longName, flags in node.userAttrs.items():
+            if flags.get("sn") == attr:
+                return longName
+        return None
+
+    def uniqueName(self, name):
+        if name not in self.nodes:
+            return name
+        base = name.rstrip("0123456789")
+        index = 1
+        while "%s%i" % (base, index) in self.nodes:
+            index += 1
+        return "%s%i" % (base, index)
+
+    def addNode(self, name, nodeType="transform", parent=None):
+        name = self.uniqueName(name)
+        self.nodes[name] = FakeNode(name, nodeType, parent=self.resolve(parent) if parent else None)
+        self._notify("added", name)
+        return name
+
+    def addMesh(self, name, points, parent=None):
+        """
+        Creates a point only mesh
+        :param name: (String) mesh name
+        :param points: (Sequence) object space vertex positions
+        :param parent: (String) Optional. Parent node
+        :return: (String) name of the created node
+        """
+        name = self.addNode(name, "mesh", parent=parent)
+        self.nodes[name].points = vectors.asPoints(points).copy()
+        return name
+
+    def setPoints(self, name, points, indices=None):
+        """Moves the mesh vertices. Notifies the scene watchers"""
+        node = self.node(name)
+        if indices is None:
+            node.points = vectors.asPoints(points).copy()
+        else:
+            node.points[np.asarray(indices)] = vectors.asPoints(points)
+        self.changed(node.name)
+
+    def fullPath(self, name):
+        node = self.node(name)
+        path = "|%s" % node.name
+        while node.parent:
+            node = self.nodes[node.parent]
+            path = "|%s%s" % (node.name, path)
+        return path
+
+    def descendants(self, name):
+        children = [n.name for n in self.nodes.values() if n.parent == name]
+        result = list(children)
+        for child in children:
+            result.extend(self.descendants(child))
+        return result
+
+    def deleteNode(self, name):
+        name = self.node(name).name
+        for child in self.descendants(name):
+            self.nodes.pop(child, None)
+            self._notify("removed", child)
+        self.nodes.pop(name)
+        self._notify("removed", name)
+
+    def renameNode(self, name, newName):
+        node = self.node(name)
+        newName = self.uniqueName(newName)
+        self.nodes = OrderedDict((newName if k == node.name else k, v) for k, v in self.nodes.items())
+        for other in self.nodes.values():
+            if other.parent == node.name:
+                other.parent = newName
+        oldName, node.name = node.name, newName
+        self._notify("renamed", oldName)
+        self._notify("added", newName)
+        return newName
+
+    def watch(self, callback):
+        """
+        Registers a callback called as callback(event, nodeName) for "added", "removed", "renamed" and
+        "changed" events. "changed" is sent when a node or one of its parents is modified
+        :return: (Int) id for unwatch
+        """
+        self._watchers.append(callback)
+        return len(self._watchers) - 1
+
+    def unwatch(self, callbackId):
+        self._watchers[callbackId] = None
+
+    def nodeId(self, node):
+        return id(self.node(node))
+
+    def watchDirty(self, node, callback):
+        callbackId = self._nextDirtyWatcher
+        self._nextDirtyWatcher += 1
+        self._dirtyWatchers[callbackId] = (self.node(node), callback)
+        return callbackId
+
+    def unwatchDirty(self, callbackId):
+        self._dirtyWatchers.pop(callbackId, None)
+
+    def timeChanged(self):
+        """Notifies the dirty watchers of a time change, as the Maya backend does"""
+        for node, callback in list(self._dirtyWatchers.values()):
+            callback(node.name)
+
+    def changed(self, name):
+        """Notifies the watchers that the node and its children are modified"""
+        self._notify("changed", name)
+        for child in self.descendants(name):
+            self._notify("changed", child)
+
+    def _notify(self, event, name):
+        for callback in self._watchers:
+            if callback is not None:
+                callback(event, name)
+        if event in ("changed", "removed"):
+            for node, callback in list(self._dirtyWatchers.values()):
+                if node.name == name:
+                    callback(name)
+
+    # ___________Matrices ___________
+
+    def localMatrix(self, name):
+        node = self.node(name)
+        return node.channelMatrix().dot(node.offset)
+
+    def parentMatrix(self, name):
+        parent = self.node(name).parent
+        return self.worldMatrix(parent) if parent else np.eye(4)
+
+    def worldMatrix(self, name):
+        return self.localMatrix(name).dot(self.parentMatrix(name))
+
+    def setLocalMatrix(self, name, matrix):
+        node = self.node(name)
+        node.setChannelMatrix(np.asarray(matrix).dot(np.linalg.inv(node.offset)))
+        self.changed(node.name)
+
+    def freeze(self, name, translate=True, rotate=True, scale=True):
+        """makeIdentity with apply. Joints move rotations into jointOrient, other nodes keep their world
+        transformation in the frozen offset"""
+        node = self.node(name)
+        if node.type == "joint":
+            if rotate:
+                rotations = vectors.eulerMatrices([node.values["rotateAxis"], node.values["rotate"],
+                                                   node.values["jointOrient"]])
+                orient = rotations[0].dot(rotations[1]).dot(rotations[2])
+                node.values["jointOrient"] = vectors.matrixToEuler([orient])[0].tolist()
+                node.values["rotate"] = [0.0, 0.0, 0.0]
+                node.values["rotateAxis"] = [0.0, 0.0, 0.0]
+            return
+        before = node.channelMatrix()
+        for channel, apply, identity in (("translate", translate, 0.0), ("rotate", rotate, 0.0),
+                                         ("scale", scale, 1.0)):
+            if apply:
+                node.values[channel] = [identity] * 3
+        node.offset = np.linalg.inv(node.channelMatrix()).dot(before).dot(node.offset)
+
+    # ___________Backend interface ___________
+
+    @contextmanager
+    def lookupCache(self):
+        # fake lookups are dictionary reads already
+        yield
+
+    def clearLookupCache(self, *args):
+        pass
+
+    def worldTranslations(self, nodes):
+        return [tuple(self.worldMatrix(node)[3, :3].tolist()) for node in nodes]
+
+    def worldMatrices(self, nodes):
+        return [self.worldMatrix(node).ravel().tolist() for node in nodes]
+
+    def setWorldTransform(self, node, matrix, translation=True, rotation=True):
+        matrix = np.asarray(matrix, dtype=np.float64).reshape(4, 4)
+        current = self.worldMatrix(node)
+        target = current.copy()
+        if rotation:
+            scale = np.sqrt((current[:3, :3] ** 2).sum(axis=1))
+            target[:3, :3] = vectors.normalize(matrix[:3, :3]) * scale[:, None]
+        if translation:
+            target[3, :3] = matrix[3, :3]
+        self.setLocalMatrix(node, target.dot(np.linalg.inv(self.parentMatrix(node))))
+
+    def meshPoints(self, node, space="world", start=None, end=None):
+        points = self.node(node).points
+        if start is not None:
+            points = points[start:end + 1]
+        if space == "world":
+            world = self.worldMatrix(node)
+            points = points.dot(world[:3, :3]) + world[3, :3]
+        return points.astype(np.float64).ravel()
+
+    def meshFingerprint(self, node, space="world", samples=16):
+        points = np.asarray(self.meshPoints(node, space)).reshape(-1, 3)
+        return (len(points),) + tuple(points[::max(1, len(points) // samples)].ravel().tolist())
+
+    def channelStates(self, plugs):
+        states = {}
+        for plug in plugs:
+            node, attr = self.plug(plug)
+            states[plug] = dict(node.state(attr))
+        return states
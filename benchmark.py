@@ -0,0 +1,383 @@
+"""Headless benchmarks for the library hot paths.
+
+Runs against generated data and the fake scene backend, Maya is not required.
+
+Usage:
+    python benchmark.py --output results.json
+    python benchmark.py --baseline results.json --threshold 0.2
+    python benchmark.py --filter json --filter copytree --scale 0.1
+"""
+
+from __future__ import print_function
+
+import os
+import sys
+import time
+import shutil
+import random
+import string
+import argparse
+import platform
+import tempfile
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+import backend
+import spatial
+import structure
+import utils
+import vectors
+import weights
+
+__author__ = "Arda Kutlu"
+__copyright__ = "Copyright 2019, Library Benchmark Functions"
+__credits__ = []
+__license__ = "GPL"
+__maintainer__ = "Arda Kutlu"
+__email__ = "ardakutlu@gmail.com"
+__status__ = "Development"
+
+_timer = getattr(time, "perf_counter", time.time)
+
+# (name, function, needsNumpy) in registration order
+BENCHMARKS = []
+
+
+def benchmark(name, numpy=False):
+    """
+    Registers the decorated function as a benchmark. The function gets a Context, does its setup and returns
+    the callable to be timed
+    :param name: (String) dotted benchmark name. eg: "json.load"
+    :param numpy: (Boolean) If True, the benchmark is skipped when numpy is not available
+    """
+    def register(function):
+        BENCHMARKS.append((name, function, numpy))
+        return function
+    return register
+
+
+class Context(object):
+    """Setup helpers handed to the benchmark functions"""
+    def __init__(self, folder, scale=1.0, seed=0):
+        self.folder = folder
+        self.scale = scale
+        self.random = random.Random(seed)
+        self.scene = None
+        self._counter = 0
+
+    def count(self, n):
+        """Scales the data size"""
+        return max(1, int(n * self.scale))
+
+    def path(self, *parts):
+        return os.path.join(self.folder, *parts)
+
+    def newPath(self, prefix):
+        """Returns a path which is not used yet. For benchmarks writing a fresh target on each call"""
+        self._counter += 1
+        return self.path("%s_%i" % (prefix, self._counter))
+
+    def names(self, count, invalidRatio=0.1):
+        """Generates file like names, some of them with illegal characters"""
+        letters = string.ascii_letters + string.digits + "_-"
+        names = []
+        for _ in range(count):
+            name = "".join(self.random.choice(letters) for _ in range(self.random.randint(6, 24)))
+            if self.random.random() < invalidRatio:
+                name += self.random.choice(" !?*#")
+            names.append(name)
+        return names
+
+    def jsonData(self, count):
+        return {
+            "info": {"name": "benchmark", "version": 1},
+            "items": [{"name": "item%i" % i, "index": i, "value": self.random.random(),
+                       "tags": ["a", "b", "c"], "matrix": [float(x) for x in range(16)]} for i in range(count)],
+        }
+
+    def tree(self, root, folders, filesPerFolder, size):
+        """Creates a synthetic folder tree with random file contents"""
+        for f in range(folders):
+            folder = os.path.join(root, "folder%i" % (f % 10), "sub%i" % f)
+            os.makedirs(folder)
+            for i in range(filesPerFolder):
+                with open(os.path.join(folder, "file%i.bin" % i), "wb") as fileObj:
+                    fileObj.write(os.urandom(size))
+        return root
+
+    def points(self, count):
+        return np.random.RandomState(self.random.randint(0, 2 ** 31)).uniform(-10.0, 10.0, (count, 3))
+
+
+# ___________Structure ___________
+
+@benchmark("json.load")
+def benchJsonLoad(context):
+    file = context.path("load.json")
+    structure.dumpJson(context.jsonData(context.count(20000)), file)
+    return lambda: structure.loadJson(file)
+
+@benchmark("json.load.cached")
+def benchJsonLoadCached(context):
+    file = context.path("cached.json")
+    structure.dumpJson(context.jsonData(context.count(20000)), file)
+    structure.loadJson(file, cache=True)
+    return lambda: structure.loadJson(file, cache=True, readOnly=True)
+
+@benchmark("json.dump")
+def benchJsonDump(context):
+    data = context.jsonData(context.count(20000))
+    file = context.path("dump.json")
+    return lambda: structure.dumpJson(data, file)
+
+@benchmark("json.dump.compact")
+def benchJsonDumpCompact(context):
+    data = context.jsonData(context.count(20000))
+    file = context.path("compact.json")
+    return lambda: structure.dumpJson(data, file, compact=True)
+
+@benchmark("arrays.dump", numpy=True)
+def benchArraysDump(context):
+    points = context.points(context.count(200000))
+    file = context.path("points.bin")
+    return lambda: structure.dumpArrays({"points": points}, file)
+
+@benchmark("arrays.load.slice", numpy=True)
+def benchArraysLoadSlice(context):
+    count = context.count(200000)
+    file = context.path("points.bin")
+    structure.dumpArrays({"points": context.points(count)}, file)
+    return lambda: structure.loadArrays(file)["points"][count // 2:count // 2 + 1000].sum()
+
+@benchmark("copytree.full")
+def benchCopytree(context):
+    source = context.tree(context.path("source"), context.count(40), 25, 4096)
+    return lambda: structure.copytree(source, context.newPath("full"))
+
+@benchmark("copytree.parallel")
+def benchCopytreeParallel(context):
+    source = context.tree(context.path("source"), context.count(40), 25, 4096)
+    return lambda: structure.copytree(source, context.newPath("parallel"), workers=4)
+
+@benchmark("copytree.incremental")
+def benchCopytreeIncremental(context):
+    source = context.tree(context.path("source"), context.count(40), 25, 4096)
+    target = context.path("incremental")
+    structure.copytree(source, target)
+    return lambda: structure.copytree(source, target, incremental=True)
+
+@benchmark("nameCheck")
+def benchNameCheck(context):
+    names = context.names(context.count(100000))
+    return lambda: [structure.nameCheck(name) for name in names]
+
+@benchmark("nameCheck.batch")
+def benchNameCheckBatch(context):
+    names = context.names(context.count(100000))
+    validator = structure.nameValidator()
+    return lambda: validator.check(names)
+
+@benchmark("validateTree")
+def benchValidateTree(context):
+    source = context.tree(context.path("validate"), context.count(40), 25, 16)
+    return lambda: structure.validateTree(source)
+
+
+# ___________Scene ___________
+
+@benchmark("utils.uniqueName", numpy=True)
+def benchUniqueName(context):
+    count = context.count(2000)
+    for i in range(count):
+        context.scene.addNode("ctrl%s" % (i or ""))
+    return lambda: utils.uniqueName("ctrl")
+
+@benchmark("utils.uniqueNames", numpy=True)
+def benchUniqueNames(context):
+    count = context.count(2000)
+    for i in range(count):
+        context.scene.addNode("ctrl%s" % (i or ""))
+    names = ["ctrl"] * count + ["jnt%i" % i for i in range(count)]
+    return lambda: utils.uniqueNames(names)
+
+@benchmark("utils.uniqueList")
+def benchUniqueList(context):
+    items = [context.random.randint(0, 50000) for _ in range(context.count(200000))]
+    return lambda: utils.uniqueList(items)
+
+@benchmark("utils.getAllVerts", numpy=True)
+def benchGetAllVerts(context):
+    mesh = context.scene.addMesh("mesh", context.points(context.count(100000)))
+    return lambda: utils.getAllVerts(mesh, output="numpy")
+
+@benchmark("utils.getAllVerts.cached", numpy=True)
+def benchGetAllVertsCached(context):
+    mesh = context.scene.addMesh("mesh", context.points(context.count(100000)))
+    return lambda: utils.getAllVerts(mesh, output="numpy", cache=True, readOnly=True)
+
+@benchmark("utils.getDistances", numpy=True)
+def benchGetDistances(context):
+    nodes = []
+    for i, point in enumerate(context.points(context.count(300))):
+        nodes.append(context.scene.addNode("loc%i" % i))
+        context.scene.cmds.setAttr("%s.translate" % nodes[-1], *point)
+    return lambda: utils.getDistances(nodes, nodes)
+
+@benchmark("utils.alignAndAimNodes", numpy=True)
+def benchAlignAndAim(context):
+    count = context.count(200)
+    nodes, targets, aims = [], [], []
+    for i, point in enumerate(context.points(count * 3)):
+        name = context.scene.addNode("node%i" % i)
+        context.scene.cmds.setAttr("%s.translate" % name, *point)
+        (nodes, targets, aims)[i % 3].append(name)
+    return lambda: utils.alignAndAimNodes(nodes, [[t] for t in targets], [[a] for a in aims])
+
+@benchmark("vectors.distanceMatrix", numpy=True)
+def benchDistanceMatrix(context):
+    points = context.points(context.count(2000))
+    return lambda: vectors.distanceMatrix(points, points)
+
+@benchmark("spatial.closest", numpy=True)
+def benchClosest(context):
+    count = context.count(50000)
+    index = spatial.VertexIndex(context.points(count))
+    queries = context.points(count)
+    return lambda: index.closest(queries)
+
+@benchmark("weights.readPlug")
+def benchReadPlug(context):
+    count = context.count(100000)
+    # sparse plug, every 50th weight is left at default
+    plug = weights.MemoryPlug((i, 0.5) for i in range(count) if i % 50)
+    return lambda: weights.readPlug(plug, size=count, default=1.0)
+
+@benchmark("weights.writePlug")
+def benchWritePlug(context):
+    count = context.count(100000)
+    values = weights.makeArray(count, 0.5)
+    plug = weights.MemoryPlug()
+    return lambda: weights.writePlug(plug, values)
+
+@benchmark("weights.transfer", numpy=True)
+def benchTransferWeights(context):
+    count = context.count(100000)
+    source = context.points(count)
+    sourceWeights = np.random.RandomState(0).rand(count, 4).astype(np.float32)
+    targets = context.points(count // 2)
+    return lambda: weights.transferWeights(source, sourceWeights, targets, method="inverseDistance")
+
+
+# ___________Runner ___________
+
+def _measure(function, repeat, minTime):
+    """Times the function. Calls are grouped so each sample runs at least minTime seconds"""
+    start = _timer()
+    function()
+    elapsed = _timer() - start
+    number = max(1, int(minTime / elapsed)) if elapsed > 0 else 1000
+    samples = []
+    for _ in range(repeat):
+        start = _timer()
+        for _ in range(number):
+            function()
+        samples.append((_timer() - start) / number)
+    samples.sort()
+    return {
+        "min": samples[0],
+        "median": samples[len(samples) // 2],
+        "mean": sum(samples) / len(samples),
+        "max": samples[-1],
+        "repeat": repeat,
+        "number": number,
+    }
+
+def run(filters=None, repeat=5, scale=1.0, minTime=0.05, log=None):
+    """
+    Runs the registered benchmarks
+    :param filters: (List) Optional. Only the benchmarks whose names contain any of these are run
+    :param repeat: (Int) number of timing samples per benchmark
+    :param scale: (Float) multiplier for the generated data sizes
+    :param minTime: (Float) minimum duration of each sample in seconds
+    :param log: (Function) Optional. Called with a line of text after each benchmark
+    :return: (Dictionary) {"environment": {...}, "scale": scale, "results": {name: timings}}. Times are in seconds
+    """
+    results = {}
+    for name, function, needsNumpy in BENCHMARKS:
+        if filters and not any(f in name for f in filters):
+            continue
+        if needsNumpy and np is None:
+            results[name] = {"skipped": "numpy is not available"}
+            continue
+        folder = tempfile.mkdtemp(prefix="benchmark_")
+        context = Context(folder, scale=scale)
+        try:
+            if np is not None:
+                with backend.use(backend.FakeBackend()) as scene:
+                    context.scene = scene
+                    results[name] = _measure(function(context), repeat, minTime)
+            else:
+                results[name] = _measure(function(context), repeat, minTime)
+        finally:
+            structure.jsonCache.clear()
+            shutil.rmtree(folder, ignore_errors=True)
+        if log:
+            log("%-28s %12.6f s" % (name, results[name]["median"]))
+    return {
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "numpy": np.__version__ if np is not None else None,
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "scale": scale,
+        "results": results,
+    }
+
+def compare(baseline, current, threshold=0.1):
+    """
+    Compares two run results by median times
+    :param baseline: (Dictionary) results of the reference run
+    :param current: (Dictionary) results of the new run
+    :param threshold: (Float) relative slow down counted as a regression. 0.1 means 10% slower
+    :return: (List) {"name", "baseline", "current", "ratio", "regression"} dictionaries of the benchmarks in both runs
+    """
+    if baseline.get("scale") != current.get("scale"):
+        raise ValueError("Runs with different scales cannot be compared")
+    rows = []
+    for name, timings in current["results"].items():
+        reference = baseline["results"].get(name)
+        if not reference or "median" not in reference or "median" not in timings:
+            continue
+        ratio = timings["median"] / reference["median"] if reference["median"] else float("inf")
+        rows.append({"name": name, "baseline": reference["median"], "current": timings["median"],
+                     "ratio": ratio, "regression": ratio > 1.0 + threshold})
+    return sorted(rows, key=lambda row: row["name"])
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Runs the library benchmarks")
+    parser.add_argument("--output", help="json file to save the results")
+    parser.add_argument("--baseline", help="json results of a previous run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.1, help="relative slow down counted as a regression")
+    parser.add_argument("--filter", action="append", help="run only the benchmarks containing this text")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--scale", type=float, default=1.0, help="multiplier for the generated data sizes")
+    options = parser.parse_args(args)
+
+    results = run(options.filter, repeat=options.repeat, scale=options.scale, log=print)
+    if options.output:
+        structure.dumpJson(results, options.output)
+    if not options.baseline:
+        return 0
+    rows = compare(structure.loadJson(options.baseline), results, threshold=options.threshold)
+    for row in rows:
+        print("%-28s %8.2fx%s" % (row["name"], row["ratio"], "  REGRESSION" if row["regression"] else ""))
+    return 1 if any(row["regression"] for row in rows) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,195 @@
+"""Persistent SQLite index over the json metadata files of a library"""
+
+import os
+import json
+import fnmatch
+import sqlite3
+
+import structure
+
+__author__ = "Arda Kutlu"
+__copyright__ = "Copyright 2019, Library Metadata Functions"
+__credits__ = []
+__license__ = "GPL"
+__maintainer__ = "Arda Kutlu"
+__email__ = "ardakutlu@gmail.com"
+__status__ = "Development"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    mtime REAL NOT NULL,
+    size INTEGER NOT NULL,
+    validName INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS fields (
+    path TEXT NOT NULL REFERENCES files(path) ON DELETE CASCADE,
+    key TEXT NOT NULL,
+    value TEXT
+);
+CREATE INDEX IF NOT EXISTS files_name ON files(name);
+CREATE INDEX IF NOT EXISTS fields_path ON fields(path);
+CREATE INDEX IF NOT EXISTS fields_key_value ON fields(key, value);
+"""
+
+
+def _encode(value):
+    return json.dumps(value, sort_keys=True)
+
+def flattenFields(data, prefix=""):
+    """
+    Flattens nested dictionaries into dotted keys. Other values are kept as they are
+    :param data: (Dictionary) parsed json data
+    :param prefix: (String) key prefix
+    :return: (List) (key, value) tuples
+    """
+    items = []
+    for key, value in data.items():
+        key = "%s%s" % (prefix, key)
+        if isinstance(value, dict) and value:
+            items.extend(flattenFields(value, prefix="%s." % key))
+        else:
+            items.append((key, value))
+    return items
+
+
+class MetadataIndex(object):
+    """
+    Indexes the json files under library folders into a local SQLite database. Files are re-parsed only when their
+    modification time or size changes.
+
+    Example:
+    with MetadataIndex("/home/user/.library_index.db") as index:
+        index.update("/libraries/characters")
+        paths = index.findByValue("info.author", "arda")
+    """
+    def __init__(self, databasePath, pattern="*.json"):
+        """
+        :param databasePath: (String) SQLite database file. Use ":memory:" for a temporary index
+        :param pattern: (String) fnmatch pattern of the metadata files
+        """
+        self.pattern = pattern
+        self.connection = sqlite3.connect(databasePath)
+        self.connection.execute("PRAGMA foreign_keys = ON")
+        self.connection.executescript(_SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.connection.close()
+
+    def _scan(self, root):
+        """Returns path -> (mtime, size) of the metadata files under the root"""
+        found = {}
+        for folder, _, names in os.walk(root):
+            for name in fnmatch.filter(names, self.pattern):
+                path = os.path.join(folder, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                found[path] = (stat.st_mtime, stat.st_size)
+        return found
+
+    def update(self, root):
+        """
+        Brings the index of the root folder up to date. New and changed files are parsed with structure.loadJson,
+        deleted files are removed from the index
+        :param root: (String) library root folder
+        :return: (Dictionary) added, updated, removed and unchanged file counts
+        """
+        root = os.path.abspath(root)
+        found = self._scan(root)
+        indexed = dict((path, (mtime, size)) for path, mtime, size in self._query(
+            "SELECT path, mtime, size FROM files WHERE path >= ? AND path < ?",
+            self._prefixRange(os.path.join(root, ""))))
+
+        summary = {"added": 0, "updated": 0, "removed": 0, "unchanged": 0}
+        with self.connection:
+            removed = [path for path in indexed if path not in found]
+            self.connection.executemany("DELETE FROM files WHERE path = ?", [(path,) for path in removed])
+            summary["removed"] = len(removed)
+            for path, (mtime, size) in found.items():
+                if indexed.get(path) == (mtime, size):
+                    summary["unchanged"] += 1
+                    continue
+                summary["updated" if path in indexed else "added"] += 1
+                self._index(path, mtime, size)
+        return summary
+
+    def _index(self, path, mtime, size):
+        name = structure.niceName(path)
+        data = structure.loadJson(path)
+        self.connection.execute("DELETE FROM files WHERE path = ?", (path,))
+        self.connection.execute("INSERT INTO files VALUES (?, ?, ?, ?, ?)",
+                                (path, name, mtime, size, int(structure.nameCheck(name))))
+        if isinstance(data, dict):
+            self.connection.executemany("INSERT INTO fields VALUES (?, ?, ?)",
+                                        [(path, key, _encode(value)) for key, value in flattenFields(data)])
+
+    def _query(self, sql, parameters=()):
+        return self.connection.execute(sql, parameters).fetchall()
+
+    @staticmethod
+    def _prefixRange(prefix):
+        return prefix, prefix + u"\U0010ffff"
+
+    def findByName(self, name, exact=True):
+        """
+        Finds the files by their nice names (base name without extension)
+        :param name: (String) name to search
+        :param exact: (Boolean) If False, finds the names containing the text
+        :return: (List) file paths
+        """
+        if exact:
+            rows = self._query("SELECT path FROM files WHERE name = ? ORDER BY path", (name,))
+        else:
+            rows = self._query("SELECT path FROM files WHERE instr(name, ?) > 0 ORDER BY path", (name,))
+        return [row[0] for row in rows]
+
+    def findByValue(self, key, value=None):
+        """
+        Finds the files having the key. Nested keys are dotted, eg: "info.author"
+        :param key: (String) field key
+        :param value: Optional. If defined, only the files where the field equals the value are returned
+        :return: (List) file paths
+        """
+        if value is None:
+            rows = self._query("SELECT DISTINCT path FROM fields WHERE key = ? ORDER BY path", (key,))
+        else:
+            rows = self._query("SELECT DISTINCT path FROM fields WHERE key = ? AND value = ? ORDER BY path",
+                               (key, _encode(value)))
+        return [row[0] for row in rows]
+
+    def findByPrefix(self, prefix):
+        """
+        Finds the files under the given path prefix
+        :param prefix: (String) path prefix. End it with a separator to match only the files inside the folder
+        :return: (List) file paths
+        """
+        folder = prefix.endswith(("/", os.sep))
+        prefix = os.path.abspath(prefix)
+        if folder:
+            # abspath drops the trailing separator
+            prefix = os.path.join(prefix, "")
+        rows = self._query("SELECT path FROM files WHERE path >= ? AND path < ? ORDER BY path",
+                           self._prefixRange(prefix))
+        return [row[0] for row in rows]
+
+    def invalidNames(self):
+        """Returns the files which do not pass structure.nameCheck"""
+        return [row[0] for row in self._query("SELECT path FROM files WHERE validName = 0 ORDER BY path")]
+
+    def getFields(self, path):
+        """
+        Gets the indexed fields of the file without reading it
+        :param path: (String) file path
+        :return: (Dictionary) flattened key -> value
+        """
+        rows = self._query("SELECT key, value FROM fields WHERE path = ?", (os.path.abspath(path),))
+        return dict((key, json.loads(value)) for key, value in rows)
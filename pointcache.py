@@ -0,0 +1,335 @@
+"""
+Frame range vertex point caches streamed to disk.
+
+PointCacheRecorder writes the per frame positions of one or more meshes into a preallocated memory mapped file.
+The first recorded frame (or the given rest positions) is kept as the rest frame. Other frames store only the
+vertices which moved away from the rest positions when that is smaller than the full frame.
+PointCache reads single frames and vertex trajectories without loading the whole cache.
+
+Example:
+with pointcache.PointCacheRecorder("/tmp/shot010.pc", ["body", "cloth"], frameCount=120) as recorder:
+    recorder.recordRange(1001, 1120)
+
+cache = pointcache.PointCache("/tmp/shot010.pc")
+cloth = cache.points(1060, "cloth")
+elbow = cache.trajectory("body", [512, 513])
+
+File layout: raw little endian blocks in the binary file, frame table in the json sidecar (file + ".json").
+    rest block : (count, 3) positions per mesh
+    full block : (count, 3) positions
+    delta block: (changed,) uint32 vertex ids followed by (changed, 3) positions
+The sidecar is written when the recorder is closed. A cache without a sidecar is incomplete.
+"""
+
+import os
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+import backend
+import structure
+import utils
+
+__author__ = "Arda Kutlu"
+__copyright__ = "Copyright 2019, Library Point Cache Functions"
+__credits__ = []
+__license__ = "GPL"
+__maintainer__ = "Arda Kutlu"
+__email__ = "ardakutlu@gmail.com"
+__status__ = "Development"
+
+cmds = backend.cmds
+
+FORMAT = "pointCache"
+VERSION = 1
+
+_ID_TYPE = "<u4"
+
+
+def _requireNumpy():
+    if np is None:
+        raise ImportError("numpy is required for point caches")
+
+
+class PointCacheRecorder(object):
+    """
+    Streams frames of mesh positions into a point cache file. Frames can be recorded in any order, each frame
+    once. Use as a context manager or call close() to write the sidecar.
+    """
+    def __init__(self, file, meshes, frameCount=100, space="world", tolerance=1e-5, rest=None, dtype="float32"):
+        """
+        :param file: (String) cache file path. Existing cache is overwritten
+        :param meshes: (List) mesh names
+        :param frameCount: (Int) number of frames the file is preallocated for. The file grows when exceeded
+        :param space: (String) "world" or "object". See utils.getAllVerts
+        :param tolerance: (Float) vertices moved less than this distance from the rest position are not stored
+        :param rest: (Dictionary) Optional. mesh -> rest positions. Default is the first recorded frame
+        :param dtype: (String) "float32" or "float64"
+        """
+        _requireNumpy()
+        self.file = os.path.abspath(file)
+        self.meshes = list(meshes)
+        self.space = space
+        self.tolerance = float(tolerance)
+        self.dtype = np.dtype(dtype).newbyteorder("<")
+        self.frames = []
+        self._frameIndex = set()
+        self._rest = None
+        self._counts = None
+        self._restOffsets = None
+        self._frameCount = max(int(frameCount), 1)
+        self._used = 0
+        self._capacity = 0
+        self._map = None
+        # a left over sidecar would describe a different cache
+        if os.path.isfile(structure.arraySidecar(self.file)):
+            os.remove(structure.arraySidecar(self.file))
+        with open(self.file, "wb"):
+            pass
+        if rest is not None:
+            self._setRest([rest[mesh] for mesh in self.meshes])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __len__(self):
+        return len(self.frames)
+
+    @property
+    def size(self):
+        """Used bytes in the cache file"""
+        return self._used
+
+    def _reserve(self, size):
+        """Makes sure size more bytes fit into the mapped file and returns the write offset"""
+        needed = self._used + size
+        if needed > self._capacity:
+            frameSize = sum(self._counts) * 3 * self.dtype.itemsize
+            capacity = max(needed, self._used + frameSize * self._frameCount, self._capacity * 2)
+            if self._map is not None:
+                self._map.flush()
+                self._map = None
+            with open(self.file, "r+b") as f:
+                f.truncate(capacity)
+            self._map = np.memmap(self.file, dtype=np.uint8, mode="r+", shape=(capacity,))
+            self._capacity = capacity
+        offset = self._used
+        self._used = needed
+        return offset
+
+    def _write(self, values):
+        data = np.ascontiguousarray(values).view(np.uint8).ravel()
+        offset = self._reserve(len(data))
+        if len(data):
+            self._map[offset:offset + len(data)] = data
+        return offset
+
+    def _setRest(self, positions):
+        self._rest = [np.asarray(p, dtype=self.dtype).reshape(-1, 3) for p in positions]
+        self._counts = [len(p) for p in self._rest]
+        self._restOffsets = [self._write(p) for p in self._rest]
+
+    def add(self, frame, positions):
+        """
+        Stores the positions of a frame
+        :param frame: (Float) frame number
+        :param positions: (Dictionary or List) mesh -> (N, 3) positions, or positions in the meshes order
+        :return: (List) number of stored vertices per mesh. Zero means the mesh is at its rest positions
+        """
+        if self.closed:
+            raise ValueError("Point cache recorder is closed")
+        frame = float(frame)
+        if frame in self._frameIndex:
+            raise ValueError("Frame %s is already recorded" % frame)
+        if isinstance(positions, dict):
+            positions = [positions[mesh] for mesh in self.meshes]
+        positions = [np.asarray(p, dtype=self.dtype).reshape(-1, 3) for p in positions]
+        if self._rest is None:
+            self._setRest(positions)
+        blocks = []
+        for mesh, points, rest, count in zip(self.meshes, positions, self._rest, self._counts):
+            if len(points) != count:
+                raise ValueError("Vertex count of %s changed from %i to %i" % (mesh, count, len(points)))
+            delta = points - rest
+            changed = np.flatnonzero((delta * delta).sum(axis=1) > self.tolerance ** 2)
+            # ids cost 4 bytes per changed vertex on top of its position
+            if len(changed) * (4 + 3 * self.dtype.itemsize) < count * 3 * self.dtype.itemsize:
+                offset = self._write(changed.astype(_ID_TYPE))
+                self._write(points[changed])
+                blocks.append(["delta", offset, len(changed)])
+            else:
+                blocks.append(["full", self._write(points), count])
+        self.frames.append([frame, blocks])
+        self._frameIndex.add(frame)
+        return [block[2] for block in blocks]
+
+    def record(self, frame=None):
+        """
+        Stores the current mesh positions of the scene
+        :param frame: (Float) frame number the positions are stored for. Default is the current time
+        :return: (List) see add
+        """
+        if frame is None:
+            frame = cmds.currentTime(q=True)
+        return self.add(frame, [utils.getAllVerts(mesh, output="numpy", space=self.space, dtype=self.dtype.name)
+                                for mesh in self.meshes])
+
+    def recordRange(self, start, end, step=1):
+        """
+        Steps the scene time through the frame range and records every frame. The time is restored afterwards
+        :param start: (Float) first frame
+        :param end: (Float) last frame, inclusive
+        :param step: (Float) frame step
+        :return: None
+        """
+        currentTime = cmds.currentTime(q=True)
+        try:
+            frame = start
+            while frame <= end + 1e-6:
+                cmds.currentTime(frame, edit=True)
+                self.record(frame)
+                frame += step
+        finally:
+            cmds.currentTime(currentTime, edit=True)
+
+    @property
+    def closed(self):
+        return self._capacity is None
+
+    def close(self):
+        """Trims the preallocated space and writes the sidecar"""
+        if self.closed:
+            return
+        if self._map is not None:
+            self._map.flush()
+            self._map = None
+        with open(self.file, "r+b") as f:
+            f.truncate(self._used)
+        self._capacity = None
+        structure.dumpJson({
+            "format": FORMAT,
+            "version": VERSION,
+            "dtype": self.dtype.str,
+            "space": self.space,
+            "tolerance": self.tolerance,
+            "size": self._used,
+            "meshes": [{"name": mesh, "count": count, "rest": offset}
+                       for mesh, count, offset in zip(self.meshes, self._counts or [], self._restOffsets or [])],
+            "frames": self.frames,
+        }, structure.arraySidecar(self.file), compact=True)
+
+
+class PointCache(object):
+    """Random access reader of the point cache files. Data is memory mapped, only the accessed blocks are read"""
+    def __init__(self, file):
+        """
+        :param file: (String) cache file path
+        """
+        _requireNumpy()
+        self.file = os.path.abspath(file)
+        sidecar = structure.loadJson(structure.arraySidecar(self.file))
+        if sidecar is None or sidecar.get("format") != FORMAT:
+            raise IOError("Point cache sidecar cannot be loaded => %s" % structure.arraySidecar(self.file))
+        if os.path.getsize(self.file) != sidecar["size"]:
+            raise IOError("Point cache file does not match its sidecar => %s" % self.file)
+        self.dtype = np.dtype(str(sidecar["dtype"]))
+        self.space = sidecar["space"]
+        self.meshes = [mesh["name"] for mesh in sidecar["meshes"]]
+        self.counts = dict((mesh["name"], mesh["count"]) for mesh in sidecar["meshes"])
+        self.frames = [frame for frame, _ in sidecar["frames"]]
+        self._restOffsets = dict((mesh["name"], mesh["rest"]) for mesh in sidecar["meshes"])
+        self._blocks = dict((frame, dict(zip(self.meshes, blocks))) for frame, blocks in sidecar["frames"])
+        self._map = np.memmap(self.file, dtype=np.uint8, mode="r") if sidecar["size"] else None
+
+    def __len__(self):
+        return len(self.frames)
+
+    def __contains__(self, frame):
+        return float(frame) in self._blocks
+
+    def _array(self, offset, dtype, count):
+        if not count:
+            return np.empty(0, dtype=dtype)
+        return np.frombuffer(self._map, dtype=dtype, count=count, offset=offset)
+
+    def _mesh(self, mesh):
+        if mesh not in self.counts:
+            raise ValueError("%s is not in the point cache" % mesh)
+        return mesh
+
+    def _frame(self, frame, mesh):
+        try:
+            return self._blocks[float(frame)][mesh]
+        except KeyError:
+            raise ValueError("Frame %s is not in the point cache" % frame)
+
+    def rest(self, mesh):
+        """Returns the (N, 3) rest positions of the mesh as a read-only memory mapped array"""
+        count = self.counts[self._mesh(mesh)]
+        return self._array(self._restOffsets[mesh], self.dtype, count * 3).reshape(-1, 3)
+
+    def _delta(self, block):
+        _, offset, changed = block
+        ids = self._array(offset, _ID_TYPE, changed)
+        points = self._array(offset + changed * 4, self.dtype, changed * 3).reshape(-1, 3)
+        return ids, points
+
+    def points(self, frame, mesh=None):
+        """
+        Reads the positions of a frame
+        :param frame: (Float) frame number
+        :param mesh: (String) Optional. If None, positions of all meshes are returned
+        :return: (numpy.ndarray) (N, 3) positions, or a mesh -> positions dictionary
+        """
+        if mesh is None:
+            return dict((name, self.points(frame, name)) for name in self.meshes)
+        block = self._frame(frame, self._mesh(mesh))
+        if block[0] == "full":
+            return self._array(block[1], self.dtype, block[2] * 3).reshape(-1, 3).copy()
+        points = np.array(self.rest(mesh))
+        ids, changed = self._delta(block)
+        points[ids] = changed
+        return points
+
+    def trajectory(self, mesh, vertices=None, frames=None):
+        """
+        Reads the positions of the vertices over the frames
+        :param mesh: (String) mesh name
+        :param vertices: (List) Optional. vertex ids. Default is all vertices
+        :param frames: (List) Optional. frame numbers. Default is all frames in the recording order
+        :return: (numpy.ndarray) (frame, vertex, 3) positions
+        """
+        self._mesh(mesh)
+        frames = self.frames if frames is None else frames
+        rest = self.rest(mesh)
+        vertices = np.arange(len(rest)) if vertices is None else np.asarray(vertices, dtype=np.int64)
+        restPoints = rest[vertices]
+        result = np.empty((len(frames), len(vertices), 3), dtype=self.dtype)
+        for row, frame in enumerate(frames):
+            block = self._frame(frame, mesh)
+            if block[0] == "full":
+                result[row] = self._array(block[1], self.dtype, block[2] * 3).reshape(-1, 3)[vertices]
+                continue
+            result[row] = restPoints
+            ids, changed = self._delta(block)
+            if not len(ids):
+                continue
+            # delta ids are ascending
+            positions = np.minimum(np.searchsorted(ids, vertices), len(ids) - 1)
+            found = ids[positions] == vertices
+            result[row, found] = changed[positions[found]]
+        return result
+
+    def close(self):
+        self._map = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -0,0 +1,269 @@
+"""
+Opt-in call count and timing instrumentation for the scene functions.
+
+While a Profiler is running, the public functions of the instrumented modules are timed and every cmds / OpenMaya
+call and backend query they make is counted. Nothing is patched while no profiler is running, so there is no
+overhead when it is not used.
+
+Example:
+with profiling.profile() as profiler:
+    buildRig()
+print(profiler.format(top=10))
+profiler.save("/tmp/rigBuild_profile.json")
+
+Note: functions imported by name (from utils import alignTo) before profiling starts are not timed, but the
+commands they run are still counted.
+"""
+
+import time
+import functools
+import inspect
+import importlib
+from contextlib import contextmanager
+
+import backend
+import structure
+
+__author__ = "Arda Kutlu"
+__copyright__ = "Copyright 2019, Library Profiling Functions"
+__credits__ = []
+__license__ = "GPL"
+__maintainer__ = "Arda Kutlu"
+__email__ = "ardakutlu@gmail.com"
+__status__ = "Development"
+
+_timer = getattr(time, "perf_counter", time.time)
+
+DEFAULT_MODULES = ("utils", "attributes", "weights")
+
+# commands which create nodes. Each returned name counts as a created node
+CREATE_COMMANDS = frozenset(("createNode", "group", "spaceLocator", "joint", "duplicate", "instance",
+                             "pointConstraint", "orientConstraint", "parentConstraint", "aimConstraint",
+                             "scaleConstraint", "poleVectorConstraint", "cluster", "blendShape", "skinCluster",
+                             "shadingNode", "curve", "circle", "polyCube", "polySphere", "polyPlane"))
+
+# backend interface methods counted as queries
+BACKEND_METHODS = frozenset(("worldTranslations", "worldMatrices", "setWorldTransform", "meshPoints",
+                             "meshFingerprint", "channelStates", "dagPaths", "mObject", "nodeId"))
+
+# name of the record collecting the calls made outside of the instrumented functions
+TOPLEVEL = "<toplevel>"
+
+_active = {"profiler": None}
+
+
+def active():
+    """Returns the running profiler or None"""
+    return _active["profiler"]
+
+
+def _nodeCount(result):
+    if isinstance(result, (list, tuple)):
+        return len(result)
+    return 1 if result else 0
+
+
+class _CountingModule(object):
+    """Stands in for cmds / om / oma. Functions are wrapped, classes and constants are returned as they are"""
+    def __init__(self, profiler, prefix, target):
+        self._profiler = profiler
+        self._prefix = prefix
+        self._target = target
+        self._wrappers = {}
+
+    def __getattr__(self, name):
+        value = getattr(self._target, name)
+        if not callable(value) or inspect.isclass(value):
+            return value
+        wrapper = self._wrappers.get(name)
+        if wrapper is None:
+            wrapper = self._wrappers[name] = self._profiler._commandWrapper(
+                "%s.%s" % (self._prefix, name), lambda: getattr(self._target, name), name)
+        return wrapper
+
+
+class _CountingBackend(object):
+    """Wraps the active backend and counts the interface queries"""
+    def __init__(self, profiler, target):
+        self._profiler = profiler
+        self._target = target
+
+    def __getattr__(self, name):
+        value = getattr(self._target, name)
+        if name not in BACKEND_METHODS:
+            return value
+        return self._profiler._commandWrapper("backend.%s" % name, lambda: value, name)
+
+
+class _BackendModule(object):
+    """Stands in for the backend module inside the instrumented modules"""
+    def __init__(self, profiler):
+        self._profiler = profiler
+
+    def __getattr__(self, name):
+        return getattr(backend, name)
+
+    def current(self):
+        return _CountingBackend(self._profiler, backend.current())
+
+
+class Profiler(object):
+    """
+    Records wall time, self time, command counts and created / deleted node counts per public function.
+    Times are inclusive. Commands are counted on the innermost running instrumented function.
+    Not thread safe, profile from the main thread.
+    """
+    def __init__(self, modules=DEFAULT_MODULES):
+        """
+        :param modules: (List) module names or modules whose public functions and cmds / om / oma / backend
+                        references are instrumented
+        """
+        self.modules = [importlib.import_module(m) if not inspect.ismodule(m) else m for m in modules]
+        self.functions = {}
+        self.commands = {}
+        self.wallTime = 0.0
+        self._stack = []
+        self._patches = []
+        self._start = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    @property
+    def running(self):
+        return self._start is not None
+
+    def start(self):
+        """Patches the instrumented modules. Only one profiler can run at a time"""
+        if _active["profiler"] is not None:
+            raise RuntimeError("Another profiler is already running")
+        _active["profiler"] = self
+        self._start = _timer()
+        # scene edits of the instrumented functions are applied by the backend editors. See backend.edits
+        self._patch(backend, "cmds", _CountingModule(self, "cmds", backend.cmds))
+        self._patch(backend, "scene", _CountingBackend(self, backend.scene))
+        for module in self.modules:
+            for name, value in list(vars(module).items()):
+                if name in ("cmds", "om", "oma") and isinstance(value, backend._Proxy):
+                    self._patch(module, name, _CountingModule(self, name, value))
+                elif name == "backend" and value is backend:
+                    self._patch(module, name, _BackendModule(self))
+                elif (inspect.isfunction(value) and not name.startswith("_")
+                      and value.__module__ == module.__name__):
+                    self._patch(module, name, self._functionWrapper("%s.%s" % (module.__name__, name), value))
+
+    def stop(self):
+        """Restores the instrumented modules"""
+        if not self.running:
+            return
+        for module, name, original in reversed(self._patches):
+            setattr(module, name, original)
+        self._patches = []
+        self.wallTime += _timer() - self._start
+        self._start = None
+        _active["profiler"] = None
+
+    def reset(self):
+        self.functions = {}
+        self.commands = {}
+        self.wallTime = 0.0
+
+    def _patch(self, module, name, value):
+        self._patches.append((module, name, getattr(module, name)))
+        setattr(module, name, value)
+
+    def _record(self, name):
+        record = self.functions.get(name)
+        if record is None:
+            record = self.functions[name] = {"calls": 0, "time": 0.0, "selfTime": 0.0, "commandCount": 0,
+                                             "commands": {}, "created": 0, "deleted": 0}
+        return record
+
+    def _functionWrapper(self, name, function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            # [name, time spent in nested instrumented functions]
+            frame = [name, 0.0]
+            self._stack.append(frame)
+            start = _timer()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                elapsed = _timer() - start
+                self._stack.pop()
+                if self._stack:
+                    self._stack[-1][1] += elapsed
+                record = self._record(name)
+                record["calls"] += 1
+                record["time"] += elapsed
+                record["selfTime"] += elapsed - frame[1]
+        return wrapper
+
+    def _commandWrapper(self, name, resolve, shortName):
+        def wrapper(*args, **kwargs):
+            start = _timer()
+            result = resolve()(*args, **kwargs)
+            elapsed = _timer() - start
+            command = self.commands.get(name)
+            if command is None:
+                command = self.commands[name] = {"calls": 0, "time": 0.0}
+            command["calls"] += 1
+            command["time"] += elapsed
+            record = self._record(self._stack[-1][0] if self._stack else TOPLEVEL)
+            record["commandCount"] += 1
+            record["commands"][name] = record["commands"].get(name, 0) + 1
+            if shortName in CREATE_COMMANDS and not (kwargs.get("q") or kwargs.get("query")):
+                record["created"] += _nodeCount(result)
+            elif shortName == "delete":
+                record["deleted"] += sum(_nodeCount(arg) for arg in args)
+            return result
+        return wrapper
+
+    def report(self):
+        """
+        :return: (Dictionary) {"wallTime": seconds, "functions": {name: record}, "commands": {name: record}}
+        """
+        wallTime = self.wallTime + (_timer() - self._start if self.running else 0.0)
+        return {"wallTime": wallTime, "functions": self.functions, "commands": self.commands}
+
+    def save(self, file):
+        """Saves the report as json"""
+        structure.dumpJson(self.report(), file)
+
+    def format(self, top=None, sortBy="time"):
+        """
+        Formats the function records as a text table
+        :param top: (Int) Optional. Number of rows
+        :param sortBy: (String) record key to sort by. "time", "selfTime", "calls", "commandCount" ...
+        :return: (String)
+        """
+        rows = sorted(self.functions.items(), key=lambda item: item[1][sortBy], reverse=True)[:top]
+        lines = ["%-36s %8s %10s %10s %9s %8s %8s" % ("function", "calls", "time", "self", "commands",
+                                                       "created", "deleted")]
+        for name, record in rows:
+            lines.append("%-36s %8i %10.4f %10.4f %9i %8i %8i" % (name, record["calls"], record["time"],
+                                                                  record["selfTime"], record["commandCount"],
+                                                                  record["created"], record["deleted"]))
+        return "\n".join(lines)
+
+
+@contextmanager
+def profile(modules=DEFAULT_MODULES, file=None):
+    """
+    Profiles the scope
+    :param modules: (List) instrumented modules. See Profiler
+    :param file: (String) Optional. json file the report is saved to when the scope exits
+    :return: Profiler
+    """
+    profiler = Profiler(modules)
+    profiler.start()
+    try:
+        yield profiler
+    finally:
+        profiler.stop()
+        if file:
+            profiler.save(file)
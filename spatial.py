@@ -0,0 +1,399 @@
+"""Spatial queries over point positions. Does not require Maya"""
+
+import heapq
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+__author__ = "Arda Kutlu"
+__copyright__ = "Copyright 2019, Library Spatial Functions"
+__credits__ = []
+__license__ = "GPL"
+__maintainer__ = "Arda Kutlu"
+__email__ = "ardakutlu@gmail.com"
+__status__ = "Development"
+
+
+def _asPoints(points):
+    """Converts getAllVerts outputs (list, generator or numpy) into a (N, 3) float array"""
+    if np is None:
+        raise ImportError("numpy is required for spatial queries")
+    if not hasattr(points, "__len__"):
+        points = list(points)
+    return np.array(points, dtype=np.float64).reshape(-1, 3)
+
+
+def _kNearestRows(owners, candidates, d2, rowCount, k):
+    """
+    Picks the k nearest candidates of each query row
+    :param owners: (M,) query row of each candidate. Rows must be grouped in ascending order
+    :param candidates: (M,) candidate point indices
+    :param d2: (M,) squared candidate distances
+    :param rowCount: (Int) number of query rows
+    :param k: (Int) neighbour count
+    :return: (Tuple) (rowCount, k) index array and (rowCount, k) distance array, nearest first. Missing
+                neighbours are -1 and inf
+    """
+    # scatter into a (rows, most candidates) table and partition the k nearest of each row
+    perRow = np.bincount(owners, minlength=rowCount)
+    columns = np.arange(len(owners)) - np.repeat(np.cumsum(perRow) - perRow, perRow)
+    width = max(int(perRow.max()) if rowCount else 0, k)
+    table = np.full((rowCount, width), -1, dtype=np.int64)
+    distances = np.full((rowCount, width), np.inf)
+    table[owners, columns] = candidates
+    distances[owners, columns] = d2
+    if width > k:
+        nearest = np.argpartition(distances, k - 1, axis=1)[:, :k]
+        distances = np.take_along_axis(distances, nearest, axis=1)
+        table = np.take_along_axis(table, nearest, axis=1)
+    order = np.argsort(distances, axis=1)
+    return np.take_along_axis(table, order, axis=1), np.sqrt(np.take_along_axis(distances, order, axis=1))
+
+
+class VertexIndex(object):
+    """
+    KD-tree over point positions for closest point, k nearest and radius queries.
+
+    Example:
+    index = VertexIndex(utils.getAllVerts("pSphere1", output="numpy"))
+    ids, distances = index.closest(utils.getAllVerts("pCube1", output="numpy"))
+    """
+    def __init__(self, points, leafSize=16, rebuildRatio=0.1):
+        """
+        :param points: (Sequence) point positions. Any getAllVerts output except MPointArray
+        :param leafSize: (Int) maximum number of points in a leaf
+        :param rebuildRatio: (Float) tree is rebuilt when the ratio of moved points exceeds this value
+        """
+        self.leafSize = max(1, leafSize)
+        self.rebuildRatio = rebuildRatio
+        self.rebuild(points)
+
+    def __len__(self):
+        return len(self._points)
+
+    @property
+    def points(self):
+        """(N, 3) array of the current positions"""
+        return self._points
+
+    def rebuild(self, points=None):
+        """
+        Rebuilds the tree from scratch
+        :param points: (Sequence) If defined, replaces the indexed points. Point count may change
+        :return: None
+        """
+        if points is not None:
+            self._points = _asPoints(points)
+        pts = self._points
+        count = len(pts)
+        order = np.arange(count)
+        self._axis, self._split, self._left, self._right, self._lo, self._hi = [], [], [], [], [], []
+
+        stack = [(self._newNode(0, count), 0, count)]
+        while stack:
+            node, lo, hi = stack.pop()
+            if hi - lo <= self.leafSize:
+                continue
+            ids = order[lo:hi]
+            sub = pts[ids]
+            axis = int(np.argmax(sub.max(axis=0) - sub.min(axis=0)))
+            mid = (hi - lo) // 2
+            part = np.argpartition(sub[:, axis], mid)
+            order[lo:hi] = ids[part]
+            self._axis[node] = axis
+            self._split[node] = float(pts[order[lo + mid], axis])
+            left = self._newNode(lo, lo + mid)
+            right = self._newNode(lo + mid, hi)
+            self._left[node] = left
+            self._right[node] = right
+            stack.append((left, lo, lo + mid))
+            stack.append((right, lo + mid, hi))
+
+        self._order = order
+        # node table for the vectorized queries
+        self._nodes = [np.array(values) for values in (self._axis, self._split, self._left, self._right,
+                                                        self._lo, self._hi)]
+        self._position = np.empty(count, dtype=np.int64)
+        self._position[order] = np.arange(count)
+        self._tree = pts[order]
+        self._valid = np.ones(count, dtype=bool)
+        self._moved = set()
+        self._movedIds = np.empty(0, dtype=np.int64)
+
+    def _newNode(self, lo, hi):
+        self._axis.append(-1)
+        self._split.append(0.0)
+        self._left.append(-1)
+        self._right.append(-1)
+        self._lo.append(lo)
+        self._hi.append(hi)
+        return len(self._lo) - 1
+
+    def update(self, indices, positions):
+        """
+        Moves some of the points without rebuilding the whole tree. Moved points are searched linearly until
+        their count exceeds the rebuildRatio, then the tree is rebuilt.
+        :param indices: (List) indices of the moved points
+        :param positions: (Sequence) new positions matching the indices
+        :return: None
+        """
+        indices = np.asarray(indices, dtype=np.int64).ravel()
+        self._points[indices] = _asPoints(positions)
+        self._moved.update(indices.tolist())
+        if len(self._moved) > self.rebuildRatio * len(self._points):
+            self.rebuild()
+            return
+        self._valid[self._position[indices]] = False
+        self._movedIds = np.array(sorted(self._moved), dtype=np.int64)
+
+    def _search(self, point, k=None, maxDistance2=float("inf")):
+        """Returns (squared distance, index) pairs. Nearest k if k is defined, otherwise all within maxDistance2"""
+        found = []  # max heap of (-d2, index) when k is defined
+
+        def collect(d2s, ids, worst):
+            for j in np.flatnonzero(d2s <= worst if k is None else d2s < worst):
+                d2 = float(d2s[j])
+                if k is None:
+                    found.append((-d2, int(ids[j])))
+                    continue
+                if len(found) < k:
+                    heapq.heappush(found, (-d2, int(ids[j])))
+                elif d2 < worst:
+                    heapq.heapreplace(found, (-d2, int(ids[j])))
+                else:
+                    continue
+                if len(found) == k:
+                    worst = -found[0][0]
+            return worst
+
+        worst = maxDistance2
+        if len(self._movedIds):
+            d2s = ((self._points[self._movedIds] - point) ** 2).sum(axis=1)
+            worst = collect(d2s, self._movedIds, worst)
+
+        p = point.tolist()
+        stack = [(0, 0.0)]
+        while stack:
+            node, bound = stack.pop()
+            if bound > worst:
+                continue
+            left = self._left[node]
+            if left == -1:
+                lo, hi = self._lo[node], self._hi[node]
+                d2s = ((self._tree[lo:hi] - point) ** 2).sum(axis=1)
+                if self._moved:
+                    d2s[~self._valid[lo:hi]] = np.inf
+                worst = collect(d2s, self._order[lo:hi], worst)
+                continue
+            diff = p[self._axis[node]] - self._split[node]
+            if diff < 0:
+                near, far = left, self._right[node]
+            else:
+                near, far = self._right[node], left
+            stack.append((far, max(bound, diff * diff)))
+            stack.append((near, bound))
+        return sorted((-d, i) for d, i in found)
+
+    def closest(self, points):
+        """
+        Finds the closest indexed point for each query point
+        :param points: (Sequence) query positions
+        :return: (Tuple) (M,) index array and (M,) distance array
+        """
+        return tuple(a[:, 0] for a in self.kNearest(points, 1))
+
+    def _leafPoints(self, rows, leaves):
+        """Expands (query row, leaf) pairs into (query row, point) pairs. Moved points are left out"""
+        lo, hi = self._nodes[4][leaves], self._nodes[5][leaves]
+        counts = hi - lo
+        owners = np.repeat(rows, counts)
+        positions = np.repeat(lo - (np.cumsum(counts) - counts), counts) + np.arange(int(counts.sum()))
+        if self._moved:
+            valid = self._valid[positions]
+            owners, positions = owners[valid], positions[valid]
+        return owners, self._order[positions]
+
+    def _nearestBlock(self, queries, k):
+        """k nearest for a block of queries. Every tree level is visited once for the whole block"""
+        axis, split, left, right = self._nodes[:4]
+        rows = np.arange(len(queries))
+        movedOwners = np.repeat(rows, len(self._movedIds))
+        movedIds = np.tile(self._movedIds, len(queries))
+
+        def nearest(owners, candidates):
+            owners = np.concatenate((owners, movedOwners))
+            candidates = np.concatenate((candidates, movedIds))
+            order = np.argsort(owners, kind="mergesort")
+            owners, candidates = owners[order], candidates[order]
+            diff = self._points[candidates] - queries[owners]
+            return _kNearestRows(owners, candidates, (diff * diff).sum(axis=1), len(queries), k)
+
+        # the k-th distance in the leaf of each query bounds the search
+        leaves = np.zeros(len(queries), dtype=np.int64)
+        inner = rows[left[leaves] != -1]
+        while len(inner):
+            nodes = leaves[inner]
+            leaves[inner] = np.where(queries[inner, axis[nodes]] < split[nodes], left[nodes], right[nodes])
+            inner = inner[left[leaves[inner]] != -1]
+        worst = nearest(*self._leafPoints(rows, leaves))[1][:, -1] ** 2
+
+        # (query row, node, squared distance bound) pairs pruned with the split planes as in _search
+        pairRows, pairNodes, pairBounds = rows, np.zeros(len(queries), dtype=np.int64), np.zeros(len(queries))
+        leafRows, leafNodes = [], []
+        while len(pairRows):
+            isLeaf = left[pairNodes] == -1
+            leafRows.append(pairRows[isLeaf])
+            leafNodes.append(pairNodes[isLeaf])
+            pairRows, pairNodes, pairBounds = pairRows[~isLeaf], pairNodes[~isLeaf], pairBounds[~isLeaf]
+            diff = queries[pairRows, axis[pairNodes]] - split[pairNodes]
+            near = np.where(diff < 0, left[pairNodes], right[pairNodes])
+            far = np.where(diff < 0, right[pairNodes], left[pairNodes])
+            pairRows = np.concatenate((pairRows, pairRows))
+            pairNodes = np.concatenate((near, far))
+            pairBounds = np.concatenate((pairBounds, np.maximum(pairBounds, diff * diff)))
+            keep = pairBounds <= worst[pairRows]
+            pairRows, pairNodes, pairBounds = pairRows[keep], pairNodes[keep], pairBounds[keep]
+        return nearest(*self._leafPoints(np.concatenate(leafRows), np.concatenate(leafNodes)))
+
+    def kNearest(self, points, k, chunkSize=4096):
+        """
+        Finds the k nearest indexed points for each query point, nearest first. Queries are searched in
+        vectorized blocks
+        :param points: (Sequence) query positions
+        :param k: (Int) neighbour count
+        :param chunkSize: (Int) queries processed at once. Limits the temporary memory
+        :return: (Tuple) (M, k) index array and (M, k) distance array. Missing neighbours are -1 and inf
+        """
+        queries = _asPoints(points)
+        ids = np.full((len(queries), k), -1, dtype=np.int64)
+        distances = np.full((len(queries), k), np.inf)
+        if not len(self._points):
+            return ids, distances
+        # moved points are compared with every query of the block
+        chunkSize = max(1, min(chunkSize, 4194304 // max(1, len(self._movedIds))))
+        for start in range(0, len(queries), chunkSize):
+            block = slice(start, start + chunkSize)
+            ids[block], distances[block] = self._nearestBlock(queries[block], k)
+        return ids, distances
+
+    def withinRadius(self, point, radius):
+        """
+        Finds all indexed points within the radius of the given point
+        :param point: (Sequence) query position
+        :param radius: (Float) search radius
+        :return: (numpy.ndarray) indices sorted by distance
+        """
+        query = _asPoints(point)[0]
+        return np.array([i for _, i in self._search(query, maxDistance2=radius * radius)], dtype=np.int64)
+
+
+class PointGrid(object):
+    """
+    Uniform grid over point positions for vectorized k nearest queries on large point sets. Queries are answered
+    in chunks from the grid cells around each query point. Queries whose neighbours cannot be proven to lie in
+    those cells fall back to an exact VertexIndex search, so the results are always exact.
+
+    Example:
+    grid = PointGrid(utils.getAllVerts("body_hi", output="numpy"))
+    ids, distances = grid.kNearest(utils.getAllVerts("body_lo", output="numpy"), 4)
+    """
+    # empty cell layers around the points. Also the widest ring searched before the exact fallback
+    _PADDING = 2
+
+    def __init__(self, points, pointsPerCell=4.0):
+        """
+        :param points: (Sequence) point positions. Any getAllVerts output except MPointArray
+        :param pointsPerCell: (Float) average number of points per occupied cell the cell size is tuned for
+        """
+        self._points = _asPoints(points)
+        self._index = None
+        count = len(self._points)
+        if not count:
+            self.cellSize = 1.0
+            return
+        lo, hi = self._points.min(axis=0), self._points.max(axis=0)
+        extent = np.maximum(hi - lo, 1e-9)
+        # points usually lie on surfaces. Size the cells for the surface area of the bounding box
+        area = 2.0 * (extent[0] * extent[1] + extent[1] * extent[2] + extent[0] * extent[2])
+        self.cellSize = max(float(np.sqrt(area * pointsPerCell / count)), float(extent.max()) / 2 ** 20)
+        self._origin = lo - self._PADDING * self.cellSize
+        cells = self._cells(self._points)
+        self._dims = cells.max(axis=0) + self._PADDING + 1
+        keys = self._keys(cells)
+        self._order = np.argsort(keys, kind="mergesort")
+        self._cellKeys, self._cellStarts, self._cellCounts = np.unique(keys[self._order], return_index=True,
+                                                                       return_counts=True)
+
+    def __len__(self):
+        return len(self._points)
+
+    def _cells(self, points):
+        return np.floor((points - self._origin) / self.cellSize).astype(np.int64)
+
+    def _keys(self, cells):
+        return (cells[..., 0] * self._dims[1] + cells[..., 1]) * self._dims[2] + cells[..., 2]
+
+    def _exact(self, queries, k):
+        if self._index is None:
+            self._index = VertexIndex(self._points)
+        return self._index.kNearest(queries, k)
+
+    def _ringSearch(self, queries, cells, k, ring):
+        """k nearest among the points in the (2 * ring + 1) ** 3 cells around each query"""
+        steps = np.arange(-ring, ring + 1)
+        offsets = np.stack(np.meshgrid(steps, steps, steps, indexing="ij"), axis=-1).reshape(-1, 3)
+        neighbourKeys = self._keys(cells[:, None, :] + offsets[None]).ravel()
+        positions = np.minimum(np.searchsorted(self._cellKeys, neighbourKeys), len(self._cellKeys) - 1)
+        found = self._cellKeys[positions] == neighbourKeys
+        starts = np.where(found, self._cellStarts[positions], 0)
+        counts = np.where(found, self._cellCounts[positions], 0)
+
+        # expand the cell ranges into (query, candidate) pairs
+        total = int(counts.sum())
+        owners = np.repeat(np.repeat(np.arange(len(queries)), len(offsets)), counts)
+        candidates = self._order[np.repeat(starts - (np.cumsum(counts) - counts), counts) + np.arange(total)]
+        diff = self._points[candidates] - queries[owners]
+        return _kNearestRows(owners, candidates, (diff * diff).sum(axis=1), len(queries), k)
+
+    def kNearest(self, points, k, chunkSize=8192):
+        """
+        Finds the k nearest points for each query point, nearest first
+        :param points: (Sequence) query positions
+        :param k: (Int) neighbour count
+        :param chunkSize: (Int) queries processed at once. Limits the temporary memory
+        :return: (Tuple) (M, k) index array and (M, k) distance array. Missing neighbours are -1 and inf
+        """
+        queries = _asPoints(points)
+        ids = np.full((len(queries), k), -1, dtype=np.int64)
+        distances = np.full((len(queries), k), np.inf)
+        if not len(self._points):
+            return ids, distances
+        for start in range(0, len(queries), chunkSize):
+            chunk = queries[start:start + chunkSize]
+            cells = self._cells(chunk)
+            pending = np.arange(len(chunk))
+            for ring in range(1, self._PADDING + 1):
+                inside = np.all((cells[pending] >= ring) & (cells[pending] < self._dims - ring), axis=1)
+                rows = pending[inside]
+                if not len(rows):
+                    break
+                rowIds, rowDistances = self._ringSearch(chunk[rows], cells[rows], k, ring)
+                # exact if the k-th neighbour is closer than any cell outside the searched block
+                exact = rowDistances[:, -1] <= ring * self.cellSize
+                ids[start + rows[exact]] = rowIds[exact]
+                distances[start + rows[exact]] = rowDistances[exact]
+                pending = np.concatenate((pending[~inside], rows[~exact]))
+            if len(pending):
+                ids[start + pending], distances[start + pending] = self._exact(chunk[pending], k)
+        return ids, distances
+
+    def closest(self, points, chunkSize=8192):
+        """
+        Finds the closest point for each query point
+        :param points: (Sequence) query positions
+        :param chunkSize: (Int) queries processed at once
+        :return: (Tuple) (M,) index array and (M,) distance array
+        """
+        return tuple(a[:, 0] for a in self.kNearest(points, 1, chunkSize=chunkSize))
@@ -1,12 +1,34 @@
 """Generic structural methods"""
 
 import os, sys
+import errno
 import json
+import struct
+import fnmatch
+import hashlib
 import shutil
 import re
-import platform
-import subprocess
+import tempfile
 import logging
+import threading
+import unicodedata
+from array import array
+from collections import OrderedDict
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    from os import scandir
+except ImportError:
+    scandir = None
+
+try:
+    from concurrent.futures import ThreadPoolExecutor
+except ImportError:
+    ThreadPoolExecutor = None
 
 __author__ = "Arda Kutlu"
 __copyright__ = "Copyright 2019, Library Structure Functions"
@@ -16,13 +38,158 @@ __maintainer__ = "Arda Kutlu"
 __email__ = "ardakutlu@gmail.com"
 __status__ = "Development"
 
-logging.basicConfig()
 logger = logging.getLogger('structure')
 logger.setLevel(logging.WARNING)
 
 
-def loadJson(file):
-    """Loads the given json file"""
+class FrozenDict(dict):
+    """Read-only dictionary returned by the json cache. Still a dict, so it can be dumped or iterated as usual"""
+    def _readOnly(self, *args, **kwargs):
+        raise TypeError("Cached json data is read-only. Use loadJson(file, cache=True) for a mutable copy")
+    __setitem__ = __delitem__ = clear = pop = popitem = setdefault = update = _readOnly
+
+
+def _freeze(data):
+    """Recursively converts dictionaries to FrozenDict and lists to tuples"""
+    if isinstance(data, dict):
+        return FrozenDict((k, _freeze(v)) for k, v in data.items())
+    if isinstance(data, list):
+        return tuple(_freeze(v) for v in data)
+    return data
+
+
+def _dataSize(data):
+    """Approximate memory used by the parsed data in bytes. Objects shared by several containers are counted
+    for each of them"""
+    size = sys.getsizeof(data)
+    if isinstance(data, dict):
+        for key, value in data.items():
+            size += _dataSize(key) + _dataSize(value)
+    elif isinstance(data, (list, tuple)):
+        for value in data:
+            size += _dataSize(value)
+    return size
+
+
+def _thaw(data):
+    """Recursively converts the frozen data back to mutable dictionaries and lists"""
+    if isinstance(data, dict):
+        return dict((k, _thaw(v)) for k, v in data.items())
+    if isinstance(data, tuple):
+        return [_thaw(v) for v in data]
+    return data
+
+
+class JsonCache(object):
+    """
+    LRU cache of parsed json files keyed by path, modification time and size.
+    Memory usage is measured with the approximate size of the parsed python objects, which is usually several
+    times the file size.
+    """
+    def __init__(self, maxBytes=256 * 1024 * 1024, maxEntries=4096):
+        """
+        :param maxBytes: (Int) total memory of the cached data before the least recently used files are evicted
+        :param maxEntries: (Int) maximum number of cached files
+        """
+        self.maxBytes = maxBytes
+        self.maxEntries = maxEntries
+        self._entries = OrderedDict()  # path -> (mtime, file size, frozen data, memory size)
+        self._bytes = 0
+        # files are loaded from worker threads by asyncstructure
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, file):
+        return os.path.abspath(file) in self._entries
+
+    def stats(self):
+        """Returns the cache statistics as a dictionary"""
+        return {"hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._bytes}
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def invalidate(self, file):
+        """Removes the file from the cache"""
+        with self._lock:
+            entry = self._entries.pop(os.path.abspath(file), None)
+            if entry:
+                self._bytes -= entry[3]
+
+    def get(self, file, readOnly=False):
+        """
+        Gets the parsed content of the file. File is parsed only if it is not cached or changed on disk
+        :param file: (String) json file path
+        :param readOnly: (Boolean) If True, returns the shared read-only data without copying.
+                        Otherwise returns a mutable copy which is safe to modify
+        :return: parsed data or None if the file cannot be loaded
+        """
+        path = os.path.abspath(file)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            self.invalidate(path)
+            logger.error("File cannot be found => %s" % file)
+            return None
+        mtime = getattr(stat, "st_mtime_ns", stat.st_mtime)
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry and entry[0] == mtime and entry[1] == stat.st_size:
+                self.hits += 1
+                self._entries.pop(path)
+                self._entries[path] = entry
+                data = entry[2]
+            else:
+                self.misses += 1
+                self.invalidate(path)
+                entry = None
+        if entry is None:
+            # parsed outside of the lock, so other files can be loaded meanwhile
+            data = loadJson(path)
+            if data is None:
+                return None
+            data = _freeze(data)
+            size = _dataSize(data)
+            if size <= self.maxBytes:
+                with self._lock:
+                    self.invalidate(path)
+                    self._entries[path] = (mtime, stat.st_size, data, size)
+                    self._bytes += size
+                    self._evict()
+        return data if readOnly else _thaw(data)
+
+    def _evict(self):
+        while self._entries and (self._bytes > self.maxBytes or len(self._entries) > self.maxEntries):
+            _, entry = self._entries.popitem(last=False)
+            self._bytes -= entry[3]
+            self.evictions += 1
+
+
+jsonCache = JsonCache()
+
+
+def loadJson(file, cache=False, readOnly=False):
+    """
+    Loads the given json file
+    :param file: (String) json file path
+    :param cache: (Boolean) If True, the parsed data is kept in jsonCache and re-used until the file changes
+    :param readOnly: (Boolean) Only with cache. If True, shared read-only data (FrozenDict and tuples) is returned
+                    instead of a copy
+    :return: parsed data or None if the file cannot be loaded
+    """
+    if cache:
+        return jsonCache.get(file, readOnly=readOnly)
     # TODO : Is it paranoid checking?
     if os.path.isfile(file):
         try:
@@ -37,17 +204,416 @@ def loadJson(file):
         msg = "File cannot be found => %s" % file
         logger.error(msg)
 
-def dumpJson(data, file):
-    """Saves the data to the json file"""
-    # this wont work with python 3.x. Either use compatibilty module from tik_manager or remove 'unicode'
-    name, ext = os.path.splitext(unicode(file).encode("utf-8"))
-    tempFile = ("{0}.tmp".format(name))
-    with open(tempFile, "w") as f:
-        json.dump(data, f, indent=4)
-    shutil.copyfile(tempFile, file)
-    os.remove(tempFile)
+def _replace(source, destination):
+    """Atomically moves the source file over the destination"""
+    if hasattr(os, "replace"):
+        os.replace(source, destination)
+    else:
+        # python 2. rename is atomic on posix, windows cannot rename over an existing file
+        if os.name == "nt" and os.path.isfile(destination):
+            os.remove(destination)
+        os.rename(source, destination)
+
+def _readUmask():
+    """Reads the process umask. Only called at import time, as reading it changes it for a moment"""
+    umask = os.umask(0)
+    os.umask(umask)
+    return umask
+
+# files are written from worker threads by asyncstructure, where changing the umask would affect other threads
+_UMASK = _readUmask()
+
+
+def _atomicWrite(file, write, binary=False, durability="none"):
+    """
+    Calls write(fileObject) on a temporary file next to the target which is then renamed over it, so readers
+    never see a half written file. See dumpJson for the durability levels
+    """
+    if durability not in ("none", "file", "directory"):
+        raise ValueError("Unrecognized durability level => %s" % durability)
+    file = os.path.abspath(file)
+    folder, name = os.path.split(file)
+    handle, tempFile = tempfile.mkstemp(prefix="%s." % name, suffix=".tmp", dir=folder)
+    try:
+        try:
+            # mkstemp creates owner only files. Keep the permissions a regular save would give
+            if os.path.isfile(file):
+                os.chmod(tempFile, os.stat(file).st_mode & 0o7777)
+            else:
+                os.chmod(tempFile, 0o666 & ~_UMASK)
+        except BaseException:
+            os.close(handle)
+            raise
+        with os.fdopen(handle, "wb" if binary else "w") as f:
+            write(f)
+            if durability != "none":
+                f.flush()
+                os.fsync(f.fileno())
+        _replace(tempFile, file)
+    except BaseException:
+        if os.path.exists(tempFile):
+            os.remove(tempFile)
+        raise
+    if durability == "directory" and hasattr(os, "O_DIRECTORY"):
+        folderHandle = os.open(folder, os.O_DIRECTORY)
+        try:
+            os.fsync(folderHandle)
+        finally:
+            os.close(folderHandle)
+
+def dumpJson(data, file, compact=False, stream=False, durability="none"):
+    """
+    Saves the data to the json file. The data is written once to a temporary file next to the target
+    which is then renamed over it, so readers never see a half written file.
+    :param data: json serializable data
+    :param file: (String) target file path
+    :param compact: (Boolean) If True, writes without indentation and whitespace
+    :param stream: (Boolean) If True, encodes the data iteratively instead of building the whole string in memory.
+                    Slower for small files, lighter on memory for large payloads
+    :param durability: (String) "none" leaves flushing to the OS, "file" fsyncs the file before the rename,
+                    "directory" also fsyncs the containing folder after the rename (posix only)
+    :return: None
+    """
+    options = {"separators": (",", ":")} if compact else {"indent": 4}
+
+    def write(f):
+        if stream:
+            json.dump(data, f, **options)
+        else:
+            f.write(json.dumps(data, **options))
+
+    _atomicWrite(file, write, durability=durability)
+    jsonCache.invalidate(file)
+
+# ___________Binary arrays ___________
+
+_NPY_MAGIC = b"\x93NUMPY\x01\x00"
+_NPY_ALIGNMENT = 64
+# (kind, item size) -> array module type code. Used when numpy is not available
+_ARRAY_TYPECODES = {}
+for _code in "bBhHiIlLqQfd":
+    try:
+        _ARRAY_TYPECODES.setdefault(("f" if _code in "fd" else "u" if _code.isupper() else "i",
+                                     array(_code).itemsize), _code)
+    except ValueError:
+        # q and Q are missing in python 2
+        pass
+
+
+def arraySidecar(file):
+    """Returns the json sidecar path of the binary array file"""
+    return "%s.json" % file
+
+def _arrayDescr(values):
+    """Returns the little endian npy descr, shape and the raw bytes writer of the array"""
+    if np is not None and not isinstance(values, array):
+        values = np.asarray(values)
+        if values.dtype.kind not in "iuf":
+            raise ValueError("Only numeric arrays can be saved => %s" % values.dtype)
+        values = np.ascontiguousarray(values, dtype=values.dtype.newbyteorder("<"))
+        return values.dtype.str, values.shape, lambda f: f.write(values.tobytes())
+    if not isinstance(values, array):
+        values = array("d", values)
+    kind = "f" if values.typecode in "fd" else "u" if values.typecode.isupper() else "i"
+    if sys.byteorder == "big":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return "<%s%i" % (kind, values.itemsize), (len(values),), values.tofile
+
+def _npyHeader(descr, shape):
+    """Builds a version 1.0 npy header. Header length is a multiple of 64 bytes"""
+    header = "{'descr': '%s', 'fortran_order': False, 'shape': %r, }" % (descr, tuple(int(n) for n in shape))
+    length = len(_NPY_MAGIC) + 2 + len(header) + 1
+    header += " " * (-length % _NPY_ALIGNMENT) + "\n"
+    return _NPY_MAGIC + struct.pack("<H", len(header)) + header.encode("latin1")
+
+def _count(shape):
+    count = 1
+    for n in shape:
+        count *= n
+    return count
+
+def dumpArrays(arrays, file, metadata=None, durability="none"):
+    """
+    Saves numeric arrays into one binary file with a json sidecar. Each array is written as a .npy blob aligned to
+    64 bytes, so a single array file can be opened with numpy.load as well. The sidecar (file + ".json") keeps
+    the array offsets, shapes and the metadata.
+
+    Example:
+    dumpArrays({"weights": skinWeights.T, "points": points}, "body_skin.bin",
+               metadata={"influences": influences, "deformer": "skinCluster1"})
+    Store skin weights influence major (transposed) so that one influence is a contiguous row in the file.
+
+    :param arrays: (Dictionary) name -> numpy array, array.array or sequence of numbers. Use OrderedDict to keep
+                    the order in the file
+    :param file: (String) binary file path
+    :param metadata: (Dictionary) Optional. json serializable data saved in the sidecar
+    :param durability: (String) see dumpJson
+    :return: None
+    """
+    blobs = []
+    index = OrderedDict()
+    offset = 0
+    for name, values in arrays.items():
+        descr, shape, writeData = _arrayDescr(values)
+        header = _npyHeader(descr, shape)
+        size = int(descr[2:]) * _count(shape)
+        index[name] = {"offset": offset, "dataOffset": offset + len(header), "dtype": descr, "shape": list(shape)}
+        blobs.append((header, writeData, -(len(header) + size) % _NPY_ALIGNMENT))
+        offset += len(header) + size + blobs[-1][2]
+
+    def write(f):
+        for header, writeData, padding in blobs:
+            f.write(header)
+            writeData(f)
+            f.write(b"\0" * padding)
+
+    _atomicWrite(file, write, binary=True, durability=durability)
+    dumpJson({"arrays": index, "size": offset, "metadata": metadata}, arraySidecar(file), compact=True,
+             durability=durability)
+
+def loadArrayMetadata(file):
+    """Returns the metadata saved with dumpArrays without touching the binary file"""
+    sidecar = loadJson(arraySidecar(file))
+    return None if sidecar is None else sidecar["metadata"]
+
+def loadArrays(file, names=None, mmap=True):
+    """
+    Loads the arrays saved with dumpArrays
+    :param file: (String) binary file path
+    :param names: (List) Optional. Names of the arrays to load. Default is all
+    :param mmap: (Boolean) If True, returns read-only memory mapped numpy arrays. Only the slices which are
+                    accessed are read from disk. eg: loadArrays(file)["weights"][influenceIndex]
+    :return: (Dictionary) name -> numpy array. Without numpy, name -> flat array.array (mmap is ignored)
+    """
+    sidecar = loadJson(arraySidecar(file))
+    if sidecar is None:
+        raise IOError("Array sidecar cannot be loaded => %s" % arraySidecar(file))
+    if os.path.getsize(file) != sidecar["size"]:
+        raise IOError("Array file does not match its sidecar => %s" % file)
+    entries = sidecar["arrays"]
+    names = list(entries) if names is None else names
+    result = OrderedDict()
+    with open(file, "rb") as f:
+        for name in names:
+            entry = entries[name]
+            shape = tuple(entry["shape"])
+            count = _count(shape)
+            if np is not None:
+                dtype = np.dtype(str(entry["dtype"]))
+                if mmap and count:
+                    result[name] = np.memmap(file, dtype=dtype, mode="r", offset=entry["dataOffset"], shape=shape)
+                else:
+                    f.seek(entry["dataOffset"])
+                    result[name] = np.fromfile(f, dtype=dtype, count=count).reshape(shape)
+                continue
+            values = array(_ARRAY_TYPECODES[(entry["dtype"][1], int(entry["dtype"][2:]))])
+            f.seek(entry["dataOffset"])
+            values.fromfile(f, count)
+            if sys.byteorder == "big":
+                values.byteswap()
+            result[name] = values
+    return result
+
+class _DirEntry(object):
+    """Minimal os.DirEntry replacement for pythons without scandir"""
+    def __init__(self, folder, name):
+        self.name = name
+        self.path = os.path.join(folder, name)
+
+    def is_symlink(self):
+        return os.path.islink(self.path)
+
+    def is_dir(self):
+        return os.path.isdir(self.path)
+
+    def stat(self):
+        return os.stat(self.path)
+
+
+def _scandir(folder):
+    if scandir is not None:
+        return list(scandir(folder))
+    return [_DirEntry(folder, name) for name in os.listdir(folder)]
+
+def include_patterns(*patterns):
+    """
+    Creates an ignore function for copytree which keeps only the files matching any of the patterns.
+    Folders are always kept. Patterns are compiled once.
+    :param patterns: (String) fnmatch style patterns. eg: '*.dwg', '*.dxf'
+    :return: (Function) ignore function
+    """
+    regex = re.compile("|".join(fnmatch.translate(p) for p in patterns))
+
+    def _ignore_patterns(path, names):
+        return set(name for name in names
+                   if not regex.match(name) and not os.path.isdir(os.path.join(path, name)))
+    return _ignore_patterns
 
-def copytree(src, dst, symlinks=False, ignore=None):
+def fileHash(filePath, algorithm="sha1", blockSize=1024 * 1024):
+    """
+    Hashes the file content reading it in blocks
+    :param filePath: (String) file path
+    :param algorithm: (String) hashlib algorithm name
+    :param blockSize: (Int) read size in bytes
+    :return: (String) hex digest
+    """
+    hasher = hashlib.new(algorithm)
+    with open(filePath, "rb") as f:
+        for block in iter(lambda: f.read(blockSize), b""):
+            hasher.update(block)
+    return hasher.hexdigest()
+
+# mode of the content store objects and their hard links
+_READ_ONLY = 0o444
+
+
+def _removeFile(path):
+    """Removes the file or link. Read-only files are made writable first where removing them fails (Windows)"""
+    try:
+        os.remove(path)
+    except OSError:
+        os.chmod(path, 0o666)
+        os.remove(path)
+
+class ContentStore(object):
+    """
+    Content addressed file store for de-duplicating copies. Files are kept once per content hash under
+    <root>/objects and copies are created as hard links to them. Hashes of the source files are kept in
+    <root>/manifest.json keyed by path, size and modification time so unchanged files are not hashed again.
+
+    Hard linked copies share the content, so the store objects (and the links) are read-only. copytree replaces
+    the destination files instead of writing into them, so copying over linked files does not change the store.
+
+    Example:
+    store = ContentStore("/libraries/.store")
+    copytree(source, destination, workers=8, store=store)
+    """
+    def __init__(self, root, algorithm="sha1"):
+        self.root = os.path.abspath(root)
+        self.algorithm = algorithm
+        self.manifestFile = os.path.join(self.root, "manifest.json")
+        self._lock = threading.Lock()
+        # workers adding the same content wait for each other. Locks are shared by digests with the same hash
+        self._objectLocks = [threading.Lock() for _ in range(64)]
+        folderCheck(os.path.join(self.root, "objects"))
+        manifest = loadJson(self.manifestFile) if os.path.isfile(self.manifestFile) else None
+        if not manifest or manifest.get("algorithm") != algorithm:
+            manifest = {"algorithm": algorithm, "files": {}}
+        self.manifest = manifest
+
+    def objectPath(self, digest):
+        return os.path.join(self.root, "objects", digest[:2], digest)
+
+    def hashFile(self, filePath, fileStat=None):
+        """
+        Gets the content hash of the file. Re-uses the manifest entry if size and modification time match
+        :param filePath: (String) file path
+        :param fileStat: (os.stat_result) Optional. Saves a stat call if already known
+        :return: (String) hex digest
+        """
+        filePath = os.path.abspath(filePath)
+        fileStat = fileStat or os.stat(filePath)
+        key = [fileStat.st_size, fileStat.st_mtime]
+        entry = self.manifest["files"].get(filePath)
+        if entry and entry[:2] == key:
+            return entry[2]
+        digest = fileHash(filePath, algorithm=self.algorithm)
+        with self._lock:
+            self.manifest["files"][filePath] = key + [digest]
+        return digest
+
+    def add(self, filePath, digest):
+        """
+        Copies the file into the store if its content is not there yet
+        :return: (Tuple) object path and True if the content was new
+        """
+        objectPath = self.objectPath(digest)
+        with self._objectLocks[hash(digest) % len(self._objectLocks)]:
+            if os.path.isfile(objectPath):
+                return objectPath, False
+            folderCheck(os.path.dirname(objectPath))
+            handle, tempFile = tempfile.mkstemp(suffix=".tmp", dir=os.path.dirname(objectPath))
+            os.close(handle)
+            try:
+                shutil.copy2(filePath, tempFile)
+                # objects are shared by every linked copy. Writes through a link must fail instead of changing them
+                os.chmod(tempFile, _READ_ONLY)
+                # linking does not replace an object stored by another process meanwhile
+                try:
+                    os.link(tempFile, objectPath)
+                except AttributeError:
+                    _replace(tempFile, objectPath)
+                except OSError as why:
+                    if why.errno == errno.EEXIST:
+                        return objectPath, False
+                    # no hard link support
+                    _replace(tempFile, objectPath)
+            finally:
+                if os.path.exists(tempFile):
+                    _removeFile(tempFile)
+        return objectPath, True
+
+    def link(self, objectPath, dstname):
+        """Hard links the stored object to the destination. Falls back to copying where links are not possible"""
+        if os.path.lexists(dstname):
+            if os.path.isfile(dstname) and os.path.samefile(objectPath, dstname):
+                return
+            _removeFile(dstname)
+        try:
+            os.link(objectPath, dstname)
+        except (AttributeError, OSError):
+            # different volume or no hard link support. The copy is not shared, keep it writable
+            shutil.copy2(objectPath, dstname)
+            os.chmod(dstname, 0o666 & ~_UMASK)
+
+    def save(self):
+        """Writes the hash manifest"""
+        with self._lock:
+            dumpJson(self.manifest, self.manifestFile, compact=True)
+
+
+def _collectTree(src, dst, symlinks, ignore, folders, files, links, errors):
+    """
+    Walks the source tree once. Fills (src, dst) folders, (src, dst, stat) files and (src, dst) links.
+    Entries and sub folders which cannot be read are added to errors as (src, dst, reason) and skipped
+    """
+    entries = _scandir(src)
+    if ignore is not None:
+        ignored_names = ignore(src, [entry.name for entry in entries])
+    else:
+        ignored_names = set()
+    folders.append((src, dst))
+    for entry in entries:
+        if entry.name in ignored_names:
+            continue
+        srcname = os.path.join(src, entry.name)
+        dstname = os.path.join(dst, entry.name)
+        try:
+            if symlinks and entry.is_symlink():
+                links.append((srcname, dstname))
+            elif entry.is_dir():
+                _collectTree(srcname, dstname, symlinks, ignore, folders, files, links, errors)
+            else:
+                files.append((srcname, dstname, entry.stat()))
+        except EnvironmentError as why:
+            errors.append((srcname, dstname, str(why)))
+
+def _isUpToDate(srcname, dstname, srcStat, useHash):
+    """Checks if the destination file has the same size and modification time (or content) as the source"""
+    try:
+        dstStat = os.stat(dstname)
+    except OSError:
+        return False
+    if dstStat.st_size != srcStat.st_size:
+        return False
+    if useHash:
+        return fileHash(srcname) == fileHash(dstname)
+    # copy2 keeps the modification time. Some file systems store it with lower precision
+    return abs(dstStat.st_mtime - srcStat.st_mtime) < 1.0
+
+def copytree(src, dst, symlinks=False, ignore=None, workers=1, incremental=False, useHash=False, progress=None,
+             store=None, cancel=None):
     """
     Copies entire content of the given directory to the destination recursively
     (Derived directly from  shutil.copytree)
@@ -55,56 +621,157 @@ def copytree(src, dst, symlinks=False, ignore=None):
     :param dst: (String) destination directory path
     :param symlinks: (Boolean) If True, uses resolves symlinks too. Default False
     :param ignore: (Function) use include_patterns function to ignore specific files.
+    :param workers: (Int) number of threads copying files in parallel. Default 1
+    :param incremental: (Boolean) If True, files which have the same size and modification time at the
+                        destination are skipped
+    :param useHash: (Boolean) With incremental, compares the file contents instead of the modification times
+    :param progress: (Function) called as progress(done, total, srcname) after each file
+    :param store: (ContentStore) If defined, files are hashed (in parallel with workers) into the store and hard
+                    linked from there. Content already in the store is not copied again
+    :param cancel: (threading.Event) Optional. When set, the remaining files are not copied and the summary
+                    has cancelled True
 
     Example:
     copytree(source, destination, ignore=include_patterns('*.dwg', '*.dxf'))
-    :return:
+    :return: (Dictionary) summary with copied, skipped, bytesCopied and bytesSkipped keys. With a store,
+                    deduplicated counts the files whose content was already stored
     """
-    names = os.listdir(src)
-    if ignore is not None:
-        ignored_names = ignore(src, names)
-    else:
-        ignored_names = set()
+    folders, files, links, errors = [], [], [], []
+    _collectTree(src, dst, symlinks, ignore, folders, files, links, errors)
 
-    if not os.path.isdir(dst):  # This one line does the trick
-        os.makedirs(dst)
-    errors = []
-    for name in names:
-        if name in ignored_names:
-            continue
-        srcname = os.path.join(src, name)
-        dstname = os.path.join(dst, name)
+    for _, dstFolder in folders:
+        if not os.path.isdir(dstFolder):  # This one line does the trick
+            os.makedirs(dstFolder)
+    for srcname, dstname in links:
         try:
-            if symlinks and os.path.islink(srcname):
-                linkto = os.readlink(srcname)
-                os.symlink(linkto, dstname)
-            elif os.path.isdir(srcname):
-                copytree(srcname, dstname, symlinks, ignore)
-            else:
-                # Will raise a SpecialFileError for unsupported file types
-                shutil.copy2(srcname, dstname)
-        # catch the Error from the recursive copytree so that we can
-        # continue with other files
-        except shutil.Error as err:
-            errors.extend(err.args[0])
+            os.symlink(os.readlink(srcname), dstname)
         except EnvironmentError as why:
             errors.append((srcname, dstname, str(why)))
-    try:
-        shutil.copystat(src, dst)
-    except OSError as why:
-        if WindowsError is not None and isinstance(why, WindowsError):
-            # Copying file access times may fail on Windows
-            pass
-        else:
-            errors.extend((src, dst, str(why)))
+
+    summary = {"copied": 0, "skipped": 0, "bytesCopied": 0, "bytesSkipped": 0, "deduplicated": 0,
+               "cancelled": False}
+    lock = threading.Lock()
+
+    def _copy(task):
+        if cancel is not None and cancel.is_set():
+            summary["cancelled"] = True
+            return
+        srcname, dstname, srcStat = task
+        skip = duplicate = False
+        try:
+            if store is not None:
+                objectPath, isNew = store.add(srcname, store.hashFile(srcname, srcStat))
+                duplicate = not isNew
+                skip = incremental and os.path.isfile(dstname) and os.path.samefile(objectPath, dstname)
+                if not skip:
+                    store.link(objectPath, dstname)
+            else:
+                skip = incremental and _isUpToDate(srcname, dstname, srcStat, useHash)
+                if not skip:
+                    # the destination may be a hard link into a ContentStore. Replace it instead of writing into it
+                    if os.path.isfile(dstname) or os.path.islink(dstname):
+                        _removeFile(dstname)
+                    # Will raise a SpecialFileError for unsupported file types
+                    shutil.copy2(srcname, dstname)
+        except (shutil.Error, EnvironmentError) as why:
+            with lock:
+                errors.append((srcname, dstname, str(why)))
+            return
+        with lock:
+            key = "skipped" if skip else "copied"
+            summary[key] += 1
+            summary["bytesSkipped" if skip or duplicate else "bytesCopied"] += srcStat.st_size
+            summary["deduplicated"] += duplicate
+            done = summary["copied"] + summary["skipped"]
+        if progress:
+            progress(done, len(files), srcname)
+
+    if workers > 1 and ThreadPoolExecutor is not None and len(files) > 1:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(_copy, files))
+    else:
+        for task in files:
+            _copy(task)
+
+    if store is not None:
+        store.save()
+
+    # folders are stamped last, deepest first, as writing the files changes their times
+    for srcFolder, dstFolder in reversed(folders):
+        try:
+            shutil.copystat(srcFolder, dstFolder)
+        except OSError as why:
+            if os.name == "nt":
+                # Copying file access times may fail on Windows
+                pass
+            else:
+                errors.append((srcFolder, dstFolder, str(why)))
     if errors:
         raise shutil.Error(errors)
+    return summary
 
 def niceName(filepath):
     """Gets the base name of the given filename"""
     basename = os.path.split(filepath)[1]
     return os.path.splitext(basename)[0]
 
+class NameValidator(object):
+    """
+    Precompiled name check and sanitizer for one option set. Get the shared instances with nameValidator.
+    Allowed characters are letters, digits, ".", "_", "-", ":" and "/". Spaces and backslashes are optional.
+    """
+    def __init__(self, allowSpaces=False, directory=False, replacement="_"):
+        """
+        :param allowSpaces: (Boolean) If True, spaces are allowed
+        :param directory: (Boolean) If True, the names are treated as directories and backslashes are allowed
+        :param replacement: (String) replaces each run of illegal characters in the suggestions
+        """
+        self.allowSpaces = allowSpaces
+        self.directory = directory
+        self.replacement = replacement
+        allowed = ":/A-Za-z0-9%s%s._-" % ("\\\\:" if directory else "", " " if allowSpaces else "")
+        self._illegal = re.compile("[^%s]" % allowed)
+        self._illegalRuns = re.compile("[^%s]+" % allowed)
+
+    def isValid(self, text):
+        """Returns True if the text has no illegal characters"""
+        return self._illegal.search(text) is None
+
+    def sanitize(self, text):
+        """
+        Suggests a valid replacement for the text. Accented letters lose their accents, other illegal
+        characters are replaced
+        :param text: (String) text to sanitize
+        :return: (String) valid text
+        """
+        if self.isValid(text):
+            return text
+        if not isinstance(text, str) or sys.version_info[0] > 2:
+            text = unicodedata.normalize("NFKD", text)
+            text = "".join(c for c in text if not unicodedata.combining(c))
+        return self._illegalRuns.sub(self.replacement, text) or self.replacement
+
+    def check(self, names):
+        """
+        Checks many names at once
+        :param names: (List) names to check
+        :return: (List) (name, suggestion) tuples for the names which fail the check, in input order
+        """
+        search = self._illegal.search
+        return [(name, self.sanitize(name)) for name in names if search(name) is not None]
+
+
+_nameValidators = {}
+
+
+def nameValidator(allowSpaces=False, directory=False):
+    """Returns the shared NameValidator of the options. Patterns are compiled once per option set"""
+    key = (bool(allowSpaces), bool(directory))
+    validator = _nameValidators.get(key)
+    if validator is None:
+        validator = _nameValidators[key] = NameValidator(*key)
+    return validator
+
 def nameCheck(text, allowSpaces=False, directory=False):
     """
     Checks the text for illegal characters
@@ -113,15 +780,87 @@ def nameCheck(text, allowSpaces=False, directory=False):
     :param directory: (Boolean) If True, the text will be treated as a directory
     :return: (Boolean) True if passes the check, False if fails
     """
-    aSpa = " " if allowSpaces else ""
-    dir = "\\\\:" if directory else ""
+    return nameValidator(allowSpaces, directory).isValid(text)
 
-    pattern = r'^[:/A-Za-z0-9%s%s.A_-]*$' %(dir, aSpa)
+def _uniqueSuggestion(suggestion, taken):
+    """Adds a numeric suffix before the extension until the suggestion does not clash with the taken names"""
+    base, ext = os.path.splitext(suggestion)
+    candidate = suggestion
+    index = 1
+    while candidate in taken:
+        candidate = "%s_%i%s" % (base, index, ext)
+        index += 1
+    taken.add(candidate)
+    return candidate
 
-    if re.match(pattern, text):
-        return True
-    else:
-        return False
+def _listFolder(folder):
+    """Returns the file and folder names of the folder. Unreadable folders are reported as errors"""
+    try:
+        entries = _scandir(folder)
+    except OSError as why:
+        return folder, [], [], str(why)
+    files, folders = [], []
+    for entry in entries:
+        (folders if entry.is_dir() and not entry.is_symlink() else files).append(entry.name)
+    return folder, files, folders, None
+
+def validateTree(root, allowSpaces=False, folders=True, ignore=None, workers=1):
+    """
+    Checks every file and folder name under the root. Folders are listed level by level, in parallel with
+    workers, which pays off on network storage.
+    Suggestions are unique within their folder, so the offending names can be renamed to them directly.
+
+    Example:
+    report = validateTree("/mnt/library", workers=8)
+    for entry in report["invalid"]:
+        print(entry["path"], "=>", entry["suggestion"])
+    :param root: (String) root folder. The root name itself is not checked
+    :param allowSpaces: (Boolean) If True, spaces wont count as a problem
+    :param folders: (Boolean) If True, folder names are checked as well as file names
+    :param ignore: (Function) Optional. copytree style ignore(folder, names) returning the names to skip.
+                    Skipped folders are not walked
+    :param workers: (Int) number of threads listing folders in parallel. Default 1
+    :return: (Dictionary) "checked": number of checked names, "folders": number of walked folders,
+                    "invalid": list of {"path", "name", "suggestion", "folder"} dictionaries sorted by path,
+                    "errors": list of (folder, error) for the folders which cannot be listed
+    """
+    validator = nameValidator(allowSpaces)
+    search = validator._illegal.search
+    report = {"checked": 0, "folders": 0, "invalid": [], "errors": []}
+    level = [os.path.abspath(root)]
+    executor = ThreadPoolExecutor(max_workers=workers) if workers > 1 and ThreadPoolExecutor is not None else None
+    try:
+        while level:
+            listings = executor.map(_listFolder, level) if executor else map(_listFolder, level)
+            level = []
+            for folder, fileNames, folderNames, error in listings:
+                report["folders"] += 1
+                if error:
+                    report["errors"].append((folder, error))
+                    continue
+                if ignore is not None:
+                    ignored = ignore(folder, fileNames + folderNames)
+                    fileNames = [name for name in fileNames if name not in ignored]
+                    folderNames = [name for name in folderNames if name not in ignored]
+                level.extend(os.path.join(folder, name) for name in folderNames)
+                checked = fileNames + folderNames if folders else fileNames
+                report["checked"] += len(checked)
+                invalid = [name for name in checked if search(name) is not None]
+                if not invalid:
+                    continue
+                # the valid names of the folder are kept as they are
+                taken = set(fileNames + folderNames).difference(invalid)
+                folderSet = set(folderNames)
+                for name in sorted(invalid):
+                    report["invalid"].append({"path": os.path.join(folder, name),
+                                              "name": name,
+                                              "suggestion": _uniqueSuggestion(validator.sanitize(name), taken),
+                                              "folder": name in folderSet})
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    report["invalid"].sort(key=lambda entry: entry["path"])
+    return report
 
 def folderCheck(folderPath):
     """Checks if the folder exists, creates it if doesnt"""
@@ -131,6 +870,8 @@ def folderCheck(folderPath):
 
 def showInExplorer(tpath):
     """Opens the path in Windows Explorer(Windows) or Nautilus(Linux)"""
+    import platform
+    import subprocess
     currentPlatform = platform.system()
     if os.path.isfile(tpath):
         tpath = os.path.dirname(tpath)
@@ -0,0 +1,392 @@
+"""Headless checks of the scene layer on the fake backend"""
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+import attributes
+import backend
+import profiling
+import utils
+
+
+def _alignScene():
+    scene = backend.FakeBackend()
+    for name in ("n", "a", "b", "c"):
+        scene.addNode(name)
+    scene.cmds.setAttr("a.translate", -5, 0, 0)
+    scene.cmds.setAttr("b.translate", 0, 0, 7)
+    scene.cmds.setAttr("c.translate", 10, 0, 0)
+    return scene
+
+
+def _alignTwice():
+    utils.alignAndAimNodes(["n"], [["a"]], [["c"]], freezeTransform=True)
+    utils.alignAndAimNodes(["n"], [["b"]], [["c"]])
+
+
+def test_batch_keeps_edits_before_freeze():
+    with backend.use(_alignScene()) as immediate:
+        _alignTwice()
+    with backend.use(_alignScene()) as batched:
+        with utils.batch():
+            _alignTwice()
+    assert batched.cmds.getAttr("n.translate") == immediate.cmds.getAttr("n.translate")
+    assert np.allclose(batched.worldMatrix("n"), immediate.worldMatrix("n"))
+    assert np.allclose(batched.nodes["n"].offset, immediate.nodes["n"].offset)
+
+
+def _jointScene(parented):
+    scene = backend.FakeBackend()
+    scene.addNode("hand")
+    scene.cmds.setAttr("hand.translate", 1, 2, 3)
+    joints = []
+    for i, position in enumerate([(0, 0, 0), (2, 1, 0), (4, 1, 1), (6, 0, 1)]):
+        joints.append(scene.cmds.joint(name="j%i" % i, position=position))
+        if parented:
+            scene.cmds.parent(joints[-1], joints[-2] if i else "hand")
+    if not parented:
+        scene.cmds.parent(joints[0], "hand")
+    return scene, joints
+
+
+def test_orient_joints_parents_loose_joints():
+    with backend.use(_jointScene(True)[0]) as chain:
+        utils.orientJoints(["j0", "j1", "j2", "j3"])
+    with backend.use(_jointScene(False)[0]) as loose:
+        utils.orientJoints(["j0", "j1", "j2", "j3"])
+        assert [loose.cmds.listRelatives(j, parent=True)[0] for j in ("j1", "j2", "j3")] == ["j0", "j1", "j2"]
+    for joint in ("j0", "j1", "j2", "j3"):
+        assert np.allclose(loose.worldMatrix(joint), chain.worldMatrix(joint))
+
+
+def test_mesh_cache_invalidation():
+    scene = backend.FakeBackend()
+    cache = backend.MeshCache()
+    scene.addMesh("body", np.random.RandomState(0).rand(20, 3))
+    with backend.use(scene):
+        fetch = lambda: scene.meshPoints("body")
+        for _ in range(3):
+            cache.get("body", "world", fetch)
+            scene.setPoints("body", np.zeros(3), indices=[0])
+        cache.get("body", "world", fetch)
+        scene.cmds.currentTime(5, edit=True)
+        cache.get("body", "world", fetch)
+        cache.get("body", "world", fetch)
+        assert cache.stats()["misses"] == 5
+        assert cache.stats()["hits"] == 1
+        # dropped entries release their watches
+        assert len(scene._dirtyWatchers) == 1
+
+
+def test_profiler_counts_editor_commands():
+    scene = backend.FakeBackend()
+    scene.addNode("root")
+    scene.addNode("ctrl", parent="root")
+    with backend.use(scene):
+        with profiling.profile() as profiler:
+            utils.createUpGrp("ctrl", "OFF")
+            utils.lockAndHide("ctrl", ["sx", "sy"])
+    record = profiler.functions["utils.createUpGrp"]
+    assert record["commands"] == {"cmds.createNode": 1, "cmds.listRelatives": 1, "cmds.parent": 2,
+                                  "cmds.makeIdentity": 1}
+    assert record["commandCount"] == 5
+    assert record["created"] == 1
+    assert profiler.functions["utils.alignTo"]["commands"]["backend.setWorldTransform"] == 1
+    assert profiler.functions["utils.lockAndHide"]["commands"]["cmds.setAttr"] == 2
+    # nothing stays patched
+    assert isinstance(backend.cmds, backend._Proxy) and isinstance(backend.scene, backend._Proxy)
+
+
+def test_chained_batch_is_one_undo_chunk():
+    scene, joints = _jointScene(True)
+    scene.addNode("ctrl")
+    with backend.use(scene):
+        with utils.batch():
+            utils.createUpGrp("ctrl", "OFF")
+            # reads the pending group, so the queue is flushed in the middle of the scope
+            utils.createUpGrp("ctrl_OFF", "ZERO")
+            utils.orientJoints(joints)
+            utils.orientChains([joints])
+    assert scene.cmds.listRelatives("ctrl_OFF", parent=True) == ["ctrl_OFF_ZERO"]
+    assert scene.undoChunks == 1
+    assert scene.openUndoChunks == 0
+
+
+def test_get_all_verts_outputs(monkeypatch):
+    scene = backend.FakeBackend()
+    points = np.random.RandomState(1).rand(10, 3)
+    scene.addNode("root")
+    scene.cmds.setAttr("root.translate", 1, 2, 3)
+    scene.addMesh("body", points, parent="root")
+    reads = []
+    meshPoints = scene.meshPoints
+    monkeypatch.setattr(scene, "meshPoints", lambda *args: reads.append(args[2:]) or meshPoints(*args))
+    monkeypatch.setattr(utils, "_GENERATOR_CHUNK", 4)
+    with backend.use(scene):
+        world = utils.getAllVerts("body", output="numpy")
+        assert np.allclose(world, points + (1, 2, 3))
+        assert np.allclose(utils.getAllVerts("body", output="numpy", space="object", dtype="float32"), points)
+        assert utils.getAllVerts("body", output="list") == [tuple(p) for p in world.tolist()]
+        del reads[:]
+        generator = utils.getAllVerts("body")
+        assert np.allclose(next(generator), world[0])
+        # only the first block is read
+        assert reads == [(0, 3)]
+        assert np.allclose(list(generator), world[1:])
+        chunks = list(utils.getAllVerts("body", output="numpy", chunkSize=3))
+        assert [len(c) for c in chunks] == [3, 3, 3, 1]
+        assert np.allclose(np.vstack(chunks), world)
+
+
+def test_fake_scene_commands():
+    scene = backend.FakeBackend()
+    cmds = scene.cmds
+    scene.addNode("root")
+    cmds.setAttr("root.translate", 1, 0, 0)
+    cmds.setAttr("root.ry", 90)
+    child = cmds.createNode("transform", name="ctrl", parent="root")
+    cmds.setAttr("ctrl.tx", 2)
+    assert cmds.createNode("transform", name="ctrl") == "ctrl1"
+
+    assert cmds.ls("ctrl*") == ["ctrl", "ctrl1"]
+    assert cmds.ls("ctrl", long=True) == ["|root|ctrl"]
+    assert cmds.ls("missing") == []
+    assert cmds.objExists("|root|ctrl") and cmds.objExists("ctrl.translateX") and not cmds.objExists("ctrl.foo")
+    assert cmds.listRelatives("root", children=True) == [child]
+
+    assert np.allclose(cmds.xform("ctrl", q=True, t=True), (2, 0, 0))
+    # rotated parent carries the child
+    assert np.allclose(cmds.xform("ctrl", q=True, t=True, ws=True), (1, 0, -2))
+    assert np.allclose(np.reshape(cmds.xform("ctrl", q=True, m=True, ws=True), (4, 4)), scene.worldMatrix("ctrl"))
+    with pytest.raises(NotImplementedError):
+        cmds.xform("ctrl", t=(0, 0, 0))
+    scene.addMesh("body", [(0, 0, 0), (1, 0, 0), (0, 1, 0)], parent="root")
+    assert np.allclose(cmds.xform("body.vtx[1:2]", q=True, t=True), [1, 0, 0, 0, 1, 0])
+    assert cmds.polyEvaluate("body", vertex=True) == 3
+
+    cmds.addAttr("ctrl", ln="space", sn="spc", at="enum", en="world:local", k=True)
+    cmds.addAttr("ctrl", ln="weight", at="double", min=0, max=1, dv=0.5)
+    assert cmds.listAttr("ctrl", ud=True) == ["space", "weight"]
+    assert cmds.attributeQuery("spc", node="ctrl", longName=True) == "space"
+    assert cmds.attributeQuery("space", node="ctrl", listEnum=True) == ["world:local"]
+    assert cmds.attributeQuery("space", node="ctrl", keyable=True)
+    assert not cmds.attributeQuery("weight", node="ctrl", keyable=True)
+    assert cmds.attributeQuery("weight", node="ctrl", maxExists=True)
+    assert not cmds.attributeQuery("weight", node="ctrl", softMaxExists=True)
+    assert cmds.attributeQuery("weight", node="ctrl", maximum=True) == [1]
+    assert cmds.getAttr("ctrl.weight") == 0.5
+    assert not cmds.attributeQuery("missing", node="ctrl", exists=True)
+
+    with pytest.raises(AttributeError):
+        cmds.polyCube()
+    with pytest.raises(AttributeError):
+        scene.om
+    cmds.setAttr("ctrl.tx", lock=True)
+    with pytest.raises(RuntimeError):
+        cmds.setAttr("ctrl.translateX", 5)
+
+    cmds.delete("root")
+    assert cmds.ls() == ["ctrl1"]
+
+
+def test_world_transform_queries():
+    scene = backend.FakeBackend()
+    scene.addNode("root")
+    scene.addNode("ctrl", parent="root")
+    scene.addNode("target")
+    scene.cmds.setAttr("root.translate", 0, 1, 0)
+    scene.cmds.setAttr("root.scale", 2, 2, 2)
+    scene.cmds.setAttr("ctrl.translate", 1, 0, 0)
+    scene.cmds.setAttr("target.translate", 4, 5, 6)
+    with backend.use(scene):
+        positions = utils.getWorldTranslations(["ctrl", "root", "ctrl"])
+        assert positions.shape == (3, 3)
+        assert np.allclose(positions, [(2, 1, 0), (0, 1, 0), (2, 1, 0)])
+        matrices = utils.getWorldMatrices(["ctrl", "target"])
+        assert matrices.shape == (2, 4, 4)
+        assert np.allclose(matrices[0], scene.worldMatrix("ctrl"))
+        assert utils.getDistance("root", "ctrl") == pytest.approx(2.0)
+        with utils.lookupCache():
+            with utils.batch():
+                utils.alignTo("ctrl", "target")
+                # reading a node with pending edits applies them first
+                assert np.allclose(utils.getWorldTranslations(["ctrl"]), [(4, 5, 6)])
+
+
+class _SelectionList(object):
+    """MSelectionList stand-in. Merges repeated names and dag path spellings of the same node"""
+    def __init__(self):
+        self.items = []
+
+    def length(self):
+        return len(self.items)
+
+    def add(self, name):
+        name = name.lstrip("|")
+        if name not in self.items:
+            self.items.append(name)
+
+    def getDagPath(self, index, dagPath):
+        dagPath.name = self.items[index]
+
+
+class _DagPath(object):
+    def __init__(self, other=None):
+        self.name = other.name if other is not None else None
+
+
+def test_dag_paths_with_merged_names():
+    sceneBackend = backend.MayaBackend()
+    sceneBackend._modules["maya.OpenMaya"] = type("om", (), {"MSelectionList": _SelectionList,
+                                                             "MDagPath": _DagPath})
+    nodes = ["a", "b", "a", "|b", "c", "|a"]
+    assert [p.name for p in sceneBackend.dagPaths(nodes)] == ["a", "b", "a", "b", "c", "a"]
+
+
+def test_distances_and_between_vectors():
+    scene = backend.FakeBackend()
+    for name, position in (("a", (0, 0, 0)), ("b", (3, 4, 0)), ("c", (0, 0, 2)), ("d", (-1, 0, 0))):
+        scene.addNode(name)
+        scene.cmds.setAttr("%s.translate" % name, *position)
+    with backend.use(scene):
+        assert np.allclose(utils.getDistances(["a", "b"], ["c", "a", "d"]),
+                           [(2, 0, 1), (np.sqrt(29), 5, np.sqrt(32))])
+        vectors = utils.getBetweenVectors(["a", "c"], [["c", "d"], ["a"]])
+    assert vectors.shape == (2, 3)
+    assert np.allclose(vectors[0], np.array([1, 0, -1]) / np.sqrt(2))
+    assert np.allclose(vectors[1], (0, 0, 1))
+
+
+def test_align_and_aim():
+    scene = _alignScene()
+    scene.addNode("up")
+    scene.cmds.setAttr("up.translate", 0, 0, -5)
+    with backend.use(scene):
+        utils.alignAndAim("n", ["b"], ["c"])
+        world = scene.worldMatrix("n")
+        assert np.allclose(world[3, :3], (0, 0, 7))
+        # x aims at c, y stays up
+        assert np.allclose(world[0, :3], np.array([10, 0, -7]) / np.sqrt(149))
+        assert np.allclose(world[1, :3], (0, 1, 0))
+
+        # positions are averaged, the offset is applied after aiming
+        utils.alignAndAim("n", ["a", "c"], ["b"], upObject="up", translateOff=(0, 1, 0))
+        world = scene.worldMatrix("n")
+        assert np.allclose(world[3, :3], (2.5, 1, 0))
+        assert np.allclose(world[0, :3], np.array([-2.5, 0, 7]) / np.sqrt(55.25))
+        # y is the direction to the up object made perpendicular to the aim
+        assert np.allclose(world[1, :3], np.array([-7, 0, -2.5]) / np.sqrt(55.25))
+
+        matrices = utils.alignAndAimNodes(["n", "a"], [["a"], ["a"]], [["c"], ["b"]],
+                                          upVector=np.array([0, 0, 1.0]), rotateOff=(90, 0, 0))
+        assert np.allclose(matrices[0, :3, :3], [(1, 0, 0), (0, -1, 0), (0, 0, -1)], atol=1e-9)
+        assert np.allclose(scene.worldMatrix("n"), matrices[0])
+        assert np.allclose(scene.worldMatrix("a"), matrices[1])
+
+
+def _attributeScene():
+    scene = backend.FakeBackend()
+    for name in ("source", "t1", "t2"):
+        scene.addNode(name)
+    scene.cmds.addAttr("source", ln="space", sn="spc", at="enum", en="world:local", k=True)
+    scene.cmds.addAttr("source", ln="weight", sn="wgt", at="double", min=0, max=1, dv=0.5, h=False)
+    scene.cmds.addAttr("source", ln="label", sn="lbl", dt="string")
+    scene.cmds.setAttr("source.space", 1)
+    scene.cmds.setAttr("source.weight", 0.25)
+    scene.cmds.setAttr("source.label", "hand", type="string")
+    return scene
+
+
+def test_attribute_schema():
+    scene = _attributeScene()
+    scene.cmds.addAttr("t2", ln="weight", at="long")
+    with backend.use(scene):
+        schema = attributes.AttributeSchema.capture("source")
+        assert schema.names() == ["space", "weight", "label"]
+        schema = attributes.AttributeSchema.fromJson(schema.toJson())
+        weight = schema.attributes[1]
+        assert (weight["min"], weight["max"], weight["defaultValue"], weight["value"]) == (0, 1, 0.5, 0.25)
+        assert "smn" not in weight
+
+        assert schema.apply(["t1", "t2"]) == {"t1": ["space", "weight", "label"], "t2": ["space", "label"]}
+        for attr in ("space", "weight", "label"):
+            assert scene.cmds.getAttr("t1.%s" % attr) == scene.cmds.getAttr("source.%s" % attr)
+        assert attributes.AttributeSchema.capture("t1").attributes == schema.attributes
+        # existing attributes are skipped unless overrideEx is set
+        assert scene.nodes["t2"].userAttrs["weight"]["at"] == "long"
+        assert schema.apply(["t2"], values=False, overrideEx=True) == {"t2": ["space", "weight", "label"]}
+        assert scene.nodes["t2"].userAttrs["weight"]["at"] == "double"
+        assert scene.cmds.getAttr("t2.weight") == 0.5
+
+
+def test_attr_pass():
+    scene = _attributeScene()
+    with backend.use(scene):
+        utils.attrPass("source", "t1", attributes=["weight", "label"])
+        assert scene.cmds.listAttr("t1", ud=True) == ["weight", "label"]
+        assert scene.cmds.getAttr("t1.weight") == 0.25
+        assert scene.cmds.getAttr("t1.label") == "hand"
+        # moved attributes are removed from the source
+        assert scene.cmds.listAttr("source", ud=True) == ["space"]
+
+        with utils.batch():
+            utils.attrPass("source", "t2", keepSourceAttributes=True)
+        assert scene.cmds.listAttr("t2", ud=True) == ["space"]
+        assert scene.cmds.getAttr("t2.space") == 1
+        assert scene.cmds.listAttr("source", ud=True) == ["space"]
+
+
+def test_channel_states():
+    scene = backend.FakeBackend()
+    scene.addNode("a")
+    scene.addNode("b")
+    state = lambda plug: tuple(scene.cmds.getAttr(plug, **{flag: True}) for flag in attributes.CHANNEL_FLAGS)
+    with backend.use(scene):
+        assert utils.lockAndHide(["a", "b"], ["sx", "sy", "v"]) == {"written": 6, "skipped": 0}
+        assert state("a.scaleX") == state("b.v") == (True, False, False)
+        assert state("a.sz") == (False, True, False)
+        # channels already in state are not written again
+        assert utils.lockAndHide("a", ["sx", "scaleY", "sz"]) == {"written": 1, "skipped": 2}
+        assert utils.unlockAndUnhide("a", ["sx"]) == {"written": 1, "skipped": 0}
+        assert state("a.sx") == (False, True, True)
+
+        # the same plug spelled twice is set once with the later spec
+        result = attributes.applyChannelStates([("b", ["tx", "ty"], {"lock": True}),
+                                                ("b", ["translateX"], {"lock": False})])
+        assert result == {"written": 1, "skipped": 1}
+        assert state("b.tx")[0] is False and state("b.ty")[0] is True
+
+    assert attributes.diffChannelStates({"a.tx": {"lock": True, "keyable": True}},
+                                        {"a.tx": {"lock": True, "keyable": False}, "a.ty": {"lock": True}}) == {
+        "a.tx": {"keyable": False}, "a.ty": {"lock": True}}
+
+
+def test_unique_names():
+    scene = backend.FakeBackend()
+    for name in ("ctrl", "ctrl1", "ctrl3", "ctrl_grp", "ctrl05"):
+        scene.addNode(name)
+    with backend.use(scene):
+        assert utils.uniqueName("ctrl") == "ctrl2"
+        assert utils.uniqueName("free") == "free"
+        assert utils.uniqueNames(["ctrl", "new", "ctrl", "new", "ctrl_grp"]) == ["ctrl2", "new", "ctrl4", "new1",
+                                                                                 "ctrl_grp1"]
+        with utils.nameRegistry():
+            first = utils.uniqueName("ctrl")
+            scene.cmds.createNode("transform", name=first)
+            assert first == "ctrl2"
+            assert utils.uniqueNames(["ctrl", "ctrl"]) == ["ctrl4", "ctrl5"]
+            # the registry follows deleted and renamed nodes
+            scene.cmds.delete("ctrl1")
+            assert utils.uniqueName("ctrl") == "ctrl1"
+            scene.cmds.rename("ctrl3", "other")
+            assert utils.uniqueName("ctrl") == "ctrl3"
+            assert utils.uniqueName("other") == "other1"
+
+
+def test_unique_list():
+    assert utils.uniqueList([3, 1, 3, "a", 1, "a"]) == [3, 1, "a"]
+    assert utils.uniqueList([[1, 2], (1, 2), [1, 2], {"a": [1]}, {"a": [1]}, {1, 2}, {2, 1}]) == [
+        [1, 2], (1, 2), {"a": [1]}, {1, 2}]
+    rows = utils.uniqueList(np.array([[1, 2], [3, 4], [1, 2]]))
+    assert [row.tolist() for row in rows] == [[1, 2], [3, 4]]
@@ -0,0 +1,60 @@
+"""Metadata index updates and queries over a temporary library"""
+
+import os
+import json
+
+import metadata
+import structure
+
+
+def _write(root, relative, data):
+    path = os.path.join(str(root), relative)
+    structure.folderCheck(os.path.dirname(path))
+    with open(path, "w") as f:
+        json.dump(data, f)
+    return path
+
+
+def test_flatten_fields():
+    data = {"name": "a", "info": {"author": "arda", "tags": ["x"], "empty": {}}}
+    assert sorted(metadata.flattenFields(data)) == [("info.author", "arda"), ("info.empty", {}),
+                                                     ("info.tags", ["x"]), ("name", "a")]
+
+
+def test_index_queries(tmp_path):
+    library = tmp_path / "library"
+    hero = _write(library, os.path.join("characters", "hero.json"),
+                  {"info": {"author": "arda", "version": 2}, "rig": True})
+    villain = _write(library, os.path.join("characters", "villain.json"),
+                     {"info": {"author": "sam", "version": 2}})
+    prop = _write(library, os.path.join("props", "bad name.json"), {"info": {"author": "arda"}})
+    _write(library, os.path.join("props", "notes.txt"), {"info": {"author": "arda"}})
+    # sibling folder sharing the prefix of the name
+    other = _write(tmp_path / "library2", "hero.json", {"info": {"author": "arda"}})
+
+    with metadata.MetadataIndex(str(tmp_path / "index.db")) as index:
+        assert index.update(str(library)) == {"added": 3, "updated": 0, "removed": 0, "unchanged": 0}
+        index.update(str(tmp_path / "library2"))
+
+        assert index.findByName("hero") == sorted([hero, other])
+        assert index.findByName("illa", exact=False) == [villain]
+        assert index.findByValue("info.author", "arda") == sorted([hero, other, prop])
+        assert index.findByValue("info.version", 2) == [hero, villain]
+        assert index.findByValue("info.version", "2") == []
+        assert index.findByValue("rig") == [hero]
+        assert index.findByPrefix(str(library / "characters")) == [hero, villain]
+        assert index.findByPrefix(os.path.join(str(library), "")) == sorted([hero, villain, prop])
+        assert index.invalidNames() == [prop]
+        assert index.getFields(hero) == {"info.author": "arda", "info.version": 2, "rig": True}
+
+    # the index persists and only changed files are parsed again
+    with metadata.MetadataIndex(str(tmp_path / "index.db")) as index:
+        _write(library, os.path.join("characters", "villain.json"), {"info": {"author": "arda", "version": 3}})
+        os.remove(prop)
+        summary = index.update(str(library))
+        assert summary == {"added": 0, "updated": 1, "removed": 1, "unchanged": 1}
+        assert index.findByValue("info.author", "arda") == sorted([hero, villain, other])
+        assert index.getFields(prop) == {}
+        assert index.invalidNames() == []
+        # other roots are not touched by the update
+        assert index.findByPrefix(str(tmp_path / "library2")) == [other]
@@ -0,0 +1,72 @@
+"""Point cache record / read round trips on the fake backend"""
+
+import os
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+import backend
+import pointcache
+
+
+def test_record_and_read(tmp_path):
+    file = str(tmp_path / "shot.pc")
+    random = np.random.RandomState(0)
+    rest = random.rand(50, 3)
+    scene = backend.FakeBackend()
+    scene.addNode("root")
+    scene.cmds.setAttr("root.translate", 0, 10, 0)
+    scene.addMesh("body", rest, parent="root")
+    scene.addMesh("prop", random.rand(8, 3))
+    expected = {}
+    with backend.use(scene):
+        with pointcache.PointCacheRecorder(file, ["body", "prop"], frameCount=2, dtype="float64") as recorder:
+            for frame in range(1, 6):
+                scene.cmds.currentTime(frame, edit=True)
+                if frame == 3:
+                    scene.setPoints("body", random.rand(3, 3), indices=[1, 4, 9])
+                elif frame == 5:
+                    scene.setPoints("body", rest + 1.0)
+                counts = recorder.record()
+                expected[frame] = scene.meshPoints("body").reshape(-1, 3)
+                if frame == 3:
+                    # only the moved vertices are stored
+                    assert counts == [3, 0]
+            with pytest.raises(ValueError):
+                recorder.record(5)
+        assert scene.cmds.currentTime(q=True) == 5
+
+    with pointcache.PointCache(file) as cache:
+        assert cache.frames == [1.0, 2.0, 3.0, 4.0, 5.0]
+        assert 3 in cache and 6 not in cache
+        assert np.allclose(cache.rest("body"), expected[1])
+        for frame, points in expected.items():
+            assert np.allclose(cache.points(frame, "body"), points)
+        assert np.allclose(cache.points(2)["prop"], scene.meshPoints("prop").reshape(-1, 3))
+        trajectory = cache.trajectory("body", [4, 0], frames=[5, 3])
+        assert trajectory.shape == (2, 2, 3)
+        assert np.allclose(trajectory[0], expected[5][[4, 0]])
+        assert np.allclose(trajectory[1], expected[3][[4, 0]])
+        with pytest.raises(ValueError):
+            cache.points(6, "body")
+        with pytest.raises(ValueError):
+            cache.rest("missing")
+
+
+def test_float32_and_incomplete_cache(tmp_path):
+    file = str(tmp_path / "rig.pc")
+    recorder = pointcache.PointCacheRecorder(file, ["a"], rest={"a": np.zeros((4, 3))})
+    assert recorder.add(10, {"a": np.zeros((4, 3))}) == [0]
+    assert recorder.add(11, [np.ones((4, 3))]) == [4]
+    with pytest.raises(ValueError):
+        recorder.add(12, [np.ones((5, 3))])
+    # the sidecar is written when the recorder is closed
+    with pytest.raises(IOError):
+        pointcache.PointCache(file)
+    recorder.close()
+    cache = pointcache.PointCache(file)
+    assert cache.dtype == np.float32
+    assert np.array_equal(cache.points(11, "a"), np.ones((4, 3)))
+    assert np.array_equal(cache.trajectory("a")[:, 2], [(0, 0, 0), (1, 1, 1)])
+    assert os.path.getsize(file) == 4 * 3 * 4 * 2
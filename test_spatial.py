@@ -0,0 +1,51 @@
+"""Checks of the spatial queries against brute force results"""
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+import spatial
+
+
+def _bruteForce(points, queries, k):
+    d2 = ((queries[:, None] - points[None]) ** 2).sum(axis=-1)
+    ids = np.argsort(d2, axis=1)[:, :k]
+    return ids, np.sqrt(np.take_along_axis(d2, ids, axis=1))
+
+
+def test_vertex_index_batch_queries():
+    random = np.random.RandomState(0)
+    points = random.rand(3000, 3)
+    queries = random.rand(500, 3) * 1.2 - 0.1
+    index = spatial.VertexIndex(points, leafSize=8)
+    ids, distances = index.kNearest(queries, 4, chunkSize=64)
+    expectedIds, expectedDistances = _bruteForce(points, queries, 4)
+    assert np.array_equal(ids, expectedIds)
+    assert np.allclose(distances, expectedDistances)
+    # the vectorized search agrees with the single point search
+    assert [i for _, i in index._search(queries[7], k=4)] == ids[7].tolist()
+
+    moved = random.choice(len(points), 200, replace=False)
+    index.update(moved, random.rand(200, 3) + 0.5)
+    ids, distances = index.kNearest(queries, 4)
+    expectedIds, expectedDistances = _bruteForce(index.points, queries, 4)
+    assert np.array_equal(ids, expectedIds)
+    assert np.allclose(distances, expectedDistances)
+
+
+def test_vertex_index_missing_neighbours():
+    index = spatial.VertexIndex([(0, 0, 0), (1, 0, 0)])
+    ids, distances = index.kNearest([(0.9, 0, 0)], 3)
+    assert ids.tolist() == [[1, 0, -1]]
+    assert np.allclose(distances, [[0.1, 0.9, np.inf]])
+    assert index.withinRadius((0.2, 0, 0), 0.5).tolist() == [0]
+
+
+def test_point_grid_matches_brute_force():
+    random = np.random.RandomState(1)
+    points = random.rand(2000, 3)
+    queries = np.vstack((random.rand(300, 3), random.rand(20, 3) * 10))
+    ids, distances = spatial.PointGrid(points).kNearest(queries, 3, chunkSize=100)
+    expectedIds, expectedDistances = _bruteForce(points, queries, 3)
+    assert np.array_equal(ids, expectedIds)
+    assert np.allclose(distances, expectedDistances)
@@ -0,0 +1,372 @@
+"""Checks of the structure file operations on the local filesystem"""
+
+import os
+import json
+import threading
+
+import pytest
+
+import structure
+
+
+def _write(path, data):
+    with open(str(path), "w") as f:
+        json.dump(data, f)
+    return str(path)
+
+
+def test_json_cache_invalidation(tmp_path):
+    cache = structure.JsonCache()
+    file = _write(tmp_path / "a.json", {"value": 1})
+    assert cache.get(file) == {"value": 1}
+    assert cache.get(file) == {"value": 1}
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    # a different size is noticed even within the mtime resolution
+    _write(file, {"value": 100})
+    assert cache.get(file) == {"value": 100}
+    # same size, newer mtime
+    _write(file, {"value": 200})
+    stat = os.stat(file)
+    os.utime(file, (stat.st_atime, stat.st_mtime + 10))
+    assert cache.get(file) == {"value": 200}
+    assert cache.misses == 3
+
+    os.remove(file)
+    assert cache.get(file) is None
+    assert file not in cache
+
+
+def test_json_cache_read_only(tmp_path):
+    cache = structure.JsonCache()
+    file = _write(tmp_path / "a.json", {"items": [{"name": "a"}], "count": 1})
+    shared = cache.get(file, readOnly=True)
+    assert isinstance(shared, structure.FrozenDict)
+    assert shared["items"] == ({"name": "a"},)
+    with pytest.raises(TypeError):
+        shared["count"] = 2
+    with pytest.raises(TypeError):
+        shared["items"][0].update(name="b")
+    assert cache.get(file, readOnly=True) is shared
+    # default results are mutable copies
+    copy = cache.get(file)
+    copy["items"].append({"name": "b"})
+    assert cache.get(file) == {"items": [{"name": "a"}], "count": 1}
+    assert structure.loadJson(file, cache=False) == {"items": [{"name": "a"}], "count": 1}
+
+
+def test_json_cache_eviction(tmp_path):
+    files = [_write(tmp_path / ("%i.json" % i), {"values": list(range(100))}) for i in range(3)]
+    cache = structure.JsonCache(maxEntries=2)
+    for file in files[:2]:
+        cache.get(file)
+    cache.get(files[0])
+    cache.get(files[2])
+    # least recently used one goes
+    assert files[1] not in cache and files[0] in cache and files[2] in cache
+    assert cache.evictions == 1
+
+    # the limit is the memory of the parsed data, which is larger than the file
+    entrySize = cache.stats()["bytes"] // 2
+    assert entrySize > os.path.getsize(files[0])
+    cache = structure.JsonCache(maxBytes=entrySize * 2)
+    for file in files:
+        cache.get(file)
+    assert len(cache) == 2 and files[0] not in cache
+    assert cache.stats()["bytes"] <= entrySize * 2
+    # data larger than the whole cache is not kept
+    small = structure.JsonCache(maxBytes=entrySize - 1)
+    assert small.get(files[0]) == {"values": list(range(100))}
+    assert len(small) == 0
+
+
+def test_content_store_concurrent_add(tmp_path):
+    store = structure.ContentStore(str(tmp_path / "store"))
+    source = _write(tmp_path / "a.json", {"value": 1})
+    digest = store.hashFile(source)
+    barrier = threading.Barrier(8)
+    results = []
+
+    def add():
+        barrier.wait()
+        results.append(store.add(source, digest))
+
+    threads = [threading.Thread(target=add) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(isNew for _, isNew in results) == [False] * 7 + [True]
+    assert set(path for path, _ in results) == set([store.objectPath(digest)])
+    assert os.listdir(os.path.dirname(store.objectPath(digest))) == [digest]
+
+
+def test_content_store_keeps_objects_of_other_processes(tmp_path, monkeypatch):
+    store = structure.ContentStore(str(tmp_path / "store"))
+    source = _write(tmp_path / "a.json", {"value": 1})
+    digest = store.hashFile(source)
+    objectPath, isNew = store.add(source, digest)
+    inode = os.stat(objectPath).st_ino
+    # another process stores the same content between the check and the write
+    isfile = os.path.isfile
+    monkeypatch.setattr(os.path, "isfile", lambda path: path != objectPath and isfile(path))
+    assert store.add(source, digest) == (objectPath, False)
+    assert os.stat(objectPath).st_ino == inode
+    assert os.listdir(os.path.dirname(objectPath)) == [digest]
+
+
+def test_dump_json_atomic_replace(tmp_path):
+    file = str(tmp_path / "a.json")
+    data = {"name": "a", "values": list(range(10)), "nested": {"key": [1.5, None]}}
+    structure.dumpJson(data, file)
+    assert structure.loadJson(file, cache=False) == data
+    # new files get the regular umask permissions, not the owner only ones of the temp file
+    assert os.stat(file).st_mode & 0o777 == 0o666 & ~structure._UMASK
+
+    os.chmod(file, 0o640)
+    inode = os.stat(file).st_ino
+    structure.dumpJson({"name": "b"}, file, durability="directory")
+    assert os.stat(file).st_mode & 0o777 == 0o640
+    # replaced by the rename, not written in place
+    assert os.stat(file).st_ino != inode
+    assert structure.loadJson(file, cache=False) == {"name": "b"}
+    assert os.listdir(str(tmp_path)) == ["a.json"]
+
+
+def test_dump_json_modes(tmp_path):
+    data = {"values": list(range(100)), "info": {"author": "arda"}}
+    outputs = {}
+    for options in ({}, {"compact": True}, {"stream": True}, {"compact": True, "stream": True}):
+        file = str(tmp_path / ("%s.json" % ("_".join(sorted(options)) or "default")))
+        structure.dumpJson(data, file, **options)
+        assert structure.loadJson(file, cache=False) == data
+        with open(file) as f:
+            outputs[tuple(sorted(options))] = f.read()
+    assert outputs[("compact",)] == json.dumps(data, separators=(",", ":"))
+    assert outputs[("compact", "stream")] == outputs[("compact",)]
+    assert outputs[("stream",)] == outputs[()] == json.dumps(data, indent=4)
+
+
+def test_dump_json_failure_keeps_the_old_file(tmp_path):
+    file = str(tmp_path / "a.json")
+    structure.dumpJson({"value": 1}, file)
+    with pytest.raises(TypeError):
+        structure.dumpJson({"value": object()}, file, stream=True)
+    assert structure.loadJson(file, cache=False) == {"value": 1}
+    assert os.listdir(str(tmp_path)) == ["a.json"]
+    with pytest.raises(ValueError):
+        structure.dumpJson({"value": 2}, file, durability="disk")
+
+
+def _makeTree(root, files):
+    for relative, content in files.items():
+        path = os.path.join(str(root), relative)
+        structure.folderCheck(os.path.dirname(path))
+        with open(path, "w") as f:
+            f.write(content)
+    return str(root)
+
+
+def _readTree(root):
+    contents = {}
+    for folder, _, names in os.walk(str(root)):
+        for name in names:
+            path = os.path.join(folder, name)
+            with open(path) as f:
+                contents[os.path.relpath(path, str(root))] = f.read()
+    return contents
+
+
+@pytest.mark.parametrize("workers", [1, 4])
+def test_copytree_incremental(tmp_path, workers):
+    files = dict((os.path.join("sub%i" % (i % 3), "f%i.txt" % i), "content %i" % i) for i in range(12))
+    src = _makeTree(tmp_path / "src", files)
+    dst = str(tmp_path / "dst")
+    calls = []
+    summary = structure.copytree(src, dst, workers=workers, incremental=True,
+                                 progress=lambda done, total, name: calls.append((done, total)))
+    assert _readTree(dst) == files
+    assert (summary["copied"], summary["skipped"]) == (12, 0)
+    assert summary["bytesCopied"] == sum(len(content) for content in files.values())
+    assert sorted(calls) == [(i, 12) for i in range(1, 13)]
+
+    # unchanged files are skipped, changed ones are written again
+    changed = os.path.join(src, "sub1", "f1.txt")
+    with open(changed, "w") as f:
+        f.write("changed content")
+    files[os.path.join("sub1", "f1.txt")] = "changed content"
+    summary = structure.copytree(src, dst, workers=workers, incremental=True)
+    assert (summary["copied"], summary["skipped"]) == (1, 11)
+    assert summary["bytesCopied"] == len("changed content")
+    assert _readTree(dst) == files
+
+    # same size and content but a different time is copied, unless the contents are compared
+    stat = os.stat(changed)
+    os.utime(changed, (stat.st_atime, stat.st_mtime + 10))
+    summary = structure.copytree(src, dst, workers=workers, incremental=True, useHash=True)
+    assert (summary["copied"], summary["skipped"]) == (0, 12)
+    summary = structure.copytree(src, dst, workers=workers, incremental=True)
+    assert (summary["copied"], summary["skipped"]) == (1, 11)
+    assert os.stat(os.path.join(dst, "sub1", "f1.txt")).st_mtime == os.stat(changed).st_mtime
+
+    # without incremental everything is copied again
+    summary = structure.copytree(src, dst, workers=workers)
+    assert (summary["copied"], summary["skipped"]) == (12, 0)
+
+
+def test_copytree_ignore_and_cancel(tmp_path):
+    src = _makeTree(tmp_path / "src", {"a.dwg": "a", "b.txt": "b", os.path.join("sub", "c.dwg"): "c"})
+    dst = str(tmp_path / "dst")
+    structure.copytree(src, dst, ignore=structure.include_patterns("*.dwg"))
+    assert _readTree(dst) == {"a.dwg": "a", os.path.join("sub", "c.dwg"): "c"}
+
+    cancel = threading.Event()
+    cancel.set()
+    summary = structure.copytree(src, str(tmp_path / "cancelled"), cancel=cancel)
+    assert summary["cancelled"] and summary["copied"] == 0
+    assert _readTree(tmp_path / "cancelled") == {}
+
+
+@pytest.mark.parametrize("workers", [1, 4])
+def test_copytree_store_deduplicates(tmp_path, workers):
+    files = {"a.txt": "shared", os.path.join("sub", "b.txt"): "shared", "c.txt": "unique"}
+    src = _makeTree(tmp_path / "src", files)
+    store = structure.ContentStore(str(tmp_path / "store"))
+    summary = structure.copytree(src, str(tmp_path / "dst1"), workers=workers, store=store)
+    assert (summary["copied"], summary["deduplicated"]) == (3, 1)
+    assert summary["bytesCopied"] == len("shared") + len("unique")
+    summary = structure.copytree(src, str(tmp_path / "dst2"), workers=workers, store=store)
+    assert (summary["copied"], summary["deduplicated"]) == (3, 3)
+    assert summary["bytesCopied"] == 0
+    assert _readTree(tmp_path / "dst1") == _readTree(tmp_path / "dst2") == files
+
+    # every copy of the same content is one read-only file in the store
+    shared = [os.stat(str(tmp_path / folder / name)) for folder in ("dst1", "dst2")
+              for name in ("a.txt", os.path.join("sub", "b.txt"))]
+    assert len(set(stat.st_ino for stat in shared)) == 1
+    assert shared[0].st_nlink == 5
+    assert shared[0].st_mode & 0o777 == 0o444
+    assert len(os.listdir(os.path.join(store.root, "objects"))) == 2
+
+    # hashes are kept in the manifest for the next run
+    manifest = structure.loadJson(store.manifestFile, cache=False)
+    assert len(manifest["files"]) == 3
+    assert structure.ContentStore(store.root).hashFile(os.path.join(src, "a.txt")) == \
+        structure.fileHash(os.path.join(src, "a.txt"))
+
+    # linked copies are already up to date. Copying over them does not change the store
+    summary = structure.copytree(src, str(tmp_path / "dst1"), incremental=True, store=store)
+    assert (summary["copied"], summary["skipped"]) == (0, 3)
+    summary = structure.copytree(str(tmp_path / "dst2"), str(tmp_path / "dst1"))
+    assert summary["copied"] == 3
+    objectPath = store.objectPath(structure.fileHash(os.path.join(src, "a.txt")))
+    assert os.stat(objectPath).st_nlink == 3
+    with open(objectPath) as f:
+        assert f.read() == "shared"
+
+
+def test_arrays_round_trip(tmp_path):
+    np = pytest.importorskip("numpy")
+    file = str(tmp_path / "skin.bin")
+    random = np.random.RandomState(0)
+    arrays = structure.OrderedDict([("weights", random.rand(4, 100)),
+                                    ("points", random.rand(100, 3).astype(np.float32)),
+                                    ("indices", np.arange(7, dtype=">i4")),
+                                    ("empty", np.zeros((0, 3)))])
+    structure.dumpArrays(arrays, file, metadata={"influences": ["a", "b", "c", "d"]})
+    assert structure.loadArrayMetadata(file) == {"influences": ["a", "b", "c", "d"]}
+
+    for mmap in (True, False):
+        loaded = structure.loadArrays(file, mmap=mmap)
+        assert list(loaded) == list(arrays)
+        for name, values in arrays.items():
+            assert loaded[name].shape == values.shape
+            assert np.array_equal(loaded[name], values)
+    mapped = structure.loadArrays(file, names=["weights"])
+    assert list(mapped) == ["weights"]
+    assert isinstance(mapped["weights"], np.memmap)
+    assert not mapped["weights"].flags.writeable
+    assert np.array_equal(mapped["weights"][2], arrays["weights"][2])
+
+    # each array is a 64 byte aligned npy blob
+    entries = structure.loadJson(structure.arraySidecar(file), cache=False)["arrays"]
+    with open(file, "rb") as f:
+        for name, entry in entries.items():
+            assert entry["offset"] % 64 == 0 and entry["dataOffset"] % 64 == 0
+            f.seek(entry["offset"])
+            assert np.array_equal(np.lib.format.read_array(f), arrays[name])
+    single = str(tmp_path / "points.bin")
+    structure.dumpArrays({"points": arrays["points"]}, single)
+    assert np.array_equal(np.load(single), arrays["points"])
+    assert np.array_equal(np.load(single, mmap_mode="r"), arrays["points"])
+
+
+def test_arrays_without_numpy(tmp_path, monkeypatch):
+    file = str(tmp_path / "values.bin")
+    values = [0.5, 1.5, -2.0]
+    structure.dumpArrays(structure.OrderedDict([("values", values),
+                                                ("ids", structure.array("i", [3, 1, 2]))]), file)
+    monkeypatch.setattr(structure, "np", None)
+    loaded = structure.loadArrays(file)
+    assert loaded["values"] == structure.array("d", values)
+    assert loaded["ids"] == structure.array("i", [3, 1, 2])
+    assert loaded["ids"].typecode == "i"
+
+
+def test_arrays_size_mismatch(tmp_path):
+    file = str(tmp_path / "values.bin")
+    structure.dumpArrays({"values": [1.0, 2.0]}, file)
+    with open(file, "ab") as f:
+        f.write(b"\0")
+    with pytest.raises(IOError):
+        structure.loadArrays(file)
+    os.remove(structure.arraySidecar(file))
+    with pytest.raises(IOError):
+        structure.loadArrays(file)
+
+
+def test_name_check():
+    assert structure.nameCheck("hero_v001.ma")
+    assert not structure.nameCheck("hero v001.ma")
+    assert structure.nameCheck("hero v001.ma", allowSpaces=True)
+    assert not structure.nameCheck("C:\\assets\\hero")
+    assert structure.nameCheck("C:\\assets\\hero", directory=True)
+    assert structure.nameValidator(True) is structure.nameValidator(allowSpaces=True)
+
+    validator = structure.nameValidator()
+    assert validator.sanitize(u"caf\u00e9 model (1).ma") == "cafe_model_1_.ma"
+    assert validator.sanitize("??") == "_"
+    assert validator.check(["ok.ma", "not ok.ma", "ok2.ma", "b@d.ma"]) == [("not ok.ma", "not_ok.ma"),
+                                                                           ("b@d.ma", "b_d.ma")]
+
+
+@pytest.mark.parametrize("workers", [1, 4])
+def test_validate_tree(tmp_path, workers):
+    root = _makeTree(tmp_path / "library", {
+        "ok.ma": "",
+        "bad name.ma": "",
+        "bad_name.ma": "",
+        "bad?name.ma": "",
+        os.path.join("my folder", "inner#1.ma"): "",
+        os.path.join("skip me", "x y.ma"): "",
+        os.path.join("sub", "deep", "fine.ma"): "",
+    })
+    report = structure.validateTree(root, workers=workers)
+    assert report["errors"] == []
+    assert report["folders"] == 5
+    assert report["checked"] == 11
+    invalid = [(os.path.relpath(entry["path"], root), entry["suggestion"], entry["folder"])
+               for entry in report["invalid"]]
+    # suggestions do not clash with the existing names or with each other
+    assert invalid == [("bad name.ma", "bad_name_1.ma", False),
+                       ("bad?name.ma", "bad_name_2.ma", False),
+                       ("my folder", "my_folder", True),
+                       (os.path.join("my folder", "inner#1.ma"), "inner_1.ma", False),
+                       ("skip me", "skip_me", True),
+                       (os.path.join("skip me", "x y.ma"), "x_y.ma", False)]
+
+    report = structure.validateTree(root, allowSpaces=True, folders=False, workers=workers,
+                                    ignore=lambda folder, names: [name for name in names if name == "skip me"])
+    assert report["folders"] == 4
+    assert [os.path.relpath(entry["path"], root) for entry in report["invalid"]] == \
+        ["bad?name.ma", os.path.join("my folder", "inner#1.ma")]
@@ -0,0 +1,27 @@
+"""Checks of the vector math against plain numpy results"""
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+import vectors
+
+
+def test_distance_matrix_chunks():
+    random = np.random.RandomState(0)
+    pointsA, pointsB = random.rand(37, 3), random.rand(11, 3)
+    expected = np.linalg.norm(pointsA[:, None] - pointsB[None], axis=-1)
+    assert np.allclose(vectors.distanceMatrix(pointsA, pointsB, chunkSize=5), expected)
+    assert vectors.distanceMatrix(pointsA, [], chunkSize=5).shape == (37, 0)
+
+
+def test_between_vectors():
+    points = [(0, 0, 0), (1, 1, 1), (5, 0, 0)]
+    targetLists = [[(-1, 0, 0), (0, -3, 0)], [], [(5, 0, 2)]]
+    result = vectors.betweenVectors(points, targetLists)
+    assert np.allclose(result[0], np.array([1, 1, 0]) / np.sqrt(2))
+    # no targets gives a zero vector like MVector.normal()
+    assert np.allclose(result[1], 0)
+    assert np.allclose(result[2], (0, 0, -1))
+    with pytest.raises(ValueError):
+        vectors.betweenVectors(points, targetLists[:2])
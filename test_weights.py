@@ -0,0 +1,86 @@
+"""Checks of the weights array core against MemoryPlug. Maya is not required"""
+
+from array import array
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+import weights
+
+
+def test_get_runs():
+    assert weights.getRuns([]) == []
+    assert weights.getRuns([3]) == [(3, 3)]
+    assert weights.getRuns([0, 1, 2, 5, 6, 9]) == [(0, 2), (5, 6), (9, 9)]
+    # long index lists are split with numpy
+    indices = list(range(100)) + list(range(200, 300)) + [400]
+    assert weights.getRuns(indices) == [(0, 99), (200, 299), (400, 400)]
+
+
+def test_read_plug_sparse():
+    plug = weights.MemoryPlug({0: 0.5, 1: 0.25, 4: 1.0, 5: 0.0, 6: 0.75})
+    values = weights.readPlug(plug, size=8, default=1.0)
+    assert isinstance(values, array)
+    assert values.tolist() == [0.5, 0.25, 1.0, 1.0, 1.0, 0.0, 0.75, 1.0]
+    # one read per contiguous run
+    assert plug.calls == 2
+
+    values = weights.readPlug(plug, output="numpy")
+    assert values.dtype == np.float32
+    assert values.tolist() == [0.5, 0.25, 0.0, 0.0, 1.0, 0.0, 0.75]
+    # elements past the size are not read
+    assert weights.readPlug(plug, size=3).tolist() == [0.5, 0.25, 0.0]
+    assert len(weights.readPlug(weights.MemoryPlug())) == 0
+
+
+def test_write_plug_round_trip():
+    plug = weights.MemoryPlug()
+    weights.writePlug(plug, [0.5, 0.25, 0.125, 1.0], indices=[7, 2, 3, 8])
+    assert plug.elements == {2: 0.25, 3: 0.125, 7: 0.5, 8: 1.0}
+    assert plug.calls == 2
+    assert weights.readPlug(plug, size=10, default=1.0).tolist() == [1.0, 1.0, 0.25, 0.125, 1.0, 1.0, 1.0, 0.5,
+                                                                     1.0, 1.0]
+
+    dense = np.linspace(0.0, 1.0, 50, dtype=np.float32)
+    plug = weights.MemoryPlug()
+    weights.writePlug(plug, dense)
+    assert plug.calls == 1
+    assert np.array_equal(weights.readPlug(plug, output="numpy"), dense)
+
+    with pytest.raises(ValueError):
+        weights.writePlug(plug, [0.1, 0.2], indices=[1])
+
+
+def test_transfer_nearest():
+    source = np.array([(0, 0, 0), (1, 0, 0), (0, 1, 0)], dtype=np.float64)
+    target = np.array([(0.1, 0, 0), (0.9, 0.1, 0), (0, 2, 0), (0.2, 0.8, 0)])
+    sourceWeights = weights.MemoryPlug({0: 0.0, 1: 0.5, 2: 1.0})
+    result = weights.transferWeights(source, weights.readPlug(sourceWeights), target, chunkSize=3)
+    assert result.dtype == np.float32
+    assert result.tolist() == [0.0, 0.5, 1.0, 1.0]
+
+    influences = np.array([(1, 0), (0, 1), (0.5, 0.5)], dtype=np.float32)
+    assert weights.transferWeights(source, influences, target).tolist() == [[1, 0], [0, 1], [0.5, 0.5],
+                                                                            [0.5, 0.5]]
+
+
+def test_transfer_inverse_distance():
+    random = np.random.RandomState(0)
+    source = random.rand(200, 3)
+    sourceWeights = random.rand(200).astype(np.float32)
+    target = np.vstack((random.rand(50, 3), source[:5]))
+    result = weights.transferWeights(source, sourceWeights, target, method="inverseDistance", k=4, power=2.0)
+
+    d2 = ((target[:50, None] - source[None]) ** 2).sum(axis=-1)
+    nearest = np.argsort(d2, axis=1)[:, :4]
+    blend = 1.0 / np.take_along_axis(d2, nearest, axis=1)
+    expected = (blend * sourceWeights[nearest]).sum(axis=1) / blend.sum(axis=1)
+    assert np.allclose(result[:50], expected, atol=1e-5)
+    # targets on a source point take its weight
+    assert np.allclose(result[50:], sourceWeights[:5])
+
+    with pytest.raises(ValueError):
+        weights.transferWeights(source, sourceWeights[:10], target)
+    with pytest.raises(ValueError):
+        weights.transferWeights(source, sourceWeights, target, method="linear")
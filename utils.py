@@ -1,8 +1,13 @@
 """Collection of utility functions commonly used"""
 
-import maya.cmds as cmds
-import maya.OpenMaya as om
-# import maya.api.OpenMaya as om2
+import backend
+import vectors
+from attributes import AttributeSchema, applyChannelStates
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 __author__ = "Arda Kutlu"
 __copyright__ = "Copyright 2019, Library Utility Functions"
@@ -12,12 +17,47 @@ __maintainer__ = "Arda Kutlu"
 __email__ = "ardakutlu@gmail.com"
 __status__ = "Development"
 
+# maya.cmds and maya.OpenMaya of the active backend. Maya is imported on first use
+cmds = backend.cmds
+om = backend.om
+# import maya.api.OpenMaya as om2
+
+def clearLookupCache(*args):
+    """Clears the cached node lookups. Accepts any arguments so it can be used as a Maya callback"""
+    backend.current().clearLookupCache()
+
+def lookupCache():
+    """
+    Caches the name to MDagPath / MObject resolutions of getMDagPath, getMObject and the functions using them
+    within the scope. The cache is cleared when any node is renamed or deleted and when the outermost scope exits.
+
+    Example:
+    with lookupCache():
+        for ctrl in controls:
+            alignTo(ctrl, "root_jnt")
+    """
+    return backend.current().lookupCache()
+
+def batch():
+    """
+    Defers the scene edits of createUpGrp, alignTo, alignAndAimNodes, orientChains, lockAndHide and attrPass
+    within the scope and applies them together when the scope exits. Queries of nodes with pending edits apply
+    the queued edits first, so the functions can still be chained. The whole scope is one undo chunk.
+
+    Example:
+    with batch():
+        for ctrl in controls:
+            createUpGrp(ctrl, "OFF")
+            lockAndHide(ctrl, ["sx", "sy", "sz", "v"])
+    """
+    return backend.batch()
+
 def getMDagPath(node):
-    selList = om.MSelectionList()
-    selList.add(node)
-    dagPath = om.MDagPath()
-    selList.getDagPath(0, dagPath)
-    return dagPath
+    return backend.current().dagPaths([node])[0]
+
+def getMDagPaths(nodes):
+    """Returns MDagPath objects of the given nodes resolved with a single selection list"""
+    return backend.current().dagPaths(nodes)
 
 # def getMDagPath2(node):
 #     "API 2.0"
@@ -26,11 +66,7 @@ def getMDagPath(node):
 #     return selList.getDagPath(0)
 
 def getMObject(node):
-    selList = om.MSelectionList()
-    selList.add(node)
-    mObject = om.MObject()
-    selList.getDependNode(0, mObject)
-    return mObject
+    return backend.current().mObject(node)
 
 # def getMObject2(node):
 #     "API 2.0"
@@ -50,11 +86,61 @@ def getWorldTranslation(node):
 #     targetRotatePivot = om2.MVector(targetMTransform.rotatePivot(om2.MSpace.kWorld))
 #     return targetRotatePivot
 
+def getWorldTranslations(nodes):
+    """
+    Returns world translations of rotate pivots for all given nodes in one pass
+    :param nodes: (List) transform nodes
+    :return: (N, 3) numpy array. List of (x, y, z) tuples if numpy is not available
+    """
+    backend.edits().sync(nodes)
+    positions = backend.current().worldTranslations(nodes)
+    if np is None:
+        return positions
+    return np.array(positions, dtype=np.float64).reshape(-1, 3)
+
+def getWorldMatrices(nodes):
+    """
+    Returns world matrices for all given nodes in one pass
+    :param nodes: (List) dag nodes
+    :return: (N, 4, 4) numpy array. List of 16 float lists (row major) if numpy is not available
+    """
+    backend.edits().sync(nodes)
+    matrices = backend.current().worldMatrices(nodes)
+    if np is None:
+        return matrices
+    return np.array(matrices, dtype=np.float64).reshape(-1, 4, 4)
+
 def getDistance(node1, node2):
     """Returns the distance between two nodes"""
-    Ax, Ay, Az = getWorldTranslation(node1)
-    Bx, By, Bz = getWorldTranslation(node2)
-    return ((Ax-Bx)**2 + (Ay-By)**2 + (Az-Bz)**2)**0.5
+    (Ax, Ay, Az), (Bx, By, Bz) = getWorldTranslations([node1, node2])
+    return float(((Ax-Bx)**2 + (Ay-By)**2 + (Az-Bz)**2)**0.5)
+
+def _getUniqueTranslations(nodes):
+    """Fetches the world translations of the unique nodes with one batched query. Returns a name -> row dict"""
+    uniqueNodes = uniqueList(nodes)
+    positions = getWorldTranslations(uniqueNodes)
+    return dict(zip(uniqueNodes, positions))
+
+def getDistances(nodesA, nodesB):
+    """
+    Returns the distances between all nodes of the two lists
+    :param nodesA: (List) N nodes
+    :param nodesB: (List) M nodes
+    :return: (numpy.ndarray) (N, M) distance matrix
+    """
+    positions = _getUniqueTranslations(list(nodesA) + list(nodesB))
+    return vectors.distanceMatrix([positions[n] for n in nodesA], [positions[n] for n in nodesB])
+
+def getBetweenVectors(nodes, targetLists):
+    """
+    Vectorized getBetweenVector. Calculates the average normal vectors for many nodes in one pass
+    :param nodes: (List) N source nodes
+    :param targetLists: (List) N lists of target nodes
+    :return: (numpy.ndarray) (N, 3) normalized vectors
+    """
+    positions = _getUniqueTranslations(list(nodes) + [t for targets in targetLists for t in targets])
+    return vectors.betweenVectors([positions[n] for n in nodes],
+                                  [[positions[t] for t in targets] for targets in targetLists])
 
 # def getAllVerts(node):
 #     """
@@ -94,39 +180,90 @@ def getDistance(node1, node2):
 #     # return posList
 #     return vertPoints
 
-def getAllVerts(node, output="generator"):
+# number of points fetched at a time for the "generator" output
+_GENERATOR_CHUNK = 65536
+
+def _toPoints(flat, output, dtype):
+    """Converts the flat positions returned by the backend to the requested output"""
+    if output == "numpy":
+        if np is None:
+            cmds.error("numpy is required for numpy output")
+        # backend arrays are not shared, float64 ones are used as they are
+        return np.asarray(flat, dtype=dtype).reshape(-1, 3)
+    if hasattr(flat, "reshape"):
+        return [tuple(p) for p in flat.reshape(-1, 3).tolist()]
+    return list(zip(flat[0::3], flat[1::3], flat[2::3]))
+
+def _iterPointChunks(node, output, space, chunkSize, dtype):
+    count = cmds.polyEvaluate(node, vertex=True)
+    for start in range(0, count, chunkSize):
+        end = min(start + chunkSize, count) - 1
+        yield _toPoints(backend.current().meshPoints(node, space, start, end), output, dtype)
+
+def _cachedPoints(points, output, dtype, readOnly):
+    """Converts the positions returned by the mesh cache to the requested output"""
+    if np is None or not hasattr(points, "dtype"):
+        return _toPoints(points, output, dtype)
+    if output == "numpy":
+        if readOnly and points.dtype == np.dtype(dtype):
+            return points
+        return points.astype(dtype)
+    return [tuple(p) for p in points.tolist()]
+
+def getAllVerts(node, output="generator", space="world", chunkSize=None, dtype="float64", cache=False,
+                readOnly=False):
     """
     gets all point positions on given mesh
     :param node: (String) name of the mesh object
-    :param output: (String) return type. Values are: "generator", "list", "MPointArray"
+    :param output: (String) return type. Values are: "generator", "list", "MPointArray", "numpy"
                     Default value is "generator"
+    :param space: (String or om.MSpace) space of the positions. "world", "object" or an om.MSpace constant.
+                    Default is "world"
+    :param chunkSize: (Int) If defined, returns a generator yielding blocks of chunkSize points instead.
+                    Blocks are numpy arrays for "numpy" output and lists of points for the others.
+                    Only one block is held in memory at a time.
+    :param dtype: (String) numpy data type. "float64" or "float32". Used only with "numpy" output
+    :param cache: (Boolean) If True, positions are kept in backend.meshCache and re-used until the mesh changes.
+                    Not used with chunkSize or MPointArray output
+    :param readOnly: (Boolean) Only with cache and "numpy" float64 output. If True, the shared read-only array
+                    is returned instead of a copy
     :return:
-                    "generator" : returns a generator object
+                    "generator" : returns a generator object. Points are fetched in blocks while it is consumed
                     "list" : returns list array of each point
                     "MPointArray" : returns MPointArray object
+                    "numpy" : returns (N, 3) shaped numpy array
     """
-    # ___________Query vertex position ___________
-
-    # initialize a Point array holder
-    vertPoints = om.MPointArray()
-
-    # create a Mesh functionset from our dag object
-    mfnObject = om.MFnMesh(getMDagPath(node))
-
-    # call the function "getPoints" and feed the data into our pointArray
-    mfnObject.getPoints(vertPoints, om.MSpace.kWorld)
+    if output not in ("generator", "list", "MPointArray", "numpy"):
+        cmds.error("Unrecognized output type")
 
-    if output=="generator":
-        # Create a generator from the points
-        posSet = ((vertPoints[i][0], vertPoints[i][1], vertPoints[i][2]) for i in range(vertPoints.length()))
-        return posSet
-    elif output=="list":
-        posList = [(vertPoints[i][0], vertPoints[i][1], vertPoints[i][2]) for i in range(vertPoints.length())]
-        return posList
-    elif output=="MPointArray":
+    backend.edits().sync([node])
+    if chunkSize:
+        if output == "MPointArray":
+            cmds.error("chunkSize cannot be used with MPointArray output")
+        return _iterPointChunks(node, output, space, chunkSize, dtype)
+
+    if output == "MPointArray":
+        # initialize a Point array holder
+        vertPoints = om.MPointArray()
+        # create a Mesh functionset from our dag object
+        mfnObject = om.MFnMesh(getMDagPath(node))
+        # call the function "getPoints" and feed the data into our pointArray
+        space = {"world": om.MSpace.kWorld, "object": om.MSpace.kObject}.get(space, space)
+        mfnObject.getPoints(vertPoints, space)
         return vertPoints
+
+    # ___________Query vertex position ___________
+    if output == "generator" and not cache:
+        return (p for block in _iterPointChunks(node, "list", space, _GENERATOR_CHUNK, dtype) for p in block)
+    # all positions are fetched with one query and sliced into points
+    if cache:
+        points = _cachedPoints(backend.meshCache.get(node, space, lambda: backend.current().meshPoints(node, space)),
+                               output, dtype, readOnly)
     else:
-        cmds.error("Unrecognized output type")
+        points = _toPoints(backend.current().meshPoints(node, space), output, dtype)
+    if output == "generator":
+        return (p for p in points)
+    return points
 
 
 def alignTo(node, target, translation=True, rotation=True):
@@ -134,28 +271,76 @@ def alignTo(node, target, translation=True, rotation=True):
     This is the fastest align method. May not work in all cases
     http://www.rihamtoulan.com/blog/2017/12/21/matching-transformation-in-maya-and-mfntransform-pitfalls
     """
-    nodeMTransform = om.MFnTransform(getMDagPath(node))
-    targetMTransform = om.MFnTransform(getMDagPath(target))
-    if translation:
-        targetRotatePivot = om.MVector(targetMTransform.rotatePivot(om.MSpace.kWorld))
-        nodeMTransform.setTranslation(targetRotatePivot, om.MSpace.kWorld)
-    if rotation:
-        targetMTMatrix = om.MTransformationMatrix(om.MMatrix(cmds.xform(target, matrix=True, ws=1, q=True)))
-        # using the target matrix decomposition
-        # Worked on all cases tested
-        nodeMTransform.setRotation(targetMTMatrix.rotation(True), om.MSpace.kWorld)
-
-        # Using the MFnTransform quaternion rotation in world space
-        # Doesn't work when there is a -1 scale on the object itself
-        # Doesn't work when the object has frozen transformations and there is a -1 scale on a parent group.
-        # followerMTransform.setRotation(MFntMainNode.rotation(OpenMaya.MSpace.kWorld, asQuaternion=True),OpenMaya.MSpace.kWorld)
+    sceneBackend = backend.current()
+    edits = backend.edits()
+    edits.sync([target])
+    flatMatrix = sceneBackend.worldMatrices([target])[0]
+    matrix = [flatMatrix[i:i + 4] for i in range(0, 16, 4)]
+    # translation is the rotate pivot of the target
+    matrix[3][:3] = sceneBackend.worldTranslations([target])[0]
+    edits.setWorldTransform(node, matrix, translation=translation, rotation=rotation)
 
 def alignToAlter(node, target, position=True, rotation=False, o=(0,0,0)):
-    """Old School Method"""
-    if position:
-        cmds.delete(cmds.pointConstraint(target, node, mo=False))
-    if rotation:
-        cmds.delete(tempOri = cmds.orientConstraint(target, node, o=o, mo=False))
+    """
+    Old School Method. Matches the node to the target like temporary point and orient constraints,
+    without creating them
+    :param node: (String) node to be aligned
+    :param target: (String) target node
+    :param position: (Boolean) If True, matches the rotate pivot position
+    :param rotation: (Boolean) If True, matches the world rotation
+    :param o: (Tuple) rotation offset in degrees applied in object space
+    :return: None
+    """
+    alignTo(node, target, translation=position, rotation=rotation)
+    if rotation and any(o):
+        backend.edits().call(node, "rotate", o[0], o[1], o[2], node, r=True, os=True)
+
+def alignAndAimNodes(nodes, targetLists, aimTargetLists,
+                     upObjects=None,
+                     upVector=None,
+                     localUp=(0.0,1.0,0.0),
+                     aimVector=(1.0,0.0,0.0),
+                     rotateOff=None,
+                     translateOff=None,
+                     freezeTransform=False
+                     ):
+    """
+    Constraint free alignAndAim for many nodes at once. Positions of all involved nodes are fetched in one pass,
+    final world matrices are solved analytically with vectors.aimMatrices and written directly.
+    Args:
+        nodes: (List) Nodes to be aligned
+        targetLists: (List) Target node lists for positioning, one list per node. Positions are averaged
+        aimTargetLists: (List) Target node lists for aiming, one list per node. Positions are averaged
+        upObjects: (List) Optional. Up object per node. None items fall back to upVector
+        upVector: (tuple) World up vector. Default is (0, 1, 0)
+        localUp: (tuple) Local up axis
+        aimVector: (tuple) Local aim axis
+        rotateOff: (tuple) rotation offset with given value
+        translateOff: (tuple) translate offset with given value
+        freezeTransform: (bool) if set True, freezes transforms of the nodes at the end
+    Returns:
+        (numpy.ndarray) (N, 4, 4) solved world matrices
+
+    """
+    upObjects = [None] * len(nodes) if upObjects is None else upObjects
+    upVector = (0.0, 1.0, 0.0) if upVector is None else upVector
+    names = [t for targets in targetLists for t in targets] + \
+            [t for targets in aimTargetLists for t in targets] + \
+            [u for u in upObjects if u]
+    positions = _getUniqueTranslations(names)
+
+    pointPositions = [np.mean([positions[t] for t in targets], axis=0) for targets in targetLists]
+    aimPositions = [np.mean([positions[t] for t in targets], axis=0) for targets in aimTargetLists]
+    upVectors = [positions[u] - p if u else upVector for u, p in zip(upObjects, pointPositions)]
+
+    matrices = vectors.aimMatrices(pointPositions, aimPositions, upVectors, aimVector=aimVector, localUp=localUp,
+                                   rotateOff=rotateOff, translateOff=translateOff)
+    edits = backend.edits()
+    for node, matrix in zip(nodes, matrices):
+        edits.setWorldTransform(node, matrix)
+    if freezeTransform:
+        edits.makeIdentity(nodes, t=True)
+    return matrices
 
 def alignAndAim(node, targetList, aimTargetList,
                 upObject=None,
@@ -164,7 +349,8 @@ def alignAndAim(node, targetList, aimTargetList,
                 rotateOff=None,
                 translateOff=None,
                 freezeTransform=False,
-                keepConnections=False
+                keepConnections=False,
+                aimVector=(1.0,0.0,0.0)
                 ):
     """
     Aligns the position of the node to the target and rotation to the aimTarget object.
@@ -178,37 +364,35 @@ def alignAndAim(node, targetList, aimTargetList,
         freezeTransform: (bool) if set True, freezes transforms of the node at the end
         keepConnections: (bool) Keeps the point ant aim contstraints on the node. If this is turned on, rotateOff,
                         translateOff and freezeTransform options will be bypassed
+        aimVector: (tuple) Local aim axis. Default is X
     Returns:
         None
 
     """
-    if upObject and upVector:
+    if upObject and upVector is not None:
         cmds.warning("Both upObject and upVector parameters cannot be defined. Skipping upObject...")
         upObject = None
 
-    pointFlags = ""
-    for i in range (len(targetList)):
-        if not i == 0:
-            pointFlags = "%s, " % pointFlags
-        pointFlags = "{0}targetList[{1}]".format(pointFlags, str(i))
-    pointFlags = "%s, node" % pointFlags
-    pointCommand = "cmds.pointConstraint({0})".format(pointFlags)
-    tempPo = eval(pointCommand)
-
-    aimFlags = ""
-    for i in range (len(aimTargetList)):
-        if not i == 0:
-            aimFlags = "%s, " % aimFlags
-        aimFlags = "{0}aimTargetList[{1}]".format(aimFlags, str(i))
-    aimFlags = "%s, node" % aimFlags
-    aimFlags = "%s, u=%s" % (aimFlags, localUp)
-    if upObject:
-        aimFlags = "%s, wuo=upObject, wut='object'" % aimFlags
-    if upVector:
-        aimFlags = "%s, wu=upVector, wut='vector'" % aimFlags
+    if not keepConnections and np is not None:
+        # solve without creating temporary constraints
+        alignAndAimNodes([node], [targetList], [aimTargetList],
+                         upObjects=[upObject],
+                         upVector=upVector,
+                         localUp=localUp,
+                         aimVector=aimVector,
+                         rotateOff=rotateOff,
+                         translateOff=translateOff,
+                         freezeTransform=freezeTransform)
+        return
+
+    tempPo = cmds.pointConstraint(*(list(targetList) + [node]))
 
-    aimCommand = "cmds.aimConstraint({0})".format(aimFlags)
-    tempAim = eval(aimCommand)
+    aimFlags = {"u": localUp, "aim": aimVector}
+    if upObject:
+        aimFlags.update(wuo=upObject, wut="object")
+    if upVector is not None:
+        aimFlags.update(wu=upVector, wut="vector")
+    tempAim = cmds.aimConstraint(*(list(aimTargetList) + [node]), **aimFlags)
 
     if keepConnections:
         if translateOff:
@@ -228,6 +412,15 @@ def alignAndAim(node, targetList, aimTargetList,
     if freezeTransform:
         cmds.makeIdentity(node, a=True, t=True)
 
+def _isChildOf(parent, node):
+    """Checks if the parent name returned by parentOf is the node"""
+    if parent is None:
+        return False
+    if parent == node:
+        return True
+    longNames = cmds.ls(node, long=True) or []
+    return bool(longNames) and longNames == (cmds.ls(parent, long=True) or [])
+
 def orientJoints(jointList, localMoveAxis=(1.0,0.0,0.0), upAxis=(0.0,1.0,0.0)):
     """
     Sets the the orientations of joints on a chain.
@@ -236,6 +429,16 @@ def orientJoints(jointList, localMoveAxis=(1.0,0.0,0.0), upAxis=(0.0,1.0,0.0)):
     :param upAxis: Defines the up axis for the chain
     :return: None
     """
+    if np is not None:
+        # the chain is parented first as the constraint based method does. Analytic solution, no temporary nodes
+        edits = backend.edits()
+        for previous, joint in zip(jointList, jointList[1:]):
+            if not _isChildOf(edits.parentOf(joint), previous):
+                edits.parent(joint, previous)
+        orientChains([jointList], aimAxis=localMoveAxis, upAxis=upAxis)
+        return
+    # the constraint based method reads the scene after each edit
+    backend.edits().flush()
 
     for j in range(1, len(jointList)):
         cmds.parent(jointList[j], w=True)
@@ -265,6 +468,38 @@ def orientJoints(jointList, localMoveAxis=(1.0,0.0,0.0), upAxis=(0.0,1.0,0.0)):
     cmds.setAttr("%s.jointOrient" %jointList[-1], 0, 0, 0)
 
 
+def orientChains(chains, aimAxis=(1.0,0.0,0.0), upAxis=(0.0,1.0,0.0), localUp=(0.0,1.0,0.0)):
+    """
+    Sets the orientations of many joint chains at once. All joint positions are fetched in one pass and the joint
+    orients are calculated with vectors.chainOrients. No nodes are created and the hierarchy is not touched.
+    :param chains: (List) joint chains. Each chain is a list from root to tip where every joint is the child of
+                    the previous one
+    :param aimAxis: (Tuple) local axis aiming to the child joint. Default is X
+    :param upAxis: (Tuple) world up vector of the chains. Default is Y
+    :param localUp: (Tuple) local axis kept as close as possible to upAxis. Default is Y
+    :return: None
+    """
+    edits = backend.edits()
+    positions = getWorldTranslations([j for chain in chains for j in chain])
+    rootParents = [edits.parentOf(chain[0]) for chain in chains]
+    parentMatrices = dict(zip([p for p in rootParents if p], getWorldMatrices([p for p in rootParents if p])))
+
+    offset = 0
+    for chain, rootParent in zip(chains, rootParents):
+        orients, translations = vectors.chainOrients(positions[offset:offset + len(chain)],
+                                                     aimAxis=aimAxis,
+                                                     upAxis=upAxis,
+                                                     localUp=localUp,
+                                                     parentMatrix=parentMatrices.get(rootParent))
+        offset += len(chain)
+        for j, joint in enumerate(chain):
+            edits.setAttr("%s.rotateAxis" % joint, 0, 0, 0)
+            edits.setAttr("%s.rotate" % joint, 0, 0, 0)
+            edits.setAttr("%s.jointOrient" % joint, *orients[j].tolist())
+            if j:
+                edits.setAttr("%s.translate" % joint, *translations[j - 1].tolist())
+
+
 def getBetweenVector(node, targetPointNodeList):
     """
     Calculates average normal vector between the given node and list of other nodes. Useful for finding normal direction of Pole vectors
@@ -286,19 +521,68 @@ def getBetweenVector(node, targetPointNodeList):
 
 def uniqueName(name):
     """Makes sure there is no other object with the same name. Returns the new unique name"""
-    baseName = name
-    idcounter = 0
-    while cmds.objExists(name):
-        name = "%s%s" % (baseName, str(idcounter + 1))
-        idcounter = idcounter + 1
-    return name
+    return uniqueNames([name])[0]
+
+def uniqueNames(names):
+    """
+    Bulk version of uniqueName. Requested names are checked with one query, clashing names are resolved from a
+    single listing of their base name. Repeated names get different results.
+    Inside a nameRegistry scope, the listings are shared between the calls.
+    :param names: (List) requested names
+    :return: (List) unique names in the same order
+    """
+    return backend.names().allocate(names)
+
+def nameRegistry():
+    """
+    Shares one name registry between the uniqueName / uniqueNames calls of the scope. Registry follows the
+    created, renamed and deleted nodes.
+
+    Example:
+    with nameRegistry():
+        for side in "LR":
+            for i in range(500):
+                cmds.createNode("transform", name=uniqueName("%s_ctrl" % side))
+    """
+    return backend.nameRegistry()
+
+def _hashKey(item):
+    """Hashable stand-in for lists, dictionaries, sets and numpy arrays compared by value"""
+    if np is not None and isinstance(item, np.ndarray):
+        return (np.ndarray, item.shape, _hashKey(item.tolist()))
+    if isinstance(item, (list, tuple)):
+        return (type(item), tuple(_hashKey(i) for i in item))
+    if isinstance(item, dict):
+        return (dict, frozenset((k, _hashKey(v)) for k, v in item.items()))
+    if isinstance(item, set):
+        return (set, frozenset(item))
+    return item
 
 def uniqueList(fList):
-    """Makes the list unique. Protects ordering."""
-    keys = {}
+    """
+    Makes the list unique. Protects ordering. Unhashable items like lists, dictionaries and numpy arrays are
+    compared by value. Rows of a 2D numpy array are unique rows
+    """
+    seen = set()
+    # items which cannot be hashed even by value. Compared one by one
+    others = []
+    result = []
     for e in fList:
-        keys[e] = 1
-    return keys.keys()
+        try:
+            hash(e)
+            key = e
+        except TypeError:
+            key = _hashKey(e)
+        try:
+            if key in seen:
+                continue
+            seen.add(key)
+        except TypeError:
+            if e in others:
+                continue
+            others.append(e)
+        result.append(e)
+    return result
 
 def createUpGrp(node, suffix, freezeTransform=True):
     """
@@ -311,21 +595,22 @@ def createUpGrp(node, suffix, freezeTransform=True):
     Returns: The created group node
 
     """
+    edits = backend.edits()
     grpName = "%s_%s" % (node, suffix)
-    newGrp = cmds.group(em=True, name=grpName)
+    newGrp = edits.createNode("transform", grpName)
 
     #align the new created empty group to the selected object
 
     alignTo(newGrp, node, translation=True, rotation=True)
 
     #check if the target object has a parent
-    originalParent = cmds.listRelatives(node, p=True)
+    originalParent = edits.parentOf(node)
     if originalParent:
-        cmds.parent(newGrp, originalParent[0], r=False)
+        edits.parent(newGrp, originalParent)
         if freezeTransform:
-            cmds.makeIdentity(newGrp, a=True)
+            edits.makeIdentity(newGrp)
 
-    cmds.parent(node,newGrp)
+    edits.parent(node, newGrp)
     return newGrp
 
 
@@ -333,19 +618,17 @@ def lockAndHide (node, channelList):
     """
     Locks and hides the channels specified in the channelList.
     Args:
-        node: Node
+        node: Node or list of nodes
         channelArray: Must be list value containing the channels as string values. eg: ["sx", "sy", "sz"] or ["translateX", "rotateX", "sz"]
-    Returns: None
+    Returns: (Dictionary) written and skipped channel counts. See attributes.applyChannelStates
 
     """
-    map(lambda ch: cmds.setAttr("{0}.{1}".format(node, ch), lock=True, keyable=False, channelBox=False), channelList)
-    # for i in channelList:
-    #     attribute=("{0}.{1}".format(node, i))
-    #     cmds.setAttr(attribute, lock=True, keyable=False, channelBox=False)
+    return applyChannelStates([(node, channelList, {"lock": True, "keyable": False, "channelBox": False})])
 
 
 def unlockAndUnhide (node, channelList):
-    map(lambda ch: cmds.setAttr("{0}.{1}".format(node, ch), lock=False, keyable=True, channelBox=True), channelList)
+    """Unlocks and shows the channels specified in the channelList. Counterpart of lockAndHide"""
+    return applyChannelStates([(node, channelList, {"lock": False, "keyable": True, "channelBox": True})])
 
 def attrPass (sourceNode, targetNode, attributes=[], inConnections=True, outConnections=True, keepSourceAttributes=False, values=True, daisyChain=False, overrideEx=False):
     """
@@ -366,89 +649,16 @@ def attrPass (sourceNode, targetNode, attributes=[], inConnections=True, outConn
     # TODO : TEST and OPTIMIZE entire method
 
     # get the user defined attributes:
+    edits = backend.edits()
+    edits.sync([sourceNode, targetNode])
     if len(attributes)==0:
         userAttr = cmds.listAttr(sourceNode, ud=True)
     else:
         userAttr = attributes
 
-    for attr in userAttr:
-        flagBuildList=[]
-        atType = cmds.getAttr("%s.%s" % (sourceNode,attr), type=True)
-        atTypeFlag = "at='%s'" % (str(atType))
-        flagBuildList.append(atTypeFlag)
-
-        if cmds.attributeQuery(attr, node=sourceNode, enum=True)==True:
-            enumList = cmds.attributeQuery(attr, node=sourceNode, listEnum=True)
-            enumListFlag = "en='%s'" % str(enumList[0])
-            flagBuildList.append(enumListFlag)
-
-        hiddenState = cmds.attributeQuery(attr, node=sourceNode, hidden=True)
-        hiddenStateFlag = "h=%s" % (str(hiddenState))
-        flagBuildList.append(hiddenStateFlag)
-
-        keyableState = cmds.attributeQuery(attr, node=sourceNode, keyable=True)
-        keyableStateFlag = "k=%s" % (str(keyableState))
-        flagBuildList.append(keyableStateFlag)
-
-        longName = cmds.attributeQuery(attr, node=sourceNode, longName=True)
-        longNameFlag = "ln='%s'" % str(longName)
-        flagBuildList.append(longNameFlag)
-
-        if cmds.attributeQuery(attr, node=sourceNode, maxExists=True) == True:
-            hardMax = cmds.attributeQuery(attr, node=sourceNode, maximum =True)
-            hardMaxFlag = "max=%s" % (str(hardMax[0]))
-            flagBuildList.append(hardMaxFlag)
-
-        if cmds.attributeQuery(attr, node=sourceNode, minExists=True) == True:
-            hardMin = cmds.attributeQuery(attr, node=sourceNode, minimum=True)
-            hardMinFlag = "min=%s" % (str(hardMin[0]))
-            flagBuildList.append(hardMinFlag)
-
-        readState = cmds.attributeQuery(attr, node=sourceNode, readable=True)
-        readStateFlag = "r=%s" % (readState)
-        flagBuildList.append(readStateFlag)
-
-        shortName = cmds.attributeQuery(attr, node=sourceNode, shortName=True)
-        shortNameFlag = "sn='%s'" % str(shortName)
-        flagBuildList.append(shortNameFlag)
-
-        if pm.attributeQuery(attr, node=sourceNode, softMaxExists=True) == True:
-            softMax = cmds.attributeQuery(attr, node=sourceNode, softMax =True)
-            softMaxFlag = "smx=%s" % (str(softMax[0]))
-            flagBuildList.append(softMaxFlag)
-
-        if cmds.attributeQuery(attr, node=sourceNode, softMinExists=True) == True:
-            softMin = cmds.attributeQuery(attr, node=sourceNode, softMin =True)
-            softMinFlag = "smn=%s" % (str(softMin[0]))
-            flagBuildList.append(softMinFlag)
-
-        writeState = cmds.attributeQuery(attr, node=sourceNode, writable=True)
-        writeStateFlag = "w=%s" % (writeState)
-        flagBuildList.append(writeStateFlag)
-
-
-        # parse the flagBuildList into single string
-        addAttribute="pm.addAttr(pm.PyNode('%s'), " % (targetNode)
-        for i in range (0,len(flagBuildList)):
-
-            # addAttribute+=flagBuildList[i]
-            addAttribute = "%s%s" % (addAttribute, flagBuildList[i])
-            if i < len(flagBuildList)-1:
-                addAttribute = "%s, " % addAttribute
-            else:
-                addAttribute = "%s)" % addAttribute
-
-
-        # if an attribute with the same name exists
-        if cmds.attributeQuery(attr, node=targetNode, exists=True):
-            if overrideEx:
-                cmds.deleteAttr("%s.%s" % (targetNode, attr))
-                exec (addAttribute)
-            else:
-                continue
-        else:
-
-            exec(addAttribute)
+    # query the source schema once and create the attributes with direct addAttr calls
+    schema = AttributeSchema.capture(sourceNode, userAttr, values=False)
+    schema.apply([targetNode], values=False, overrideEx=overrideEx)
 
     if daisyChain==True:
         # create connections between old and new attributes
@@ -457,11 +667,11 @@ def attrPass (sourceNode, targetNode, attributes=[], inConnections=True, outConn
                 # get value
                 value = cmds.getAttr("%s.%s" % (sourceNode, userAttr[i]))
                 # set Value
-                cmds.setAttr("%s.%s" % (targetNode, userAttr[i]), value)
-            cmds.connectAttr("%s.%s" %(targetNode, userAttr[i]), "%s.%s" %(sourceNode, userAttr[i]))
+                edits.setAttr("%s.%s" % (targetNode, userAttr[i]), value)
+            edits.call(sourceNode, "connectAttr", "%s.%s" %(targetNode, userAttr[i]), "%s.%s" %(sourceNode, userAttr[i]))
             # ("%s.%s" % (targetNode, userAttr[i])) >> pm.PyNode("%s.%s" % (sourceNode, userAttr[i]))
     else:
-        cmds.copyAttr(sourceNode, targetNode, inConnections=inConnections, outConnections=outConnections, values=values, attribute=userAttr)
+        edits.call(targetNode, "copyAttr", sourceNode, targetNode, inConnections=inConnections, outConnections=outConnections, values=values, attribute=userAttr)
         if keepSourceAttributes==False:
             for i in userAttr:
-                cmds.deleteAttr("%s.%s" % (sourceNode,i))
\ No newline at end of file
+                edits.call(sourceNode, "deleteAttr", "%s.%s" % (sourceNode,i))
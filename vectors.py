@@ -0,0 +1,186 @@
+"""Vector and matrix math on plain arrays. Does not require Maya"""
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+__author__ = "Arda Kutlu"
+__copyright__ = "Copyright 2019, Library Vector Functions"
+__credits__ = []
+__license__ = "GPL"
+__maintainer__ = "Arda Kutlu"
+__email__ = "ardakutlu@gmail.com"
+__status__ = "Development"
+
+
+def asPoints(points):
+    """Converts the given sequence of points into a (N, 3) float64 array"""
+    if np is None:
+        raise ImportError("numpy is required for vector math")
+    return np.asarray(points, dtype=np.float64).reshape(-1, 3)
+
+def normalize(vectors):
+    """
+    Normalizes the vectors along the last axis. Zero length vectors stay zero like MVector.normal()
+    :param vectors: (numpy.ndarray) (..., 3) array
+    :return: (numpy.ndarray) normalized copy
+    """
+    vectors = np.asarray(vectors, dtype=np.float64)
+    lengths = np.sqrt((vectors * vectors).sum(axis=-1, keepdims=True))
+    return np.divide(vectors, lengths, out=np.zeros_like(vectors), where=lengths > 0)
+
+def distanceMatrix(pointsA, pointsB, chunkSize=4096):
+    """
+    Calculates the distances between every point of pointsA and pointsB
+    :param pointsA: (Sequence) N points
+    :param pointsB: (Sequence) M points
+    :param chunkSize: (Int) rows calculated at once. Limits the temporary memory to chunkSize * M * 3 floats
+    :return: (numpy.ndarray) (N, M) distance matrix
+    """
+    pointsA = asPoints(pointsA)
+    pointsB = asPoints(pointsB)
+    distances = np.empty((len(pointsA), len(pointsB)), dtype=np.float64)
+    for start in range(0, len(pointsA), chunkSize):
+        diff = pointsA[start:start + chunkSize, None, :] - pointsB[None, :, :]
+        distances[start:start + chunkSize] = np.sqrt((diff * diff).sum(axis=-1))
+    return distances
+
+def betweenVectors(points, targetLists):
+    """
+    Calculates the average direction from each targets list towards its point. Vectorized form of
+    utils.getBetweenVector
+    :param points: (Sequence) N points
+    :param targetLists: (List) N lists of target points. Lists may have different lengths
+    :return: (numpy.ndarray) (N, 3) normalized vectors
+    """
+    points = asPoints(points)
+    if len(targetLists) != len(points):
+        raise ValueError("Each point needs a target list")
+    counts = [len(targets) for targets in targetLists]
+    sums = np.zeros_like(points)
+    if sum(counts):
+        targets = asPoints([target for targets in targetLists for target in targets])
+        owners = np.repeat(np.arange(len(points)), counts)
+        directions = normalize(points[owners] - targets)
+        for axis in range(3):
+            sums[:, axis] = np.bincount(owners, weights=directions[:, axis], minlength=len(points))
+    return normalize(sums)
+
+def eulerMatrices(rotations):
+    """
+    Converts XYZ euler rotations in degrees to rotation matrices in Maya row vector convention
+    :param rotations: (Sequence) N (rx, ry, rz) rotations
+    :return: (numpy.ndarray) (N, 3, 3) rotation matrices
+    """
+    radians = np.radians(asPoints(rotations))
+    cos, sin = np.cos(radians), np.sin(radians)
+    matrices = np.zeros((len(radians), 3, 3, 3))
+    matrices[:] = np.eye(3)
+    for axis, (first, second) in enumerate(((1, 2), (2, 0), (0, 1))):
+        matrices[:, axis, first, first] = cos[:, axis]
+        matrices[:, axis, second, second] = cos[:, axis]
+        matrices[:, axis, first, second] = sin[:, axis]
+        matrices[:, axis, second, first] = -sin[:, axis]
+    return np.matmul(np.matmul(matrices[:, 0], matrices[:, 1]), matrices[:, 2])
+
+def _perpendicular(vectors):
+    """Returns an arbitrary unit vector perpendicular to each vector"""
+    helper = np.zeros_like(vectors)
+    helper[:, 0] = 1.0
+    parallel = np.abs(vectors[:, 0]) > 0.9
+    helper[parallel] = (0.0, 1.0, 0.0)
+    return normalize(np.cross(vectors, helper))
+
+def frames(aimDirections, upDirections):
+    """
+    Builds orthonormal frames from aim and up directions. Up is orthogonalized against aim.
+    :param aimDirections: (Sequence) N aim directions
+    :param upDirections: (Sequence) N up directions or a single one for all
+    :return: (numpy.ndarray) (N, 3, 3) matrices with rows aim, up, aim x up
+    """
+    aim = normalize(asPoints(aimDirections))
+    up = np.broadcast_to(asPoints(upDirections), aim.shape)
+    side = np.cross(aim, up)
+    degenerate = (side * side).sum(axis=-1) < 1e-12
+    side = normalize(side)
+    if degenerate.any():
+        side[degenerate] = _perpendicular(aim[degenerate])
+    return np.stack((aim, np.cross(side, aim), side), axis=1)
+
+def aimMatrices(positions, aimPoints, upVectors=(0.0, 1.0, 0.0), aimVector=(1.0, 0.0, 0.0),
+                localUp=(0.0, 1.0, 0.0), rotateOff=None, translateOff=None):
+    """
+    Analytic equivalent of a point and aim constraint. Calculates world matrices which are placed on the positions,
+    pointing aimVector to the aimPoints and keeping localUp as close as possible to the upVectors.
+    :param positions: (Sequence) N world positions
+    :param aimPoints: (Sequence) N world positions to aim at
+    :param upVectors: (Sequence) N world up vectors or a single one for all. For an up object
+                        use upObjectPosition - position
+    :param aimVector: (Tuple) local aim axis
+    :param localUp: (Tuple) local up axis
+    :param rotateOff: (Sequence) N or a single XYZ euler offsets in degrees applied in object space
+    :param translateOff: (Sequence) N or a single world space translate offsets
+    :return: (numpy.ndarray) (N, 4, 4) world matrices with unit scale
+    """
+    positions = asPoints(positions)
+    aimDirections = asPoints(aimPoints) - positions
+    local = frames([aimVector], [localUp])[0]
+    world = frames(aimDirections, upVectors)
+    # local rows mapped onto world rows: local * R = world  =>  R = local.T * world
+    rotations = np.matmul(local.T, world)
+    # nothing to aim at. Constraints leave the rotation untouched, identity is the closest we can do here
+    rotations[(aimDirections * aimDirections).sum(axis=-1) == 0] = np.eye(3)
+    if rotateOff is not None:
+        offsets = eulerMatrices(rotateOff)
+        rotations = np.matmul(offsets, rotations)
+    matrices = np.zeros((len(positions), 4, 4))
+    matrices[:, :3, :3] = rotations
+    matrices[:, 3, :3] = positions
+    if translateOff is not None:
+        matrices[:, 3, :3] += asPoints(translateOff)
+    matrices[:, 3, 3] = 1.0
+    return matrices
+
+def matrixToEuler(rotations):
+    """
+    Converts rotation matrices in Maya row vector convention to XYZ euler rotations in degrees
+    :param rotations: (Sequence) (N, 3, 3) rotation matrices
+    :return: (numpy.ndarray) (N, 3) euler rotations
+    """
+    r = np.asarray(rotations, dtype=np.float64).reshape(-1, 3, 3)
+    ry = np.arcsin(np.clip(-r[:, 0, 2], -1.0, 1.0))
+    rx = np.arctan2(r[:, 1, 2], r[:, 2, 2])
+    rz = np.arctan2(r[:, 0, 1], r[:, 0, 0])
+    # gimbal lock. rz is folded into rx
+    locked = np.abs(r[:, 0, 2]) > 1.0 - 1e-9
+    rx[locked] = np.arctan2(-r[locked, 2, 1], r[locked, 1, 1])
+    rz[locked] = 0.0
+    return np.degrees(np.stack((rx, ry, rz), axis=1))
+
+def chainOrients(positions, aimAxis=(1.0, 0.0, 0.0), upAxis=(0.0, 1.0, 0.0), localUp=(0.0, 1.0, 0.0),
+                 parentMatrix=None):
+    """
+    Calculates the joint orients of a joint chain where each joint aims to the next one. Last joint takes the
+    orientation of its parent.
+    :param positions: (Sequence) N world positions of the chain from root to tip
+    :param aimAxis: (Tuple) local axis pointing to the child joint
+    :param upAxis: (Tuple) world up vector for the chain
+    :param localUp: (Tuple) local axis kept as close as possible to upAxis
+    :param parentMatrix: (Sequence) (4, 4) world matrix of the root joints parent. Default is identity
+    :return: (Tuple) (N, 3) joint orients in degrees and (N - 1, 3) local translations of the joints after the root
+    """
+    positions = asPoints(positions)
+    parentRotation = np.eye(3) if parentMatrix is None else normalize(np.asarray(parentMatrix)[:3, :3])
+    world = np.empty((len(positions), 3, 3))
+    world[:] = parentRotation
+    if len(positions) > 1:
+        world[:-1] = aimMatrices(positions[:-1], positions[1:], upVectors=upAxis, aimVector=aimAxis,
+                                 localUp=localUp)[:, :3, :3]
+        world[-1] = world[-2]
+    parents = np.concatenate((parentRotation[None], world[:-1]))
+    # rotate and rotateAxis are zeroed, so world = jointOrient * parent  =>  jointOrient = world * parent.T
+    orients = np.matmul(world, np.transpose(parents, (0, 2, 1)))
+    translations = np.matmul((positions[1:] - positions[:-1])[:, None, :],
+                             np.transpose(world[:-1], (0, 2, 1)))[:, 0]
+    return matrixToEuler(orients), translations
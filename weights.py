@@ -0,0 +1,364 @@
+"""Bulk read / write methods for deformer weights"""
+
+from array import array
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+import backend
+import spatial
+import utils
+
+__author__ = "Arda Kutlu"
+__copyright__ = "Copyright 2019, Library Weight Functions"
+__credits__ = []
+__license__ = "GPL"
+__maintainer__ = "Arda Kutlu"
+__email__ = "ardakutlu@gmail.com"
+__status__ = "Development"
+
+cmds = backend.cmds
+om = backend.om
+oma = backend.oma
+
+
+# ___________Array core ___________
+# Everything in this section works on plain sequences and plug stand-ins.
+# Maya is not required.
+
+class MemoryPlug(object):
+    """
+    In-memory stand-in for MayaPlug. Holds the sparse logical elements of a multi attribute in a dictionary.
+    Useful for running the array core without Maya.
+    """
+    def __init__(self, elements=None):
+        self.elements = dict(elements or {})
+        self.calls = 0
+
+    def indices(self):
+        return sorted(self.elements)
+
+    def read(self, start, end):
+        self.calls += 1
+        return [self.elements[i] for i in range(start, end + 1)]
+
+    def write(self, start, values):
+        self.calls += 1
+        for i, value in enumerate(values):
+            self.elements[start + i] = float(value)
+
+
+def makeArray(count, default=0.0, output="array"):
+    """
+    Creates a contiguous float array
+    :param count: (Int) length of the array
+    :param default: (Float) fill value
+    :param output: (String) "array" for array('f'), "numpy" for numpy float32 array
+    :return: array
+    """
+    if output == "numpy":
+        if np is None:
+            raise ImportError("numpy is required for numpy output")
+        return np.full(count, default, dtype=np.float32)
+    elif output == "array":
+        return array('f', [default]) * count
+    else:
+        raise ValueError("Unrecognized output type => %s" % output)
+
+def getRuns(indices):
+    """
+    Splits the logical indices into contiguous runs
+    :param indices: (List) ascending logical indices
+    :return: (List) (start, end) tuples. end is inclusive
+    """
+    if not len(indices):
+        return []
+    if np is not None and len(indices) > 64:
+        ids = np.asarray(indices)
+        breaks = np.flatnonzero(np.diff(ids) != 1)
+        starts = np.concatenate(([ids[0]], ids[breaks + 1]))
+        ends = np.concatenate((ids[breaks], [ids[-1]]))
+        return list(zip(starts.tolist(), ends.tolist()))
+    runs = []
+    start = prev = indices[0]
+    for i in indices[1:]:
+        if i != prev + 1:
+            runs.append((start, prev))
+            start = i
+        prev = i
+    runs.append((start, prev))
+    return runs
+
+def readPlug(plug, size=None, default=0.0, output="array"):
+    """
+    Reads all elements of a numeric multi attribute into a dense array. One read per contiguous run of
+    existing logical indices.
+    :param plug: (Object) MayaPlug or any object with indices(), read(start, end) and write(start, values)
+    :param size: (Int) length of the returned array. If None, highest logical index + 1 is used
+    :param default: (Float) value of the elements which does not exist on the plug
+    :param output: (String) "array" or "numpy"
+    :return: array
+    """
+    ids = sorted(plug.indices())
+    if size is None:
+        size = ids[-1] + 1 if ids else 0
+    values = makeArray(size, default=default, output=output)
+    for start, end in getRuns(ids):
+        if start >= size:
+            break
+        end = min(end, size - 1)
+        chunk = plug.read(start, end)
+        if output == "array":
+            chunk = array('f', chunk)
+        values[start:end + 1] = chunk
+    return values
+
+def writePlug(plug, values, indices=None):
+    """
+    Writes the values to a numeric multi attribute. One write per contiguous run of logical indices.
+    :param plug: (Object) MayaPlug or any object with indices(), read(start, end) and write(start, values)
+    :param values: (Sequence) values to write
+    :param indices: (List) logical indices matching the values. If None, values are written to 0..len(values)-1
+    :return: None
+    """
+    if indices is None:
+        if len(values):
+            plug.write(0, values)
+        return
+    if len(indices) != len(values):
+        raise ValueError("indices and values must have the same length")
+    if any(indices[i] >= indices[i + 1] for i in range(len(indices) - 1)):
+        order = sorted(range(len(indices)), key=indices.__getitem__)
+        indices = [indices[i] for i in order]
+        values = [values[i] for i in order]
+    offset = 0
+    for start, end in getRuns(indices):
+        length = end - start + 1
+        plug.write(start, values[offset:offset + length])
+        offset += length
+
+def transferWeights(sourcePoints, sourceWeights, targetPoints, method="nearest", k=4, power=2.0, chunkSize=65536,
+                    grid=None):
+    """
+    Transfers per point weights between point sets with unrelated topology. Each target point takes the weights of
+    its nearest source point or the inverse distance blend of its k nearest source points.
+    Targets are processed in chunks, so the temporary memory does not grow with the target size.
+
+    Example:
+    source = utils.getAllVerts("body_hi", output="numpy")
+    target = utils.getAllVerts("body_lo", output="numpy")
+    weights = transferWeights(source, getWeights("skinCluster1", output="numpy"), target, method="inverseDistance")
+    :param sourcePoints: (Sequence) source positions. Any getAllVerts output except MPointArray
+    :param sourceWeights: (Sequence) (N,) weights or (N, influence) weights matching the source points
+    :param targetPoints: (Sequence) target positions
+    :param method: (String) "nearest" or "inverseDistance"
+    :param k: (Int) number of blended source points for "inverseDistance"
+    :param power: (Float) distance falloff power for "inverseDistance"
+    :param chunkSize: (Int) number of target points processed at once
+    :param grid: (spatial.PointGrid) Optional. Prebuilt grid of the source points for transferring many weight
+                    sets from the same source
+    :return: (numpy.ndarray) float32 weights. (M,) or (M, influence) shaped following the source weights
+    """
+    if np is None:
+        raise ImportError("numpy is required for weight transfer")
+    if method not in ("nearest", "inverseDistance"):
+        raise ValueError("Unrecognized transfer method => %s" % method)
+    weights = np.asarray(sourceWeights, dtype=np.float32)
+    grid = grid or spatial.PointGrid(sourcePoints)
+    if len(weights) != len(grid):
+        raise ValueError("sourceWeights must have one entry per source point")
+    if not len(grid):
+        raise ValueError("Source has no points")
+    targets = spatial._asPoints(targetPoints)
+    result = np.empty((len(targets),) + weights.shape[1:], dtype=np.float32)
+    neighbours = 1 if method == "nearest" else min(k, len(grid))
+    for start in range(0, len(targets), chunkSize):
+        ids, distances = grid.kNearest(targets[start:start + chunkSize], neighbours)
+        if method == "nearest":
+            result[start:start + chunkSize] = weights[ids[:, 0]]
+            continue
+        with np.errstate(divide="ignore"):
+            blend = 1.0 / distances ** power
+        # a target sitting on a source point takes its weights as they are
+        hits = distances[:, 0] <= 1e-9
+        blend[hits] = 0.0
+        blend[hits, 0] = 1.0
+        blend /= blend.sum(axis=1, keepdims=True)
+        result[start:start + chunkSize] = np.einsum("mk,mk...->m...", blend, weights[ids])
+    return result
+
+
+# ___________Maya ___________
+
+class MayaPlug(object):
+    """Bulk accessor for a numeric multi attribute in the scene"""
+    def __init__(self, plug):
+        self.plug = plug
+
+    def indices(self):
+        return cmds.getAttr(self.plug, multiIndices=True) or []
+
+    def read(self, start, end):
+        values = cmds.getAttr("%s[%i:%i]" % (self.plug, start, end))
+        return values if isinstance(values, list) else [values]
+
+    def write(self, start, values):
+        values = values.tolist() if hasattr(values, "tolist") else list(values)
+        cmds.setAttr("%s[%i:%i]" % (self.plug, start, start + len(values) - 1), *values, size=len(values))
+
+
+def _targetIndex(deformer, target):
+    """Resolves the blendShape target alias to its logical index"""
+    if isinstance(target, int):
+        return target
+    aliases = cmds.aliasAttr(deformer, q=True) or []
+    for alias, attr in zip(aliases[::2], aliases[1::2]):
+        if alias == target:
+            return int(attr.split("[")[-1][:-1])
+    cmds.error("Cannot find the target %s on %s" % (target, deformer))
+
+def _deformedGeometry(deformer, geometry=0):
+    geometries = cmds.deformer(deformer, q=True, geometry=True) or []
+    if geometry >= len(geometries):
+        cmds.error("%s has no geometry at index %s" % (deformer, geometry))
+    return geometries[geometry]
+
+def _geometryPath(deformer, geometry=0):
+    return utils.getMDagPath(_deformedGeometry(deformer, geometry))
+
+def weightPlug(deformer, target=None, geometry=0):
+    """
+    Gets the weight plug name of the blendShape
+    :param deformer: (String) blendShape node
+    :param target: (Int or String) target index or alias. If None, baseWeights plug is returned
+    :param geometry: (Int) input geometry index
+    :return: (String) plug name
+    """
+    if target is None:
+        return "%s.inputTarget[%i].baseWeights" % (deformer, geometry)
+    return "%s.inputTarget[%i].inputTargetGroup[%i].targetWeights" % (deformer, geometry,
+                                                                       _targetIndex(deformer, target))
+
+def _skinContext(deformer, geometry=0, indices=None):
+    fnSkin = oma.MFnSkinCluster(utils.getMObject(deformer))
+    dagPath = _geometryPath(deformer, geometry)
+    fnComp = om.MFnSingleIndexedComponent()
+    components = fnComp.create(om.MFn.kMeshVertComponent)
+    if indices is None:
+        fnComp.setCompleteData(om.MItGeometry(dagPath).count())
+    else:
+        ids = om.MIntArray()
+        for i in indices:
+            ids.append(int(i))
+        fnComp.addElements(ids)
+    influenceCount = fnSkin.influenceObjects(om.MDagPathArray())
+    return fnSkin, dagPath, components, influenceCount
+
+def getWeights(deformer, target=None, geometry=0, indices=None, output="array"):
+    """
+    Reads the painted weights of the deformer in bulk
+    :param deformer: (String) blendShape or skinCluster node
+    :param target: (Int or String) blendShape target index or alias. If None, baseWeights are read.
+                    Ignored for skinClusters
+    :param geometry: (Int) input geometry index
+    :param indices: (List) skinCluster only. Vertex indices to read. Default is all vertices
+    :param output: (String) "array" for array('f'), "numpy" for numpy float32 array
+    :return:
+                    blendShape : one weight per vertex
+                    skinCluster : vertex major weights, one per influence in
+                    cmds.skinCluster(deformer, q=True, influence=True) order. numpy output is (vertex, influence) shaped
+    """
+    nodeType = cmds.nodeType(deformer)
+    if nodeType == "blendShape":
+        count = om.MItGeometry(_geometryPath(deformer, geometry)).count()
+        return readPlug(MayaPlug(weightPlug(deformer, target, geometry)), size=count, default=1.0, output=output)
+    elif nodeType == "skinCluster":
+        fnSkin, dagPath, components, influenceCount = _skinContext(deformer, geometry, indices)
+        mWeights = om.MDoubleArray()
+        util = om.MScriptUtil()
+        util.createFromInt(0)
+        fnSkin.getWeights(dagPath, components, mWeights, util.asUintPtr())
+        if output == "numpy":
+            if np is None:
+                raise ImportError("numpy is required for numpy output")
+            return np.array(mWeights, dtype=np.float32).reshape(-1, influenceCount)
+        elif output == "array":
+            return array('f', mWeights)
+        else:
+            raise ValueError("Unrecognized output type => %s" % output)
+    else:
+        cmds.error("Unsupported deformer type => %s" % nodeType)
+
+def setWeights(deformer, weights, target=None, geometry=0, indices=None, normalize=False):
+    """
+    Writes the painted weights of the deformer in bulk
+    :param deformer: (String) blendShape or skinCluster node
+    :param weights: (Sequence) weights in the getWeights layout
+    :param target: (Int or String) blendShape target index or alias. If None, baseWeights are written.
+                    Ignored for skinClusters
+    :param geometry: (Int) input geometry index
+    :param indices: (List) vertex indices matching the weights. Default is all vertices from 0
+    :param normalize: (Boolean) skinCluster only. If True, normalizes the weights after writing
+    :return: None
+    """
+    nodeType = cmds.nodeType(deformer)
+    if nodeType == "blendShape":
+        writePlug(MayaPlug(weightPlug(deformer, target, geometry)), weights, indices=indices)
+    elif nodeType == "skinCluster":
+        fnSkin, dagPath, components, influenceCount = _skinContext(deformer, geometry, indices)
+        if np is not None:
+            flat = np.asarray(weights, dtype=np.float64).ravel().tolist()
+        else:
+            flat = list(weights)
+        util = om.MScriptUtil()
+        util.createFromList(flat, len(flat))
+        mWeights = om.MDoubleArray(util.asDoublePtr(), len(flat))
+        influenceIndices = om.MIntArray()
+        for i in range(influenceCount):
+            influenceIndices.append(i)
+        fnSkin.setWeights(dagPath, components, influenceIndices, mWeights, normalize)
+    else:
+        cmds.error("Unsupported deformer type => %s" % nodeType)
+
+def transferDeformerWeights(source, destination, sourceGeometry=0, destinationGeometry=0, sourceTarget=None,
+                            destinationTarget=None, method="nearest", k=4, power=2.0, space="world"):
+    """
+    Transfers the painted weights of a deformer to another deformer of the same type on a mesh with different
+    topology. skinCluster influences are matched by name, destination influences missing on the source get zero.
+    :param source: (String) source blendShape or skinCluster node
+    :param destination: (String) destination deformer
+    :param sourceGeometry: (Int) input geometry index of the source deformer
+    :param destinationGeometry: (Int) input geometry index of the destination deformer
+    :param sourceTarget: (Int or String) blendShape target index or alias to read. If None, baseWeights are used
+    :param destinationTarget: (Int or String) blendShape target index or alias to write. If None, baseWeights
+    :param method: (String) "nearest" or "inverseDistance". See transferWeights
+    :param k: (Int) neighbour count for "inverseDistance"
+    :param power: (Float) distance falloff power for "inverseDistance"
+    :param space: (String) space the meshes are compared in. "world" or "object"
+    :return: (numpy.ndarray) written weights
+    """
+    nodeType = cmds.nodeType(source)
+    if cmds.nodeType(destination) != nodeType:
+        cmds.error("%s and %s are not the same deformer type" % (source, destination))
+    sourcePoints = utils.getAllVerts(_deformedGeometry(source, sourceGeometry), output="numpy", space=space)
+    destinationPoints = utils.getAllVerts(_deformedGeometry(destination, destinationGeometry), output="numpy",
+                                          space=space)
+    sourceWeights = getWeights(source, target=sourceTarget, geometry=sourceGeometry, output="numpy")
+    if nodeType == "skinCluster":
+        sourceInfluences = cmds.skinCluster(source, q=True, influence=True)
+        destinationInfluences = cmds.skinCluster(destination, q=True, influence=True)
+        columns = dict((name, i) for i, name in enumerate(destinationInfluences))
+        missing = [name for i, name in enumerate(sourceInfluences)
+                   if name not in columns and sourceWeights[:, i].any()]
+        if missing:
+            cmds.error("Influences missing on %s => %s" % (destination, ", ".join(missing)))
+        remapped = np.zeros((len(sourceWeights), len(destinationInfluences)), dtype=np.float32)
+        for i, name in enumerate(sourceInfluences):
+            if name in columns:
+                remapped[:, columns[name]] = sourceWeights[:, i]
+        sourceWeights = remapped
+    weights = transferWeights(sourcePoints, sourceWeights, destinationPoints, method=method, k=k, power=power)
+    setWeights(destination, weights, target=destinationTarget, geometry=destinationGeometry)
+    return weights